@@ -0,0 +1,454 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import snake_levels
+from snake_core import Direction, GameMode, Simulation
+
+# Замеры скорости симуляции и отрисовки. Отрисовка идет через SDL dummy,
+# окно не открывается. Запуск:
+#     python benchmark.py                   # таблица в консоль
+#     python benchmark.py --json out.json   # плюс результаты в JSON для сравнения прогонов
+#     python benchmark.py --only ticks      # только выбранные группы
+
+def serpentine_body(length, width, top=1):
+    # тело "змейкой" по строкам начиная со строки top, голова в (0, top)
+    body = []
+    row = top
+    while len(body) < length:
+        xs = range(width) if (row - top) % 2 == 0 else range(width - 1, -1, -1)
+        for x in xs:
+            body.append((x, row))
+            if len(body) == length:
+                break
+        row += 1
+    return body
+
+def place_snake(sim, length):
+    sim.reset(seed=0)
+    sim.snake.set_body(serpentine_body(length, sim.width))
+    sim.snake.length = length
+    sim.snake.direction = Direction.UP
+    sim.snake.direction_queue.clear()
+    sim.food.randomize_position(sim.time)
+
+def result(group, name, value, unit, **params):
+    return {"group": group, "name": name, "value": value, "unit": unit, "params": params}
+
+def bench_ticks(lengths=(10, 1000, 100000), boards=((40, 30), (200, 200), (1000, 128)), repeats=5):
+    # стоимость одного тика при разной длине змейки и размере поля
+    results = []
+    for width, height in boards:
+        sim = Simulation(GameMode.CLASSIC, width, height)
+        for length in lengths:
+            # строка 0 должна остаться пустой, по ней едет голова
+            if length > width * (height - 2):
+                continue
+            best = None
+            for _ in range(repeats):
+                place_snake(sim, length)
+                # шаг вверх в пустую строку 0, дальше вправо по ней
+                sim.step()
+                ticks = width - 2
+                start = time.perf_counter()
+                for _ in range(ticks):
+                    sim.step(Direction.RIGHT)
+                elapsed = (time.perf_counter() - start) / ticks
+                if not sim.snake.is_alive:
+                    raise RuntimeError(f"змейка погибла во время замера: {sim.snake.death_reason}")
+                best = elapsed if best is None else min(best, elapsed)
+            results.append(result("ticks", "tick", best * 1e6, "us",
+                                  length=length, width=width, height=height))
+    return results
+
+def bench_spawn(fills=(0.0, 0.5, 0.9, 0.99), width=100, height=100, count=2000):
+    # задержка появления еды и генерации препятствий при разной заполненности поля
+    results = []
+    sim = Simulation(GameMode.OBSTACLES, width, height)
+    for fill in fills:
+        length = max(3, int(width * (height - 2) * fill))
+        place_snake(sim, length)
+        start = time.perf_counter()
+        for _ in range(count):
+            sim.food.randomize_position(sim.time)
+        elapsed = (time.perf_counter() - start) / count
+        results.append(result("spawn", "food", elapsed * 1e6, "us",
+                              fill=fill, width=width, height=height))
+
+        start = time.perf_counter()
+        for _ in range(count // 100):
+            sim.generate_obstacles()
+        elapsed = (time.perf_counter() - start) / (count // 100)
+        results.append(result("spawn", "obstacles", elapsed * 1e6, "us",
+                              fill=fill, width=width, height=height))
+    return results
+
+def bench_levels(levels=((200, 200, "scatter", 4000), (2000, 2000, "scatter", 100000),
+                          (200, 200, "maze", 0), (1000, 1000, "maze", 0))):
+    # генерация уровня с проверкой связности, повторная выдача из кэша
+    # и полная установка уровня в симуляцию при сбросе партии
+    results = []
+    for width, height, kind, count in levels:
+        spec = snake_levels.LevelSpec(kind, count=count)
+        start = (width // 2, height // 2)
+        snake_levels.cached_level_mask.cache_clear()
+        begin = time.perf_counter()
+        mask = snake_levels.level_mask(width, height, spec, 0, start)
+        generated = time.perf_counter() - begin
+        begin = time.perf_counter()
+        snake_levels.level_mask(width, height, spec, 0, start)
+        cached = time.perf_counter() - begin
+        sim = Simulation(GameMode.OBSTACLES, width, height, seed=0, level=spec)
+        begin = time.perf_counter()
+        sim.reset(seed=0)
+        reset = time.perf_counter() - begin
+        params = dict(kind=kind, width=width, height=height, obstacles=sum(mask))
+        results.append(result("levels", "generate", generated * 1e3, "ms", **params))
+        results.append(result("levels", "cached", cached * 1e6, "us", **params))
+        results.append(result("levels", "reset", reset * 1e3, "ms", **params))
+    return results
+
+def bench_bot(lengths=(10, 300, 3000), boards=((40, 30), (200, 200)), ticks=300):
+    # стоимость решения автопилота: среднее, p99 и доля тиков сверх бюджета
+    from snake_bot import Autopilot
+    results = []
+    for width, height in boards:
+        for length in lengths:
+            if length > width * (height - 2) // 2:
+                continue
+            sim = Simulation(GameMode.WALLS, width, height)
+            place_snake(sim, length)
+            bot = Autopilot(sim)
+            for _ in range(ticks):
+                if not sim.snake.is_alive:
+                    break
+                sim.step(bot.decide())
+            costs = sorted(bot.costs)
+            params = dict(length=length, width=width, height=height, budget=bot.budget_us)
+            results.append(result("bot", "decide", sum(costs) / len(costs), "us", **params))
+            results.append(result("bot", "p99", costs[int(len(costs) * 0.99)], "us", **params))
+            results.append(result("bot", "overruns", bot.overruns / bot.decisions * 100, "%", **params))
+    return results
+
+def bench_snapshot(cases=((40, 30, 300), (200, 200, 10000), (2000, 2000, 100000)), ticks=200):
+    # снимок партии против pickle: время записи и восстановления, размер; байт на тик в потоке
+    import pickle
+    import snake_snapshot
+    results = []
+    for width, height, length in cases:
+        sim = Simulation(GameMode.WALLS, width, height)
+        place_snake(sim, length)
+        params = dict(length=length, width=width, height=height)
+        start = time.perf_counter()
+        data = snake_snapshot.to_bytes(sim)
+        results.append(result("snapshot", "encode", (time.perf_counter() - start) * 1e3, "ms", **params))
+        start = time.perf_counter()
+        snake_snapshot.restore(data, sim)
+        results.append(result("snapshot", "restore", (time.perf_counter() - start) * 1e3, "ms", **params))
+        results.append(result("snapshot", "size", len(data) / 1024, "KB", **params))
+        start = time.perf_counter()
+        pickled = pickle.dumps(sim, pickle.HIGHEST_PROTOCOL)
+        results.append(result("snapshot", "pickle", (time.perf_counter() - start) * 1e3, "ms", **params))
+        start = time.perf_counter()
+        pickle.loads(pickled)
+        results.append(result("snapshot", "unpickle", (time.perf_counter() - start) * 1e3, "ms", **params))
+        results.append(result("snapshot", "pickle_sz", len(pickled) / 1024, "KB", **params))
+
+        # поток: один ключевой кадр, дальше записи тиков
+        encoder = snake_snapshot.DeltaEncoder(keyframe_every=ticks + 1)
+        encoder.encode(sim)
+        size = steps = 0
+        for _ in range(ticks):
+            sim.step()
+            if not sim.snake.is_alive:
+                break
+            size += len(encoder.encode(sim))
+            steps += 1
+        results.append(result("snapshot", "delta", size / max(steps, 1), "B", **params))
+    return results
+
+def bench_arena(counts=(10, 100, 500), ticks=200):
+    # тик арены на N змеек: правила (общая сетка занятости) и решения ботов
+    # отдельно; правила на змейку не должны расти с числом змеек
+    from snake_arena import measure
+    results = []
+    for count in counts:
+        arena, decide, resolve, alive = measure(count, ticks=ticks)
+        params = dict(snakes=count, width=arena.width, height=arena.height)
+        total = [a + b for a, b in zip(decide, resolve)]
+        results.append(result("arena", "tick", statistics.median(total), "us", **params))
+        results.append(result("arena", "rules", statistics.median(resolve), "us", **params))
+        results.append(result("arena", "per_snake", statistics.median(resolve) / count, "us", **params))
+        results.append(result("arena", "bots", statistics.median(decide), "us", **params))
+    return results
+
+# Холодный старт в отдельном процессе: сколько занимает импорт модуля и
+# (для snake_game) время до первого нарисованного кадра меню.
+STARTUP_CODE = """
+import time
+start = time.perf_counter()
+import {module}
+imported = time.perf_counter()
+if {first_frame}:
+    from snake_scores import ScoreStore
+    game = {module}.Game(scores=ScoreStore(":memory:", legacy_path=None))
+    game.draw()
+print(imported - start, time.perf_counter() - start)
+"""
+
+def run_code(code):
+    # код в отдельном процессе Python из каталога проекта; возвращает stdout
+    env = dict(os.environ, SDL_VIDEODRIVER="dummy", SDL_AUDIODRIVER="dummy")
+    here = os.path.dirname(os.path.abspath(__file__))
+    return subprocess.run([sys.executable, "-c", code],
+                          cwd=here, env=env, capture_output=True, text=True, check=True).stdout
+
+def bench_startup(modules=("snake_core", "snake_bot", "snake_game"), repeats=5):
+    results = []
+    for module in modules:
+        first_frame = module == "snake_game"
+        imports, frames = [], []
+        for _ in range(repeats):
+            output = run_code(STARTUP_CODE.format(module=module, first_frame=first_frame))
+            imported, total = (float(value) for value in output.split()[-2:])
+            imports.append(imported)
+            frames.append(total)
+        results.append(result("startup", "import", statistics.median(imports) * 1e3, "ms", module=module))
+        if first_frame:
+            results.append(result("startup", "first_frame", statistics.median(frames) * 1e3, "ms", module=module))
+    return results
+
+def load_game():
+    # отрисовку импортируем только когда она нужна: snake_game поднимает pygame
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    import snake_game
+    return snake_game
+
+def memory_scores():
+    # рекорды в памяти, чтобы замеры не создавали и не трогали файлы
+    from snake_scores import ScoreStore
+    return ScoreStore(":memory:", legacy_path=None)
+
+def bench_particles(lengths=(10, 100, 1000), frames=45):
+    # обновление и отрисовка частиц после смерти змейки
+    sg = load_game()
+    surface = sg.pygame.Surface((sg.SCREEN_WIDTH, sg.SCREEN_HEIGHT))
+    results = []
+    for length in lengths:
+        snake = sg.Snake()
+        snake.set_body(serpentine_body(length, sg.GRID_WIDTH, top=0))
+        start = time.perf_counter()
+        snake.die("замер")
+        results.append(result("particles", "die", (time.perf_counter() - start) * 1e3, "ms",
+                              length=length, particles=len(snake.particles)))
+
+        update = draw = 0.0
+        for _ in range(frames):
+            start = time.perf_counter()
+            snake.update_particles()
+            update += time.perf_counter() - start
+            start = time.perf_counter()
+            snake.draw_particles(surface)
+            draw += time.perf_counter() - start
+        results.append(result("particles", "update", update / frames * 1e3, "ms", length=length))
+        results.append(result("particles", "draw", draw / frames * 1e3, "ms", length=length))
+    return results
+
+def bench_frames(frames=120):
+    # полный кадр Game.draw (с flip) в каждом состоянии игры
+    sg = load_game()
+    results = []
+    for state in sg.GameState:
+        for mode in sg.GameMode:
+            if state in (sg.GameState.MENU, sg.GameState.MODE_SELECT) and mode != sg.GameMode.CLASSIC:
+                continue
+            game = sg.Game(scores=memory_scores())
+            game.mode = mode
+            game.start_new_game()
+            if state == sg.GameState.GAME_OVER:
+                game.snake.die("замер")
+            game.state = state
+            game.transition_alpha = 0
+            game.draw()
+            start = time.perf_counter()
+            for _ in range(frames):
+                game.draw()
+            elapsed = (time.perf_counter() - start) / frames
+            results.append(result("frames", "draw", elapsed * 1e3, "ms",
+                                  state=state.name, mode=mode.name))
+    return results
+
+def bench_snake(lengths=(100, 1000, 10000), width=200, height=200, frames=30):
+    # Snake.draw без камеры: все сегменты видимы, живая змейка (между тиками) и умирающая
+    sg = load_game()
+    surface = sg.pygame.Surface((width * sg.GRID_SIZE, height * sg.GRID_SIZE))
+    results = []
+    for length in lengths:
+        snake = sg.Snake(width, height)
+        snake.set_body(serpentine_body(length, width, top=0))
+        snake.length = length
+        for state in ("alive", "dying"):
+            if state == "dying":
+                snake.die("замер")
+            snake.draw(surface, progress=0.5)
+            start = time.perf_counter()
+            for _ in range(frames):
+                snake.draw(surface, progress=0.5)
+            elapsed = (time.perf_counter() - start) / frames
+            results.append(result("snake", "draw", elapsed * 1e3, "ms", length=length, state=state))
+    return results
+
+def bench_obstacles(counts=(10, 1000, 20000), width=400, height=400, frames=60):
+    # слой препятствий: время кадра почти не должно зависеть от их числа
+    sg = load_game()
+    results = []
+    for count in counts:
+        level = snake_levels.LevelSpec("scatter", count=count, seed=0)
+        game = sg.Game(width=width, height=height, level=level, scores=memory_scores())
+        game.mode = GameMode.OBSTACLES
+        game.start_new_game()
+        game.transition_alpha = 0
+        game.draw()
+        start = time.perf_counter()
+        for _ in range(frames):
+            game.obstacle_layer.update()
+            game.draw()
+        elapsed = (time.perf_counter() - start) / frames
+        results.append(result("obstacles", "draw", elapsed * 1e3, "ms",
+                              count=len(game.sim.obstacles), width=width, height=height))
+    return results
+
+# Кадры для агентов в отдельном процессе: без окна rgb_array - вид без копии,
+# а в общем прогоне окно уже открыли группы раньше (frames, camera).
+OBSERVE_CODE = """
+import json, time
+import snake_game
+from snake_scores import ScoreStore
+snake_game.init_offscreen()
+game = snake_game.Game(scores=ScoreStore(":memory:", legacy_path=None))
+game.start_new_game()
+grabs = {{"rgb_array": game.rgb_array, "rgb_4x": lambda: game.rgb_array(4),
+         "array3d": lambda: snake_game.pygame.surfarray.array3d(snake_game.screen)}}
+timings = {{}}
+for name, grab in grabs.items():
+    total = 0.0
+    for _ in range({frames}):
+        game.draw()
+        start = time.perf_counter()
+        grab()
+        total += time.perf_counter() - start
+    timings[name] = total / {frames}
+print(json.dumps(timings))
+"""
+
+def bench_observe(boards=((40, 30), (200, 200), (1000, 1000)), ticks=300, frames=60):
+    # Наблюдения для агентов: тензор поля на месте против сборки в Python и
+    # векторной пересборки; кадр rgb_array против копии экрана array3d
+    # (в отдельном процессе, см. OBSERVE_CODE).
+    from snake_observe import GridObserver, python_grid
+    results = []
+    for width, height in boards:
+        sim = Simulation(GameMode.WALLS, width, height, seed=0)
+        place_snake(sim, min(1000, width * (height - 2) // 2))
+        observer = GridObserver(sim)
+        timings = {"update": 0.0, "python": 0.0, "rebuild": 0.0}
+        sim.step()
+        steps = 0
+        for _ in range(ticks):
+            if not sim.snake.is_alive:
+                break
+            sim.step(Direction.RIGHT)
+            start = time.perf_counter()
+            observer.update()
+            timings["update"] += time.perf_counter() - start
+            start = time.perf_counter()
+            python_grid(sim)
+            timings["python"] += time.perf_counter() - start
+            start = time.perf_counter()
+            observer.rebuild()
+            timings["rebuild"] += time.perf_counter() - start
+            steps += 1
+        for name, seconds in timings.items():
+            results.append(result("observe", name, seconds / max(steps, 1) * 1e6, "us",
+                                  width=width, height=height, length=sim.snake.length))
+
+    timings = json.loads(run_code(OBSERVE_CODE.format(frames=frames)).splitlines()[-1])
+    for name, seconds in timings.items():
+        results.append(result("observe", name, seconds * 1e6, "us", offscreen=True))
+    return results
+
+def bench_camera(boards=((40, 30), (200, 200), (2000, 2000)), lengths=(10, 1000, 30000), frames=60):
+    # кадр с камерой на полях больше экрана: стоимость должна зависеть от окна,
+    # а не от размера поля и длины змейки
+    sg = load_game()
+    results = []
+    for width, height in boards:
+        game = sg.Game(width=width, height=height, scores=memory_scores())
+        for length in lengths:
+            if length > width * (height - 2):
+                continue
+            game.mode = sg.GameMode.CLASSIC
+            game.start_new_game()
+            place_snake(game.sim, length)
+            game.transition_alpha = 0
+            game.draw()
+            start = time.perf_counter()
+            for _ in range(frames):
+                game.draw()
+            elapsed = (time.perf_counter() - start) / frames
+            results.append(result("camera", "draw", elapsed * 1e3, "ms",
+                                  length=length, width=width, height=height))
+    return results
+
+BENCHMARKS = {
+    "ticks": bench_ticks,
+    "spawn": bench_spawn,
+    "levels": bench_levels,
+    "particles": bench_particles,
+    "frames": bench_frames,
+    "snake": bench_snake,
+    "obstacles": bench_obstacles,
+    "camera": bench_camera,
+    "bot": bench_bot,
+    "startup": bench_startup,
+    "snapshot": bench_snapshot,
+    "arena": bench_arena,
+    # кадры без окна замеряются в отдельном процессе (OBSERVE_CODE)
+    "observe": bench_observe,
+}
+
+def run(groups=None):
+    results = []
+    for name, bench in BENCHMARKS.items():
+        if groups and name not in groups:
+            continue
+        results.extend(bench())
+    return results
+
+def report(results):
+    for item in results:
+        params = ", ".join(f"{key}={value}" for key, value in item["params"].items())
+        print(f"{item['group']:<10} {item['name']:<10} {item['value']:>10.3f} {item['unit']:<3} {params}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Замеры скорости змейки")
+    parser.add_argument("--json", help="куда записать результаты в JSON")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="какие группы запускать")
+    args = parser.parse_args()
+
+    results = run(args.only)
+    report(results)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "results": results,
+            }, file, indent=2, ensure_ascii=False)
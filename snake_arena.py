@@ -0,0 +1,405 @@
+import argparse
+import random
+import statistics
+import time
+from array import array
+
+import snake_levels
+from snake_core import (
+    SPEED, OBSTACLE_COUNT, SPECIAL_FOOD_BONUS, DEATH_WALL, DEATH_TAIL, DEATH_OBSTACLE,
+    EMPTY, BODY, FOOD, OBSTACLE, VOID,
+    Board, Direction, Food, GameMode, Snake, mode_topology,
+)
+from snake_replay import Replay
+from snake_topology import WALL
+
+# Арена: много змеек (боты, записи партий, игрок) и много еды на одном поле.
+# Все змейки ходят одновременно, тик - три прохода по списку змеек, и
+# столкновения ищутся через общую сетку занятости, а не попарно, поэтому тик
+# стоит O(число змеек), а не O(змейки^2):
+#   1. куда идет каждая голова (таблица snake_topology). Клетка помечается
+#      номером тика и номером змейки; если метка этого тика уже стоит, две
+#      головы пришли в одну клетку - лобовое столкновение, погибают обе;
+#   2. клетка проверяется по сетке, какой она была до ходов: тело своё или
+#      чужое (владельца клетки хранит сетка owner) и препятствие - смерть.
+#      Хвосты в этот момент еще на месте, как в Snake.move;
+#   3. выжившие ставят голову и едят, тела погибших освобождают поле,
+#      съеденная еда переезжает в случайную свободную клетку.
+# Порядок змеек в списке на результат тика не влияет.
+#
+#     python snake_arena.py --snakes 10 100 500
+#     python snake_arena.py --snakes 200 --replays last_replay.snkr --ticks 2000
+
+DEATH_SNAKE = "Столкновение с другой змейкой!"
+DEATH_HEAD = "Лобовое столкновение!"
+
+# еды на змейку, но не меньше одной
+FOOD_PER_SNAKE = 1
+# клеток поля на змейку, если размер поля не задан
+CELLS_PER_SNAKE = 400
+# через сколько тиков погибший бот появляется снова
+RESPAWN_TICKS = 20
+# сколько случайных клеток пробовать, чтобы поставить новую змейку
+SPAWN_ATTEMPTS = 64
+# бот выбирает цель из стольких случайных кусков еды
+TARGET_SAMPLES = 4
+# замеры тиков арены для --snakes
+ARENA_SIZES = (10, 100, 500)
+
+DIRECTIONS = tuple(Direction)
+
+def arena_size(snakes):
+    # сторона квадратного поля на snakes змеек, CELLS_PER_SNAKE клеток на змейку
+    return max(20, int((max(snakes, 1) * CELLS_PER_SNAKE) ** 0.5))
+
+def remove_body(snake):
+    # тело убирается с поля, клетки становятся свободными
+    board = snake.board
+    for pos in snake.positions:
+        if board.get(pos) == BODY:
+            board.set(pos, EMPTY)
+    snake.positions.clear()
+
+def place_snake(board, snake, rng, attempts=SPAWN_ATTEMPTS):
+    # Новая змейка длины 3 головой вверх в случайном свободном месте: тело
+    # вниз от головы и одна свободная клетка перед ней. False - места не нашлось.
+    cells = board.cells
+    width, height = board.width, board.height
+    for _ in range(attempts):
+        pos = board.random_free(rng)
+        if pos is None:
+            return False
+        x, y = pos
+        if not 1 <= y < height - 2:
+            continue
+        if any(cells[(y + dy) * width + x] != EMPTY for dy in (-1, 1, 2)):
+            continue
+        snake.length = 3
+        snake.set_body([(x, y), (x, y + 1), (x, y + 2)])
+        snake.direction = Direction.UP
+        snake.direction_queue.clear()
+        snake.score = 0
+        snake.is_alive = True
+        snake.death_reason = ""
+        return True
+    return False
+
+def move_heads(snakes, board, moves, tick, claims, claimer, owner):
+    # Ходы живых змеек за один тик, одновременно (проходы 1-3 из описания
+    # выше, без еды). snakes - список (номер, змейка), номер пишется в owner;
+    # claims, claimer, owner - массивы на клетку поля, claims хранит номер
+    # тика и между тиками не чистится. Погибшие отмечены die, тела остаются
+    # на поле. Возвращает (змейка, клетка) для тех, чья голова встала на еду.
+    width = board.width
+    cells = board.cells
+
+    # 1. клетки, куда идут головы; стены и лобовые столкновения
+    movers = []
+    for number, (key, snake) in enumerate(snakes):
+        if snake.direction_queue:
+            snake.direction = snake.direction_queue.popleft()
+        x, y = snake.positions[0]
+        target = moves[(y * width + x) * 4 + snake.direction.value]
+        if target == WALL:
+            snake.die(DEATH_WALL)
+            continue
+        if claims[target] == tick:
+            snake.die(DEATH_HEAD)
+            snakes[claimer[target]][1].die(DEATH_HEAD)
+            continue
+        claims[target] = tick
+        claimer[target] = number
+        movers.append((key, snake, target))
+
+    # 2. проверка клеток по полю до ходов
+    safe = []
+    for key, snake, target in movers:
+        if not snake.is_alive:
+            continue
+        cell = cells[target]
+        if cell == BODY:
+            snake.die(DEATH_TAIL if owner[target] == key else DEATH_SNAKE)
+        elif cell == OBSTACLE or cell == VOID:
+            snake.die(DEATH_OBSTACLE)
+        else:
+            safe.append((key, snake, target, cell == FOOD))
+
+    # 3. выжившие ставят голову
+    eaten = []
+    for key, snake, target, ate in safe:
+        snake.push_head((target % width, target // width))
+        owner[target] = key
+        if ate:
+            eaten.append((snake, target))
+    return eaten
+
+class Greedy:
+    # Бот арены за O(1) на тик: идет к своей цели-еде, из клеток, куда можно
+    # шагнуть, выбирает ближайшую к цели, при равенстве - с большим числом
+    # свободных соседей. Цель - ближайшая из TARGET_SAMPLES случайных, новая
+    # выбирается, когда еду съели.
+    def __init__(self):
+        self.target = None
+        self.target_position = None
+
+    def restart(self):
+        self.target = None
+
+    def pick_target(self, arena, head):
+        foods = [food for food in (arena.rng.choice(arena.foods) for _ in range(TARGET_SAMPLES))
+                 if food.position is not None]
+        self.target = min(foods, key=lambda food: arena.distance(head, food.position), default=None)
+        self.target_position = self.target.position if self.target is not None else None
+
+    def decide(self, arena, snake):
+        head = snake.positions[0]
+        if self.target is None or self.target.position != self.target_position:
+            self.pick_target(arena, head)
+        moves, cells, width = arena.topology.next, arena.board.cells, arena.width
+        index = head[1] * width + head[0]
+        back = (snake.direction.value + 2) % 4
+        best = None
+        best_key = None
+        for direction in DIRECTIONS:
+            if direction.value == back:
+                continue
+            cell = moves[index * 4 + direction.value]
+            if cell == WALL or (cells[cell] != EMPTY and cells[cell] != FOOD):
+                continue
+            free = 0
+            for nearby in moves[cell * 4:cell * 4 + 4]:
+                if nearby != WALL and (cells[nearby] == EMPTY or cells[nearby] == FOOD):
+                    free += 1
+            distance = 0
+            if self.target_position is not None:
+                distance = arena.distance((cell % width, cell // width), self.target_position)
+            key = (free == 0, distance, -free)
+            if best_key is None or key < best_key:
+                best, best_key = direction, key
+        return best
+
+class ReplayControl:
+    # змейка повторяет повороты из записи snake_replay по тикам со своего
+    # появления; после последнего поворота едет прямо
+    def __init__(self, replay):
+        self.actions = replay.actions()
+        self.tick = 0
+
+    def restart(self):
+        self.tick = 0
+
+    def decide(self, arena, snake):
+        self.tick += 1
+        return self.actions.get(self.tick)
+
+class Player:
+    # змейка арены; controller None - повороты приходят снаружи (игрок)
+    def __init__(self, player_id, snake, controller):
+        self.id = player_id
+        self.snake = snake
+        self.controller = controller
+        # тик, когда змейка появится снова; 0 - не появляться самой
+        self.respawn_tick = 0
+        self.deaths = 0
+
+class Arena:
+    # Общее поле, змейки и еда. step - один тик правил для всех змеек сразу.
+    # snakes - сколько ботов Greedy поставить сразу; размер поля по умолчанию
+    # растет с их числом (arena_size).
+    def __init__(self, mode=GameMode.CLASSIC, width=None, height=None, seed=None, snakes=0,
+                 tick_ms=SPEED, respawn=True, topology=None):
+        if width is None or height is None:
+            width = height = arena_size(snakes)
+        self.mode = mode
+        self.width = width
+        self.height = height
+        self.tick_ms = tick_ms
+        self.respawn = respawn
+        self.rng = random.Random(seed)
+        self.topology = topology if topology is not None else mode_topology(mode, width, height)
+        self.board = Board(width, height)
+        # Snake при создании ставит тело в центр поля; чтобы не задеть чужие
+        # змейки, новые создаются на этом поле и потом переезжают на общее
+        self.scratch = Board(width, height)
+        area = width * height
+        # метки первого прохода: тик, когда в клетку пошла голова, и чья
+        self.claims = array("i", [0]) * area
+        self.claimer = array("i", [0]) * area
+        # чье тело в клетке; верно только для клеток BODY
+        self.owner = array("i", [0]) * area
+        self.players = []
+        self.foods = []
+        # клетка -> еда в ней
+        self.food_at = {}
+        self.obstacles = []
+        self.ticks = 0
+        self.time = 0
+        if self.topology.void is not None:
+            self.board.fill_mask(self.topology.void, VOID)
+        if mode == GameMode.OBSTACLES:
+            self.place_obstacles()
+        for _ in range(snakes):
+            self.add_snake(Greedy())
+
+    def place_obstacles(self):
+        # россыпь из snake_levels, препятствий столько же на клетку, сколько
+        # в обычной партии 40x30; свободные клетки связаны, карманов нет
+        count = max(OBSTACLE_COUNT, OBSTACLE_COUNT * self.width * self.height // 1200)
+        spec = snake_levels.LevelSpec("scatter", count=count)
+        mask = snake_levels.level_mask(self.width, self.height, spec, self.rng.getrandbits(63),
+                                       (self.width // 2, self.height // 2))
+        width = self.width
+        self.obstacles = [(index % width, index // width)
+                          for index in self.board.fill_mask(mask, OBSTACLE)]
+
+    def add_snake(self, controller=None, snake=None):
+        # snake - готовая змейка (в окне - змейка игрока с отрисовкой), она
+        # переезжает на поле арены; None - новая snake_core.Snake
+        if snake is None:
+            snake = Snake(self.width, self.height, self.scratch)
+        player = Player(len(self.players), snake, controller)
+        self.players.append(player)
+        self.revive(player)
+        while len(self.foods) < max(1, len(self.players) * FOOD_PER_SNAKE):
+            food = Food(self.width, self.height, self.board, self.rng)
+            self.foods.append(food)
+            if food.position is not None:
+                self.food_at[self.index(food.position)] = food
+        return player
+
+    def revive(self, player):
+        # Snake.reset ставит тело в центр поля, поэтому сброс идет на пустом
+        # поле scratch, а на общее змейка попадает через spawn
+        snake = player.snake
+        remove_body(snake)
+        snake.board = self.scratch
+        snake.reset()
+        remove_body(snake)
+        snake.board = self.board
+        snake.speed = self.tick_ms
+        return self.spawn(player)
+
+    def spawn(self, player):
+        # если места нет, змейка остается мертвой и пробует снова позже
+        snake = player.snake
+        snake.is_alive = False
+        player.respawn_tick = self.ticks + RESPAWN_TICKS if self.respawn else 0
+        if not place_snake(self.board, snake, self.rng):
+            return False
+        for x, y in snake.positions:
+            self.owner[y * self.width + x] = player.id
+        player.respawn_tick = 0
+        if player.controller is not None:
+            player.controller.restart()
+        return True
+
+    def index(self, position):
+        return position[1] * self.width + position[0]
+
+    def distance(self, a, b):
+        dx = abs(a[0] - b[0])
+        dy = abs(a[1] - b[1])
+        if self.topology.wrap:
+            dx = min(dx, self.width - dx)
+            dy = min(dy, self.height - dy)
+        return dx + dy
+
+    def alive(self):
+        return sum(player.snake.is_alive for player in self.players)
+
+    def step(self):
+        self.decide()
+        self.resolve()
+
+    def decide(self):
+        # повороты ботов и записей; все решают по одному и тому же полю до ходов
+        for player in self.players:
+            if player.controller is not None and player.snake.is_alive:
+                direction = player.controller.decide(self, player.snake)
+                if direction is not None:
+                    player.snake.update_direction(direction)
+
+    def resolve(self):
+        self.ticks += 1
+        self.time += self.tick_ms
+        tick = self.ticks
+        width = self.width
+        cells = self.board.cells
+        players = self.players
+
+        # ходы всех змеек сразу, потом еда и тела погибших; новые змейки
+        # появляются после всех ходов, чтобы не встать на клетку, которую уже проверили
+        movers = [(player.id, player.snake) for player in players if player.snake.is_alive]
+        for snake, target in move_heads(movers, self.board, self.topology.next, tick,
+                                        self.claims, self.claimer, self.owner):
+            food = self.food_at[target]
+            snake.grow()
+            if food.special:
+                snake.score += SPECIAL_FOOD_BONUS
+        for player in players:
+            snake = player.snake
+            if snake.is_alive:
+                continue
+            if snake.positions:
+                remove_body(snake)
+                player.deaths += 1
+                if self.respawn and player.controller is not None:
+                    player.respawn_tick = tick + RESPAWN_TICKS
+            elif player.respawn_tick and tick >= player.respawn_tick:
+                self.spawn(player)
+
+        # съеденная еда (в её клетке теперь голова) и просроченная особая переезжают
+        for food in self.foods:
+            position = food.position
+            if position is not None:
+                index = position[1] * width + position[0]
+                if cells[index] == FOOD and not food.is_expired(self.time):
+                    continue
+                del self.food_at[index]
+            food.randomize_position(self.time)
+            if food.position is not None:
+                self.food_at[self.index(food.position)] = food
+
+def measure(snakes, mode=GameMode.CLASSIC, ticks=300, warmup=50, seed=0, replays=()):
+    # время тика арены: решения ботов и правила отдельно, мкс
+    arena = Arena(mode, seed=seed, snakes=snakes)
+    for i, path in enumerate(replays):
+        arena.players[i % snakes].controller = ReplayControl(Replay.load(path))
+    for _ in range(warmup):
+        arena.step()
+    decide, resolve = [], []
+    alive = 0
+    for _ in range(ticks):
+        start = time.perf_counter()
+        arena.decide()
+        middle = time.perf_counter()
+        arena.resolve()
+        decide.append((middle - start) * 1e6)
+        resolve.append((time.perf_counter() - middle) * 1e6)
+        alive += arena.alive()
+    return arena, decide, resolve, alive / ticks
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Арена: много змеек на одном поле, замер тиков")
+    parser.add_argument("--snakes", type=int, nargs="+", default=list(ARENA_SIZES))
+    parser.add_argument("--mode", choices=[mode.name.lower() for mode in GameMode], default="classic")
+    parser.add_argument("--ticks", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--replays", nargs="*", default=[],
+                        help="записи snake_replay: их повороты получают первые змейки")
+    args = parser.parse_args()
+
+    mode = GameMode[args.mode.upper()]
+    for count in args.snakes:
+        arena, decide, resolve, alive = measure(count, mode, args.ticks, seed=args.seed,
+                                                replays=args.replays)
+        total = [a + b for a, b in zip(decide, resolve)]
+        deaths = sum(player.deaths for player in arena.players)
+        print(f"змеек {count}, поле {arena.width}x{arena.height}, живых в среднем {alive:.0f}, "
+              f"смертей {deaths}")
+        print(f"  тик: медиана {statistics.median(total):.0f} мкс, p99 "
+              f"{sorted(total)[int(len(total) * 0.99)]:.0f} мкс, "
+              f"{statistics.median(total) / count:.2f} мкс на змейку")
+        print(f"  правила {statistics.median(resolve):.0f} мкс "
+              f"({statistics.median(resolve) / count:.2f} на змейку), "
+              f"боты {statistics.median(decide):.0f} мкс")
@@ -0,0 +1,247 @@
+import numpy as np
+
+import snake_levels
+from snake_core import (
+    GRID_WIDTH, GRID_HEIGHT, SPEED, MAX_SPEED, SPEED_INCREMENT,
+    FOOD_SCORE, SPECIAL_FOOD_BONUS, SPECIAL_FOOD_CHANCE, SPECIAL_FOOD_LIFETIME,
+    OBSTACLE_COUNT, DEATH_WALL, DEATH_TAIL, DEATH_OBSTACLE, WIN_MESSAGE,
+    GameMode, mode_topology,
+)
+
+# Пакетная симуляция: N независимых партий в массивах NumPy, шагают все сразу.
+# Правила те же, что в snake_core.Simulation.step.
+#
+# Тело змейки хранится "штампами": в клетку пишется номер тика, когда туда
+# встала голова. Клетка занята телом, если штамп > ticks - body_len, поэтому
+# хвост не надо стирать отдельно.
+#
+# Ходы берутся из той же таблицы snake_topology, что у snake_core: по одной
+# таблице (area, 4) на все доски, клетка головы -> клетка после хода.
+
+# коды направлений совпадают с Direction.value, -1 значит "не поворачивать"
+NO_ACTION = -1
+
+# коды причин смерти
+ALIVE = 0
+WALL = 1
+TAIL = 2
+OBSTACLE = 3
+BOARD_FULL = 4
+
+DEATH_REASONS = {
+    ALIVE: "",
+    WALL: DEATH_WALL,
+    TAIL: DEATH_TAIL,
+    OBSTACLE: DEATH_OBSTACLE,
+    BOARD_FULL: WIN_MESSAGE,
+}
+
+EMPTY_STAMP = -(1 << 30)
+
+class BatchSimulation:
+    def __init__(self, count, mode=GameMode.CLASSIC, width=GRID_WIDTH, height=GRID_HEIGHT,
+                 seed=None, topology=None):
+        self.count = count
+        self.mode = mode
+        self.width = width
+        self.height = height
+        self.rng = np.random.default_rng(seed)
+        if topology is None:
+            topology = mode_topology(mode, width, height)
+        self.topology = topology
+        # вид на массив topology.next без копии, -1 (WALL) - хода нет
+        self.moves = np.frombuffer(topology.next, dtype=np.int32).reshape(width * height, 4)
+        # клетки вне поля, общие для всех досок
+        if topology.void is None:
+            self.void = np.zeros((height, width), dtype=bool)
+        else:
+            self.void = np.frombuffer(topology.void, dtype=np.uint8).reshape(height, width).astype(bool)
+        cx, cy = width // 2, height // 2
+        if self.void[cy:cy + 3, cx].any():
+            raise ValueError("начальная змейка не помещается на поле")
+
+        self.body = np.full((count, height, width), EMPTY_STAMP, dtype=np.int32)
+        self.obstacles = np.zeros((count, height, width), dtype=bool)
+        self.head_x = np.zeros(count, dtype=np.int32)
+        self.head_y = np.zeros(count, dtype=np.int32)
+        self.direction = np.zeros(count, dtype=np.int8)
+        self.length = np.zeros(count, dtype=np.int32)
+        self.body_len = np.zeros(count, dtype=np.int32)
+        self.score = np.zeros(count, dtype=np.int32)
+        self.speed = np.zeros(count, dtype=np.int32)
+        self.ticks = np.zeros(count, dtype=np.int32)
+        self.time = np.zeros(count, dtype=np.int64)
+        self.alive = np.zeros(count, dtype=bool)
+        self.death = np.zeros(count, dtype=np.int8)
+        self.food_x = np.zeros(count, dtype=np.int32)
+        self.food_y = np.zeros(count, dtype=np.int32)
+        self.food_special = np.zeros(count, dtype=bool)
+        self.food_timer = np.zeros(count, dtype=np.int64)
+        self.reset()
+
+    def reset(self, boards=None):
+        # boards - индексы или маска досок для сброса, None - все
+        if boards is None:
+            boards = np.arange(self.count)
+        boards = np.arange(self.count)[boards]
+        if len(boards) == 0:
+            return
+
+        cx, cy = self.width // 2, self.height // 2
+        self.body[boards] = EMPTY_STAMP
+        self.obstacles[boards] = False
+        # начальная змейка: голова в центре, тело уходит вниз
+        for i in range(3):
+            self.body[boards, cy + i, cx] = -i
+        self.head_x[boards] = cx
+        self.head_y[boards] = cy
+        self.direction[boards] = 0
+        self.length[boards] = 3
+        self.body_len[boards] = 3
+        self.score[boards] = 0
+        self.speed[boards] = SPEED
+        self.ticks[boards] = 0
+        self.time[boards] = 0
+        self.alive[boards] = True
+        self.death[boards] = ALIVE
+        self.spawn_food(boards)
+
+        if self.mode == GameMode.OBSTACLES:
+            self.generate_obstacles(boards)
+
+    def occupancy(self):
+        # маска клеток, занятых телом змейки, форма (N, H, W)
+        now = self.ticks - self.body_len
+        return self.body > now[:, None, None]
+
+    def free_cells(self, boards):
+        now = self.ticks[boards] - self.body_len[boards]
+        taken = self.body[boards] > now[:, None, None]
+        taken |= self.obstacles[boards]
+        taken |= self.void
+        return ~taken.reshape(len(boards), -1)
+
+    def pick_cells(self, free):
+        # случайная свободная клетка на каждой доске, -1 если свободных нет
+        keys = np.where(free, self.rng.random(free.shape), -1.0)
+        cells = keys.argmax(axis=1)
+        cells[~free.any(axis=1)] = -1
+        return cells
+
+    def spawn_food(self, boards):
+        cells = self.pick_cells(self.free_cells(boards))
+
+        full = cells < 0
+        if full.any():
+            done = boards[full]
+            self.alive[done] = False
+            self.death[done] = BOARD_FULL
+            boards, cells = boards[~full], cells[~full]
+
+        self.food_x[boards] = cells % self.width
+        self.food_y[boards] = cells // self.width
+        special = self.rng.random(len(boards)) < SPECIAL_FOOD_CHANCE
+        self.food_special[boards] = special
+        self.food_timer[boards] = np.where(special, self.time[boards] + SPECIAL_FOOD_LIFETIME, 0)
+
+    def generate_obstacles(self, boards, count=OBSTACLE_COUNT):
+        free = self.free_cells(boards).reshape(len(boards), self.height, self.width)
+        free[np.arange(len(boards)), self.food_y[boards], self.food_x[boards]] = False
+        # безопасная зона 5x5 вокруг головы
+        for dy in range(-2, 3):
+            for dx in range(-2, 3):
+                x = self.head_x[boards] + dx
+                y = self.head_y[boards] + dy
+                inside = (x >= 0) & (x < self.width) & (y >= 0) & (y < self.height)
+                free[np.arange(len(boards))[inside], y[inside], x[inside]] = False
+
+        free = free.reshape(len(boards), -1)
+        keys = np.where(free, self.rng.random(free.shape), -1.0)
+        chosen = np.argpartition(-keys, count - 1, axis=1)[:, :count]
+        obstacles = np.zeros_like(free)
+        np.put_along_axis(obstacles, chosen, True, axis=1)
+        # если свободных клеток меньше count, лишние попадут на занятые - отбрасываем
+        obstacles &= free
+        obstacles = obstacles.reshape(len(boards), self.height, self.width)
+
+        # закрытые карманы, как в Simulation.generate_obstacles, тоже становятся
+        # препятствиями; заливка snake_levels - по доске за раз
+        walls = (obstacles | self.void).view(np.uint8)
+        now = self.ticks[boards] - self.body_len[boards]
+        snake = self.body[boards] > now[:, None, None]
+        for i, board in enumerate(boards):
+            mask = snake_levels.seal_pockets(walls[i].tobytes(), self.width, self.height,
+                                             (int(self.head_x[board]), int(self.head_y[board])), self.topology)
+            sealed = np.frombuffer(mask, dtype=np.uint8).reshape(self.height, self.width) != 0
+            obstacles[i] = sealed & ~self.void & ~snake[i]
+        self.obstacles[boards] = obstacles
+
+        # еда, оказавшаяся в кармане, переезжает
+        walled = obstacles[np.arange(len(boards)), self.food_y[boards], self.food_x[boards]]
+        if walled.any():
+            self.spawn_food(boards[walled])
+
+    def step(self, actions=None):
+        # actions - массив кодов направлений (Direction.value) или NO_ACTION
+        if actions is not None:
+            actions = np.asarray(actions)
+            turn = (actions >= 0) & (actions != (self.direction + 2) % 4)
+            self.direction = np.where(turn, actions, self.direction).astype(np.int8)
+
+        boards = np.flatnonzero(self.alive)
+        if len(boards) == 0:
+            return self.alive
+
+        cells = self.head_y[boards] * self.width + self.head_x[boards]
+        target = self.moves[cells, self.direction[boards]]
+        wall = target < 0
+        # при ударе о стену голова остается на месте, дальше клетка не нужна
+        target = np.where(wall, cells, target)
+        y, x = np.divmod(target, self.width)
+
+        now = self.ticks[boards]
+        tail = ~wall & (self.body[boards, y, x] > now - self.body_len[boards])
+        hit = ~wall & ~tail
+        if self.mode == GameMode.OBSTACLES:
+            hit &= self.obstacles[boards, y, x]
+        else:
+            hit[:] = False
+
+        self.ticks[boards] += 1
+        self.time[boards] += self.speed[boards]
+
+        dead = wall | tail | hit
+        if dead.any():
+            self.alive[boards[dead]] = False
+            self.death[boards[wall]] = WALL
+            self.death[boards[tail]] = TAIL
+            self.death[boards[hit]] = OBSTACLE
+
+        moved = ~dead
+        boards, x, y = boards[moved], x[moved], y[moved]
+        self.body[boards, y, x] = self.ticks[boards]
+        self.head_x[boards] = x
+        self.head_y[boards] = y
+        self.body_len[boards] = np.minimum(self.body_len[boards] + 1, self.length[boards])
+
+        # проверка, съела ли змейка еду
+        ate = (x == self.food_x[boards]) & (y == self.food_y[boards])
+        eaten = boards[ate]
+        if len(eaten):
+            self.length[eaten] += 1
+            self.score[eaten] += FOOD_SCORE
+            faster = (self.score[eaten] % 50 == 0) & (self.speed[eaten] > MAX_SPEED)
+            self.speed[eaten[faster]] -= SPEED_INCREMENT
+            # если это была специальная еда, даем дополнительные очки
+            self.score[eaten[self.food_special[eaten]]] += SPECIAL_FOOD_BONUS
+
+        rest = boards[~ate]
+        expired = rest[self.food_special[rest] & (self.time[rest] > self.food_timer[rest])]
+        respawn = np.concatenate([eaten, expired])
+        if len(respawn):
+            self.spawn_food(respawn)
+
+        return self.alive
+
+    def death_reasons(self):
+        return [DEATH_REASONS[code] for code in self.death.tolist()]
@@ -0,0 +1,467 @@
+import argparse
+import os
+import statistics
+import time
+from array import array
+from collections import deque
+
+from snake_core import (
+    GRID_WIDTH, GRID_HEIGHT, BODY, OBSTACLE, OPPOSITE_DIRECTIONS, WIN_MESSAGE,
+    Direction, GameMode, Simulation,
+)
+import snake_snapshot
+from snake_topology import WALL
+
+# Автопилот: выбирает направление перед каждым тиком, результат передается
+# в Simulation.step (или Snake.update_direction).
+#
+# Путь к еде - поле расстояний, которое строит обход в ширину от еды по
+# сетке занятости. Еда стоит на месте, пока её не съедят, поэтому поле
+# переиспользуется все тики до следующей еды, а обход можно прервать и
+# продолжить на следующем тике. Перед ходом к еде змейка мысленно проходит
+# весь путь, съедает еду и проверяет, что от новой головы достижим хвост;
+# если нет - идет за хвостом, пока путь не станет безопасным. Вся работа за
+# тик укладывается в budget_us микросекунд: на проверку пути не хватило
+# времени - ход выбирается по проверке на один ход вперед.
+#
+# Прогон партий без окна: python snake_bot.py --games 100 --mode walls
+# Долгие партии на больших полях можно сохранять (--checkpoint) и продолжать
+# с сохраненного места (--resume), см. snake_snapshot.
+
+BUDGET_US = 300
+# как часто сверяться с часами, в развернутых клетках
+CHECK_EVERY = 8
+UNKNOWN = float("inf")
+DIRECTIONS = tuple(Direction)
+# нет соседа (стена), как в таблице snake_topology
+NO_CELL = WALL
+# раз в столько тиков партия сохраняется в файл --checkpoint
+CHECKPOINT_EVERY = 10000
+# стоимость скольких последних решений помнит бот: для среднего и p99 хватает,
+# а долгая партия не копит память
+COST_HISTORY = 10000
+
+class Autopilot:
+    def __init__(self, sim, budget_us=BUDGET_US):
+        self.sim = sim
+        # 0 и None - без ограничения
+        self.budget_us = budget_us or None
+        area = sim.width * sim.height
+        # Поле расстояний до еды и очередь обхода. Клетка в поле, если её
+        # метка равна текущему поколению: новое поле - просто следующее
+        # поколение, массивы не очищаются и не пересоздаются.
+        self.food = None
+        self.distances = array("i", [0]) * area
+        self.marks = array("i", [0]) * area
+        self.generation = 0
+        self.frontier = deque()
+        # метки посещенных клеток для escape, по тому же принципу
+        self.visits = array("i", [0]) * area
+        self.depths = array("i", [0]) * area
+        self.visit = 0
+        # тело после мысленного прохода в reaches_tail: номер клетки пути от
+        # новой головы, если её метка равна текущему visit
+        self.ghosts = array("i", [0]) * area
+        self.ghost_marks = array("i", [0]) * area
+        # stamps[клетка] - тик, на котором в неё вошла голова: по нему видно,
+        # через сколько ходов клетка тела освободится
+        self.stamps = array("i", [0]) * area
+        self.seen_ticks = None
+        # остаток проверенного пути к еде и тик, на котором сделан ход по нему
+        self.plan = deque()
+        self.plan_tick = None
+        # таблица ходов текущей партии (snake_topology), берется в track
+        self.moves = sim.current_topology().next
+        self.reset_stats()
+
+    def reset_stats(self):
+        # статистика для прогонов; бот, который играет много партий подряд,
+        # сбрасывает её перед каждой
+        self.decisions = 0
+        self.overruns = 0
+        self.costs = deque(maxlen=COST_HISTORY)
+
+    def neighbors(self, index):
+        # Соседи клетки в порядке DIRECTIONS из той же таблицы, по которой
+        # ходит Snake.move: переход через край, стены и порталы уже в ней,
+        # NO_CELL - хода нет. Срез массива - только числа, без объектов
+        # внутри, поэтому сборщик мусора его не обходит и на больших полях
+        # не растут паузы полной сборки.
+        return self.moves[index * 4:index * 4 + 4]
+
+    def blocked(self, index):
+        cell = self.sim.board.cells[index]
+        return cell == BODY or (cell == OBSTACLE and self.sim.mode == GameMode.OBSTACLES)
+
+    def track(self):
+        # отмечает новую голову; после сброса партии заново размечает всё тело
+        sim = self.sim
+        width = sim.width
+        if self.seen_ticks is None or sim.ticks != self.seen_ticks + 1:
+            for i, (x, y) in enumerate(sim.snake.positions):
+                self.stamps[y * width + x] = sim.ticks - i
+            # от режима и топологии зависит, куда ведут ходы
+            self.moves = sim.current_topology().next
+            self.restart()
+        else:
+            x, y = sim.snake.get_head_position()
+            self.stamps[y * width + x] = sim.ticks
+        self.seen_ticks = sim.ticks
+
+    def restart(self):
+        self.food = None
+        self.generation += 1
+        self.frontier.clear()
+
+    def distance(self, index):
+        # расстояние до еды, если обход уже дошел до клетки
+        return self.distances[index] if self.marks[index] == self.generation else UNKNOWN
+
+    def search(self, deadline, targets):
+        # продолжает обход от еды, пока не дойдет до одной из клеток targets
+        # (соседей головы), не кончится поле или время
+        position = self.sim.food.position
+        if position is None:
+            self.restart()
+            return
+        food = position[1] * self.sim.width + position[0]
+        distances, marks = self.distances, self.marks
+        if food != self.food:
+            self.restart()
+            self.food = food
+            marks[food] = self.generation
+            distances[food] = 0
+            self.frontier.append(food)
+
+        generation, frontier = self.generation, self.frontier
+        if any(marks[cell] == generation for cell in targets):
+            return
+        neighbors, blocked = self.neighbors, self.blocked
+        expanded = 0
+        while frontier:
+            if expanded % CHECK_EVERY == 0 and time.perf_counter_ns() > deadline:
+                return
+            cell = frontier.popleft()
+            distance = distances[cell] + 1
+            found = False
+            for nearby in neighbors(cell):
+                if nearby == NO_CELL or marks[nearby] == generation or blocked(nearby):
+                    continue
+                marks[nearby] = generation
+                distances[nearby] = distance
+                frontier.append(nearby)
+                found = found or nearby in targets
+            expanded += 1
+            # обход в ширину: первая найденная соседняя с головой клетка - ближайшая к еде
+            if found:
+                return
+
+    def path(self, cell):
+        # клетки от cell до еды по полю расстояний, ходами вперед; None, если
+        # так не дойти: поле устарело (путь занят телом) или переходы односторонние
+        distances, marks, generation = self.distances, self.marks, self.generation
+        blocked = self.blocked
+        path = [cell]
+        while distances[cell] > 0:
+            step = distances[cell] - 1
+            for nearby in self.neighbors(cell):
+                if (nearby != NO_CELL and marks[nearby] == generation and distances[nearby] == step
+                        and not blocked(nearby)):
+                    cell = nearby
+                    break
+            else:
+                return None
+            path.append(cell)
+        return path
+
+    def tail_wait(self, path, deadline):
+        # Змейка проходит path (последняя клетка - новая голова), съедает еду,
+        # если она там, и ищет обходом в ширину свой хвост: клетка тела
+        # проходима, если к нашему приходу освободится. Номер клетки тела от
+        # головы после прохода: у клеток пути - по пути, у нынешнего тела -
+        # нынешний номер плюс длина пути. 0 - хвост достижим; иначе сколько
+        # ходов пришлось бы переждать у ближайшей к освобождению клетки тела
+        # (UNKNOWN - тела не встретили); None - не успели.
+        sim = self.sim
+        snake = sim.snake
+        cells, stamps, ticks = sim.board.cells, self.stamps, sim.ticks
+        obstacles = sim.mode == GameMode.OBSTACLES
+        moves = len(path)
+        head = path[-1]
+        food = sim.food.position
+        eats = food is not None and head == food[1] * sim.width + food[0]
+        # клеток тела после прохода; клетка с номером i уходит через length - i ходов
+        body = min(snake.length, len(snake.positions) + moves)
+        length = snake.length + eats
+        neighbors, visits, depths = self.neighbors, self.visits, self.depths
+        ghosts, ghost_marks = self.ghosts, self.ghost_marks
+        self.visit += 1
+        visit = self.visit
+        for number, cell in enumerate(reversed(path)):
+            ghosts[cell] = number
+            ghost_marks[cell] = visit
+        visits[head] = visit
+        depths[head] = 0
+        wait = UNKNOWN
+        queue = deque([head])
+        expanded = 0
+        while queue:
+            if expanded % CHECK_EVERY == 0 and time.perf_counter_ns() > deadline:
+                return None
+            cell = queue.popleft()
+            steps = depths[cell]
+            expanded += 1
+            for nearby in neighbors(cell):
+                if nearby == NO_CELL or visits[nearby] == visit:
+                    continue
+                value = cells[nearby]
+                if ghost_marks[nearby] == visit:
+                    number = ghosts[nearby]
+                elif value == BODY:
+                    number = ticks - stamps[nearby] + moves
+                else:
+                    number = body
+                if number < body:
+                    # ход на клетку - steps + 1, к нему она должна уже освободиться
+                    if length - number <= steps:
+                        return 0
+                    wait = min(wait, length - number - steps)
+                    continue
+                if value == OBSTACLE and obstacles:
+                    continue
+                visits[nearby] = visit
+                depths[nearby] = steps + 1
+                queue.append(nearby)
+        return wait
+
+    def escape(self, start, deadline):
+        # Можно ли выжить после хода в start: обход в ширину, где клетка тела
+        # проходима, если освободится к моменту, когда до неё дойдем. Дошли до
+        # такой клетки (дальше можно идти за хвостом) или нашли места на всё
+        # тело - True; область меньше тела - False; не успели - None.
+        # Второе значение - размер найденной области.
+        sim = self.sim
+        snake = sim.snake
+        cells, stamps = sim.board.cells, self.stamps
+        obstacles = sim.mode == GameMode.OBSTACLES
+        body = len(snake.positions)
+        # сколько ходов еще растет змейка (съеденная еда), плюс еда в start
+        growth = snake.length - body + (start == self.food)
+        need = body + growth
+        neighbors, visits, depths = self.neighbors, self.visits, self.depths
+        self.visit += 1
+        visit = self.visit
+        visits[start] = visit
+        depths[start] = 1
+        size = 1
+        # в очереди только номера клеток, число ходов до клетки - в depths
+        queue = deque([start])
+        expanded = 0
+        while queue:
+            if size > need:
+                return True, size
+            if expanded % CHECK_EVERY == 0 and time.perf_counter_ns() > deadline:
+                return None, size
+            cell = queue.popleft()
+            steps = depths[cell]
+            expanded += 1
+            for nearby in neighbors(cell):
+                if nearby == NO_CELL or visits[nearby] == visit:
+                    continue
+                value = cells[nearby]
+                if value == BODY:
+                    # сегмент с номером i от головы уходит через body - i ходов (плюс рост)
+                    if body - (sim.ticks - stamps[nearby]) + growth <= steps:
+                        return True, size
+                    continue
+                if value == OBSTACLE and obstacles:
+                    continue
+                visits[nearby] = visit
+                depths[nearby] = steps + 1
+                size += 1
+                queue.append(nearby)
+        return False, size
+
+    def distance_hint(self, index):
+        # манхэттенское расстояние до еды (с переходом через край в CLASSIC),
+        # пока обход не дошел до головы
+        sim = self.sim
+        if sim.food.position is None:
+            return 0
+        dx = abs(index % sim.width - sim.food.position[0])
+        dy = abs(index // sim.width - sim.food.position[1])
+        if sim.current_topology().wrap:
+            dx = min(dx, sim.width - dx)
+            dy = min(dy, sim.height - dy)
+        return dx + dy
+
+    def decide(self):
+        # направление на следующий тик или None, если любой ход смертелен
+        start = time.perf_counter_ns()
+        # поиск еды и проверки пути останавливаются на 70% бюджета, проверка
+        # на один ход - на 90%: остаток уходит на проверку часов раз в
+        # CHECK_EVERY клеток и выбор хода. Без бюджета (None) решения не
+        # зависят от скорости машины и партии повторяются по seed
+        if self.budget_us is None:
+            deadline = fallback = UNKNOWN
+        else:
+            deadline = start + self.budget_us * 700
+            fallback = start + self.budget_us * 900
+        snake = self.sim.snake
+        if not snake.is_alive:
+            return None
+        self.track()
+
+        head_x, head_y = snake.get_head_position()
+        head = head_y * self.sim.width + head_x
+        moves = [(direction, cell) for direction, cell in zip(DIRECTIONS, self.neighbors(head))
+                 if cell != NO_CELL and direction != OPPOSITE_DIRECTIONS[snake.direction]
+                 and not self.blocked(cell)]
+        if not moves:
+            return None
+
+        # Путь к еде, проверенный на прошлом тике: пока змейка идет по нему и
+        # еда на месте, в конце будет то же поле, что при проверке, и
+        # проверять заново не нужно
+        plan = self.plan
+        food = self.sim.food.position
+        if (plan and self.plan_tick == self.sim.ticks - 1 and food is not None
+                and plan[-1] == food[1] * self.sim.width + food[0]):
+            cell = plan.popleft()
+            for direction, free in moves:
+                if free == cell:
+                    self.plan_tick = self.sim.ticks
+                    return self.decided(start, direction)
+        plan.clear()
+
+        self.search(deadline, {cell for _, cell in moves})
+        distance = self.distance
+        moves.sort(key=lambda move: (distance(move[1]), self.distance_hint(move[1]),
+                                     move[0] != snake.direction))
+        if distance(moves[0][1]) == UNKNOWN and not self.frontier:
+            # поле устарело: путь перекрыло тело, перестроим на следующем тике
+            self.restart()
+
+        choice = None
+        timed_out = False
+        # к еде - только если после неё хвост достижим
+        for direction, cell in moves:
+            if distance(cell) == UNKNOWN:
+                break
+            path = self.path(cell)
+            if path is None:
+                # поле расстояний устарело, перестроим на следующем тике
+                self.restart()
+                break
+            wait = self.tail_wait(path, deadline)
+            if wait is None:
+                timed_out = True
+                break
+            if wait == 0:
+                choice = direction
+                plan.extend(path[1:])
+                self.plan_tick = self.sim.ticks
+                break
+        if choice is None and not timed_out:
+            # иначе за хвостом: ход, после которого хвост достижим, а если
+            # такого нет - к клетке тела, которая освободится раньше всех
+            best = None
+            for direction, cell in moves:
+                wait = self.tail_wait([cell], deadline)
+                if wait is None:
+                    timed_out = True
+                    break
+                if best is None or wait < best[0]:
+                    best = (wait, direction)
+                if wait == 0:
+                    break
+            if not timed_out:
+                choice = best[1]
+        if choice is not None:
+            return self.decided(start, choice)
+
+        # время вышло: проверка на один ход вперед по старой схеме
+        largest = None
+        for direction, cell in moves:
+            safe, size = self.escape(cell, fallback)
+            if safe or safe is None:
+                # None - время вышло, берем лучший из оставшихся ходов
+                choice = direction
+                break
+            if largest is None or size > largest[0]:
+                largest = (size, direction)
+        if choice is None:
+            # выхода нет при любом ходе - тянем время в самой большой области
+            choice = largest[1]
+        return self.decided(start, choice)
+
+    def decided(self, start, choice):
+        cost = (time.perf_counter_ns() - start) / 1000
+        self.decisions += 1
+        self.costs.append(cost)
+        if self.budget_us is not None and cost > self.budget_us:
+            self.overruns += 1
+        return choice
+
+def save_checkpoint(sim, path):
+    # через временный файл, чтобы прерванная запись не испортила прошлый снимок
+    temporary = path + ".tmp"
+    snake_snapshot.save(sim, temporary)
+    os.replace(temporary, path)
+
+def play(mode=GameMode.CLASSIC, width=GRID_WIDTH, height=GRID_HEIGHT, seed=None,
+         budget_us=BUDGET_US, max_ticks=None, sim=None, checkpoint=None):
+    # одна партия под автопилотом; max_ticks ограничивает бесконечное кружение.
+    # sim - уже идущая партия (например, из снимка), checkpoint - файл для снимков
+    if sim is None:
+        sim = Simulation(mode, width, height, seed=seed)
+    bot = Autopilot(sim, budget_us)
+    if max_ticks is None:
+        max_ticks = sim.width * sim.height * 50
+    while sim.snake.is_alive and not sim.won and sim.ticks < max_ticks:
+        sim.step(bot.decide())
+        if checkpoint is not None and sim.ticks % CHECKPOINT_EVERY == 0:
+            save_checkpoint(sim, checkpoint)
+    if checkpoint is not None:
+        save_checkpoint(sim, checkpoint)
+    return sim, bot
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Прогон партий под автопилотом")
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--mode", choices=[mode.name.lower() for mode in GameMode], default="classic")
+    parser.add_argument("--width", type=int, default=GRID_WIDTH)
+    parser.add_argument("--height", type=int, default=GRID_HEIGHT)
+    parser.add_argument("--budget", type=int, default=BUDGET_US, help="бюджет на тик, мкс; 0 - без ограничения, партии повторяются по seed")
+    parser.add_argument("--seed", type=int, default=0, help="seed первой партии, дальше по порядку")
+    parser.add_argument("--checkpoint", help=f"сохранять текущую партию в файл раз в {CHECKPOINT_EVERY} тиков")
+    parser.add_argument("--resume", help="продолжить партию из снимка (одна партия, режим и поле из снимка)")
+    args = parser.parse_args()
+
+    mode = GameMode[args.mode.upper()]
+    resumed = None
+    if args.resume:
+        resumed = snake_snapshot.load(args.resume)
+        mode, args.width, args.height, args.games = resumed.mode, resumed.width, resumed.height, 1
+    scores, lengths, costs, decisions, overruns, outcomes = [], [], [], 0, 0, {}
+    started = time.perf_counter()
+    for game in range(args.games):
+        sim, bot = play(mode, args.width, args.height, args.seed + game, args.budget,
+                        sim=resumed, checkpoint=args.checkpoint)
+        scores.append(sim.snake.score)
+        lengths.append(sim.snake.length)
+        costs.extend(bot.costs)
+        decisions += bot.decisions
+        overruns += bot.overruns
+        outcome = WIN_MESSAGE if sim.won else sim.snake.death_reason or "лимит тиков"
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    costs.sort()
+    print(f"партий {args.games} за {time.perf_counter() - started:.1f} с, режим {mode.name}, "
+          f"поле {args.width}x{args.height}")
+    print(f"счет: средний {statistics.mean(scores):.0f}, максимум {max(scores)}, "
+          f"длина до {max(lengths)}")
+    print(f"решение: среднее {statistics.mean(costs):.0f} мкс, p99 {costs[int(len(costs) * 0.99)]:.0f} мкс, "
+          f"сверх бюджета {overruns} из {decisions}")
+    for outcome, count in sorted(outcomes.items(), key=lambda item: -item[1]):
+        print(f"  {outcome}: {count}")
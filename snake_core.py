@@ -0,0 +1,435 @@
+import random
+from array import array
+from collections import deque, namedtuple
+from enum import Enum
+from itertools import compress
+
+import snake_levels
+import snake_topology
+from snake_topology import WALL
+
+# Ядро симуляции без pygame: правила змейки, еды и препятствий.
+# Работает без окна и без ограничения кадров, поэтому подходит для ботов и тестов.
+
+GRID_WIDTH = 40
+GRID_HEIGHT = 30
+
+SPEED = 100
+MAX_SPEED = 30
+SPEED_INCREMENT = 2
+
+FOOD_SCORE = 10
+SPECIAL_FOOD_BONUS = 15
+SPECIAL_FOOD_CHANCE = 0.15
+SPECIAL_FOOD_LIFETIME = 5000  # еда исчезает через 5 секунд игрового времени
+
+OBSTACLE_COUNT = 10
+
+# сколько поворотов можно нажать заранее, они применяются по одному за тик
+DIRECTION_QUEUE_SIZE = 3
+
+DEATH_WALL = "Столкновение со стеной!"
+DEATH_TAIL = "Столкновение с хвостом!"
+DEATH_OBSTACLE = "Столкновение с препятствием!"
+WIN_MESSAGE = "Поле заполнено - победа!"
+
+class Direction(Enum):
+    UP = 0
+    RIGHT = 1
+    DOWN = 2
+    LEFT = 3
+
+# Режимы игры (сложность)
+class GameMode(Enum):
+    CLASSIC = 0     # Классический режим с переходом через края
+    WALLS = 1       # Режим проигрыш при столкновении со стеной
+    OBSTACLES = 2   # Режим с препятствиями
+
+DIRECTION_DELTAS = {
+    Direction.UP: (0, -1),
+    Direction.RIGHT: (1, 0),
+    Direction.DOWN: (0, 1),
+    Direction.LEFT: (-1, 0),
+}
+
+OPPOSITE_DIRECTIONS = {
+    Direction.UP: Direction.DOWN,
+    Direction.DOWN: Direction.UP,
+    Direction.LEFT: Direction.RIGHT,
+    Direction.RIGHT: Direction.LEFT,
+}
+
+# содержимое клеток поля
+EMPTY = 0
+BODY = 1
+OBSTACLE = 2
+FOOD = 3
+# клетки вне поля неправильной формы (см. snake_topology)
+VOID = 4
+
+# bytes.translate: препятствия и клетки вне поля -> 1, остальные -> 0
+OBSTACLE_FLAGS = bytes([0, 0, 1, 0, 1] + [0] * 251)
+
+# результат одного шага симуляции
+StepResult = namedtuple("StepResult", "alive ate score length head death_reason won")
+
+class Board:
+    # Сетка занятости: по одному байту на клетку, проверка клетки за O(1).
+    # Рядом хранится индекс свободных клеток: массив free и обратная карта
+    # slot (клетка -> место в free). Удаление - обменом с последним элементом,
+    # поэтому случайная свободная клетка выбирается за O(1) без перебора.
+    def __init__(self, width=GRID_WIDTH, height=GRID_HEIGHT):
+        self.width = width
+        self.height = height
+        self.cells = bytearray(width * height)
+        # список измененных клеток для отрисовки; None - не отслеживать
+        self.dirty = None
+        # готовый список 0..size-1: на больших полях копировать его заметно
+        # быстрее, чем заново проходить range по всем клеткам в clear
+        self.identity = array("i", range(width * height))
+        self.clear()
+
+    def get(self, pos):
+        return self.cells[pos[1] * self.width + pos[0]]
+
+    def set(self, pos, value):
+        self.set_index(pos[1] * self.width + pos[0], value)
+
+    def set_index(self, index, value):
+        old = self.cells[index]
+        self.cells[index] = value
+        if self.dirty is not None:
+            self.dirty.append(index)
+        if old == EMPTY and value != EMPTY:
+            free, slot = self.free, self.slot
+            last = free.pop()
+            if last != index:
+                free[slot[index]] = last
+                slot[last] = slot[index]
+            slot[index] = -1
+        elif old != EMPTY and value == EMPTY:
+            self.slot[index] = len(self.free)
+            self.free.append(index)
+
+    def clear(self):
+        size = len(self.cells)
+        self.cells[:] = bytes(size)
+        self.free = self.identity[:]
+        self.slot = self.identity[:]
+
+    def fill_mask(self, mask, value):
+        # value ставится во все пустые клетки, где mask != 0; клетки маски
+        # перебирает compress в C, поэтому пустые участки ничего не стоят.
+        # Возвращает индексы измененных клеток.
+        cells = self.cells
+        changed = [index for index in compress(self.identity, mask) if cells[index] == EMPTY]
+        for index in changed:
+            self.set_index(index, value)
+        return changed
+
+    def free_count(self):
+        return len(self.free)
+
+    def random_free(self, rng=random):
+        # случайная свободная клетка или None, если поле заполнено
+        if not self.free:
+            return None
+        index = self.free[rng.randrange(len(self.free))]
+        return (index % self.width, index // self.width)
+
+class Snake:
+    def __init__(self, width=GRID_WIDTH, height=GRID_HEIGHT, board=None):
+        self.width = width
+        self.height = height
+        self.board = board if board is not None else Board(width, height)
+        self.positions = deque()
+        self.reset()
+
+    def reset(self):
+        self.length = 3
+        head_x, head_y = self.width // 2, self.height // 2
+        self.set_body([(head_x, head_y + i) for i in range(self.length)])
+
+        self.direction = Direction.UP
+        self.direction_queue = deque()
+        self.score = 0
+        self.speed = SPEED
+        self.is_alive = True
+        self.death_reason = ""
+
+    def set_body(self, positions):
+        # ставит тело целиком, голова - первый элемент
+        for pos in self.positions:
+            if self.board.get(pos) == BODY:
+                self.board.set(pos, EMPTY)
+        self.positions = deque(positions)
+        for pos in self.positions:
+            self.board.set(pos, BODY)
+        self.length = max(self.length, len(self.positions))
+
+    def get_head_position(self):
+        return self.positions[0]
+
+    @property
+    def next_direction(self):
+        return self.direction_queue[0] if self.direction_queue else self.direction
+
+    def update_direction(self, direction):
+        # поворот сверяется с последним поворотом в очереди, поэтому быстрый
+        # двойной поворот (например, вверх и сразу влево) не теряется
+        last = self.direction_queue[-1] if self.direction_queue else self.direction
+        if direction == last or direction == OPPOSITE_DIRECTIONS[last]:
+            return
+        if len(self.direction_queue) < DIRECTION_QUEUE_SIZE:
+            self.direction_queue.append(direction)
+
+    def move(self, mode=GameMode.CLASSIC, topology=None):
+        # topology - snake_topology.Topology; по умолчанию обычная для режима
+        if not self.is_alive:
+            return
+        if self.direction_queue:
+            self.direction = self.direction_queue.popleft()
+        if topology is None:
+            topology = mode_topology(mode, self.width, self.height)
+        head_x, head_y = self.get_head_position()
+
+        # переход через край, стены и порталы уже посчитаны в таблице
+        index = topology.next[(head_y * self.width + head_x) * 4 + self.direction.value]
+        if index == WALL:
+            self.die(DEATH_WALL)
+            return
+
+        #Новая позиция головы
+        new_head = (index % self.width, index // self.width)
+        cell = self.board.cells[index]
+        if cell == BODY:
+            self.die(DEATH_TAIL)
+            return
+
+        if cell == OBSTACLE and mode == GameMode.OBSTACLES:
+            self.die(DEATH_OBSTACLE)
+            return
+
+        self.push_head(new_head)
+
+    def push_head(self, position):
+        # новая голова без проверок, хвост уходит, если тело длиннее length.
+        # Отдельно от move, чтобы ход, посчитанный в другом месте (на сервере),
+        # повторить на копии змейки
+        x, y = position
+        self.positions.appendleft(position)
+        self.board.set_index(y * self.width + x, BODY)
+        while len(self.positions) > self.length:
+            tail_x, tail_y = self.positions.pop()
+            self.board.set_index(tail_y * self.width + tail_x, EMPTY)
+
+    def grow(self):
+        self.length += 1
+        self.score += FOOD_SCORE
+
+        if self.score % 50 == 0 and self.speed > MAX_SPEED:
+            self.speed -= SPEED_INCREMENT
+
+    def die(self, reason=""):
+        if self.is_alive:
+            self.is_alive = False
+            self.death_reason = reason
+
+def mode_topology(mode, width, height):
+    # обычная топология режима: тор в CLASSIC, стены по краям в остальных
+    return snake_topology.standard(width, height, mode == GameMode.CLASSIC)
+
+class Food:
+    def __init__(self, width=GRID_WIDTH, height=GRID_HEIGHT, board=None, rng=None):
+        self.width = width
+        self.height = height
+        self.board = board if board is not None else Board(width, height)
+        self.rng = rng if rng is not None else random.Random()
+        self.position = None
+        self.special = False
+        self.special_timer = 0
+        self.randomize_position()
+
+    def randomize_position(self, now=0):
+        # старая клетка освобождается, если её ещё не заняла голова
+        if self.position is not None and self.board.get(self.position) == FOOD:
+            self.board.set(self.position, EMPTY)
+
+        # свободных клеток нет - поле заполнено, еде некуда встать
+        self.position = self.board.random_free(self.rng)
+        if self.position is None:
+            self.special = False
+            self.special_timer = 0
+            return False
+        self.board.set(self.position, FOOD)
+
+        if self.rng.random() < SPECIAL_FOOD_CHANCE:
+            self.special = True
+            self.special_timer = now + SPECIAL_FOOD_LIFETIME
+        else:
+            self.special = False
+            self.special_timer = 0
+        return True
+
+    def is_expired(self, now):
+        return self.special and now > self.special_timer
+
+class Simulation:
+    # Одна партия: змейка, еда и препятствия. Время считается в игровых
+    # миллисекундах: каждый шаг длится snake.speed мс, как в оконной игре.
+    # Вся случайность партии идет из self.rng, засеянного self.seed, поэтому
+    # партия с тем же seed, режимом и поворотами повторяется один в один.
+    def __init__(self, mode=GameMode.CLASSIC, width=GRID_WIDTH, height=GRID_HEIGHT,
+                 snake=None, food=None, seed=None, board=None, level=None, topology=None):
+        self.mode = mode
+        # своя топология поля (snake_topology.Topology: порталы, форма поля);
+        # None - обычная для режима
+        self.topology = topology
+        # уровень для режима с препятствиями (snake_levels.LevelSpec); None - OBSTACLE_COUNT случайных
+        self.level = level
+        self.rng = random.Random()
+        self.seed = None
+        # записывающий объект (например, snake_replay.Replay), вызывается после каждого тика
+        self.recorder = None
+        self.width = width
+        self.height = height
+        # готовую сетку можно передать, чтобы на больших полях не строить лишнюю
+        self.board = board if board is not None else Board(width, height)
+        self.snake = snake if snake is not None else Snake(width, height, self.board)
+        self.food = food if food is not None else Food(width, height, self.board)
+        # змейка и еда должны смотреть в одну общую сетку
+        self.snake.board = self.board
+        self.food.board = self.board
+        self.food.rng = self.rng
+        self.obstacles = []
+        self.time = 0
+        self.ticks = 0
+        self.won = False
+        self.reset(seed=seed)
+
+    def reset(self, mode=None, seed=None):
+        # без seed партия получает новый случайный seed, он сохраняется в self.seed
+        if mode is not None:
+            self.mode = mode
+        if seed is None:
+            seed = random.getrandbits(63)
+        self.seed = seed
+        self.rng.seed(seed)
+        self.recorder = None
+        self.time = 0
+        self.ticks = 0
+        self.won = False
+        self.obstacles = []
+        self.board.clear()
+        topology = self.current_topology()
+        if topology.void is not None:
+            self.board.fill_mask(topology.void, VOID)
+        self.snake.positions.clear()
+        self.snake.reset()
+        if not all(topology.is_open(pos) for pos in self.snake.positions):
+            raise ValueError("начальная змейка (центр поля и две клетки ниже) вне поля топологии")
+        self.food.position = None
+        self.food.randomize_position(self.time)
+
+        # если режим с препятствиями, генерируем их
+        if self.mode == GameMode.OBSTACLES:
+            if self.level is None:
+                self.generate_obstacles()
+            else:
+                self.build_level()
+
+    def current_topology(self):
+        if self.topology is not None:
+            return self.topology
+        return mode_topology(self.mode, self.width, self.height)
+
+    def generate_obstacles(self, count=None):
+        # число берется при вызове, чтобы его можно было поменять для прогонов баланса
+        if count is None:
+            count = OBSTACLE_COUNT
+        board = self.board
+        for pos in self.obstacles:
+            board.set(pos, EMPTY)
+        self.obstacles = []
+        head_x, head_y = self.snake.get_head_position()
+
+        # безопасную зону вокруг головы временно убираем из свободных клеток
+        safe_zone = []
+        for x in range(max(0, head_x - 2), min(self.width, head_x + 3)):
+            for y in range(max(0, head_y - 2), min(self.height, head_y + 3)):
+                if board.get((x, y)) == EMPTY:
+                    board.set((x, y), OBSTACLE)
+                    safe_zone.append((x, y))
+
+        #случайные препятствия: только пустые клетки - не змейка, не еда, не другое препятствие
+        for _ in range(count):
+            pos = board.random_free(self.rng)
+            if pos is None:
+                break
+            board.set(pos, OBSTACLE)
+            self.obstacles.append(pos)
+
+        for pos in safe_zone:
+            board.set(pos, EMPTY)
+
+        # закрытые карманы, куда змейка не доберется, тоже становятся препятствиями
+        mask = snake_levels.seal_pockets(board.cells.translate(OBSTACLE_FLAGS),
+                                         self.width, self.height, (head_x, head_y), self.current_topology())
+        self.place_obstacles(mask)
+
+    def build_level(self):
+        # уровень берется из кэша snake_levels по размеру поля, параметрам и seed
+        for pos in self.obstacles:
+            self.board.set(pos, EMPTY)
+        self.obstacles = []
+        mask = snake_levels.level_mask(self.width, self.height, self.level, self.seed,
+                                       self.snake.get_head_position(), self.current_topology())
+        self.place_obstacles(mask)
+
+    def place_obstacles(self, mask):
+        # ставит препятствия по маске в пустые клетки; еда, оказавшаяся
+        # под препятствием или в кармане, переезжает
+        food = self.food.position
+        moved = food is not None and mask[food[1] * self.width + food[0]]
+        if moved:
+            self.board.set(food, EMPTY)
+        width = self.width
+        self.obstacles.extend((index % width, index // width)
+                              for index in self.board.fill_mask(mask, OBSTACLE))
+        if moved:
+            self.food.position = None
+            self.food.randomize_position(self.time)
+
+    def step(self, action=None):
+        # action - новое направление (Direction) или None, чтобы ехать прямо
+        snake = self.snake
+        ate = False
+        if action is not None:
+            snake.update_direction(action)
+
+        if snake.is_alive and not self.won:
+            snake.move(self.mode, self.current_topology())
+            self.ticks += 1
+            self.time += snake.speed
+
+        if snake.is_alive and not self.won:
+            # проверка, съела ли змейка еду
+            if snake.get_head_position() == self.food.position:
+                ate = True
+                snake.grow()
+
+                # если это была специальная еда, даем дополнительные очки
+                if self.food.special:
+                    snake.score += SPECIAL_FOOD_BONUS
+
+                # новая еда; если её некуда поставить - поле заполнено, это победа
+                if not self.food.randomize_position(self.time):
+                    self.won = True
+            elif self.food.is_expired(self.time):
+                self.food.randomize_position(self.time)
+
+        if self.recorder is not None:
+            self.recorder.on_tick(self)
+
+        return StepResult(snake.is_alive, ate, snake.score, snake.length,
+                          snake.get_head_position(), snake.death_reason, self.won)
@@ -1,21 +1,22 @@
 import pygame
 import sys
+import argparse
+import functools
 import random
-import time
+from collections import deque
 from enum import Enum
 import math
 
-pygame.init()
+import numpy as np
+
+import snake_core
+from snake_core import GRID_WIDTH, GRID_HEIGHT, SPEED, Direction, GameMode, Simulation
+from snake_levels import LEVEL_KINDS, LevelSpec
+from snake_profiler import FrameProfiler
 
 SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 600
 GRID_SIZE = 20
-GRID_WIDTH = SCREEN_WIDTH // GRID_SIZE
-GRID_HEIGHT = SCREEN_HEIGHT // GRID_SIZE
-
-SPEED = 100
-MAX_SPEED = 30
-SPEED_INCREMENT = 2
 
 BLACK = (0, 0, 0)
 WHITE = (255, 255, 255)
@@ -28,258 +29,661 @@ PURPLE = (128, 0, 128)
 GRAY = (169, 169, 169)
 CYAN = (0, 255, 255)
 ORANGE = (255, 165, 0)
+BACKGROUND_COLORKEY = (255, 0, 255)
 
-class Direction(Enum):
-    UP = 0
-    RIGHT = 1
-    DOWN = 2
-    LEFT = 3
-
-# Режимы игры (сложность)
-class GameMode(Enum):
-    CLASSIC = 0     # Классический режим с переходом через края
-    WALLS = 1       # Режим проигрыш при столкновении со стеной
-    OBSTACLES = 2   # Режим с препятствиями
-
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption("Змейка - Python Game")
-font_large = pygame.font.SysFont('Arial', 72)
-font_medium = pygame.font.SysFont('Arial', 36)
-font_small = pygame.font.SysFont('Arial', 24)
+# Окно и шрифты создаются при первой отрисовке, в init_display, а не при
+# импорте: импорт для замеров и проверок не открывает окно, не ищет
+# системные шрифты и не поднимает звук и остальные подсистемы SDL.
+screen = None
+font_large = None
+font_medium = None
+font_small = None
+# пиксели экрана без окна (init_offscreen), None - экран это окно
+pixels = None
 clock = pygame.time.Clock()
 
-class Particle:
-    def __init__(self, x, y, color, size=5, lifetime=60):
-        self.x = x
-        self.y = y
-        self.color = color
-        self.size = size
-        self.lifetime = lifetime
-        self.age = 0
+def init_fonts():
+    global font_large, font_medium, font_small
+    pygame.font.init()
+    font_large = pygame.font.SysFont('Arial', 72)
+    font_medium = pygame.font.SysFont('Arial', 36)
+    font_small = pygame.font.SysFont('Arial', 24)
+
+def init_display():
+    # только видео (с ним и события) и шрифты; повторные вызовы ничего не делают
+    global screen
+    if screen is not None:
+        return screen
+    pygame.display.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption("Змейка - Python Game")
+    init_fonts()
+    return screen
+
+def init_offscreen():
+    # Экран без окна для ботов и агентов: поверхность поверх массива NumPy
+    # (pygame.image.frombuffer), игра рисует прямо в pixels. Кадр отдается
+    # видом на этот массив - без копий и без блокировки поверхности, которую
+    # держал бы вид pygame.surfarray.pixels3d. Вызывать до первой отрисовки:
+    # если окно уже открыто, кадры были бы копиями, поэтому это ошибка.
+    global screen, pixels
+    if pixels is not None:
+        return screen
+    if screen is not None:
+        raise RuntimeError("экран уже открыт в окне: init_offscreen нужно вызвать до init_display")
+    pixels = np.zeros((SCREEN_HEIGHT, SCREEN_WIDTH, 4), dtype=np.uint8)
+    screen = pygame.image.frombuffer(pixels, (SCREEN_WIDTH, SCREEN_HEIGHT), "RGBX")
+    init_fonts()
+    return screen
+
+# размер квадрата, по которым препятствия разложены для отбора видимых
+OBSTACLE_CHUNK = 16
+# размер квадрата слоя тела змейки (BodyLayer), в клетках
+BODY_CHUNK = 16
+# слой тела отстал от змейки больше чем на столько ходов - рисуется заново целиком
+BODY_CATCH_UP = 64
+
+# частота кадров не зависит от скорости змейки
+FPS = 60
+# сколько тиков симуляции можно догнать за один медленный кадр
+MAX_CATCH_UP_TICKS = 5
+
+# сюда сохраняется запись последней партии
+REPLAY_FILE = "last_replay.snkr"
+
+ARROW_KEYS = {
+    pygame.K_UP: Direction.UP,
+    pygame.K_DOWN: Direction.DOWN,
+    pygame.K_LEFT: Direction.LEFT,
+    pygame.K_RIGHT: Direction.RIGHT,
+}
+
+MODE_NAMES = {
+    GameMode.CLASSIC: "Классический",
+    GameMode.WALLS: "Стены",
+    GameMode.OBSTACLES: "Препятствия"
+}
+
+@functools.lru_cache(maxsize=256)
+def render_text(font, text, color, antialias=True):
+    # Кэш готовых надписей: постоянные строки рендерятся один раз,
+    # счет, FPS и время - только когда меняется значение.
+    # Возвращаемую поверхность нельзя изменять, она общая.
+    return font.render(text, antialias, color)
+
+# Сегменты змейки рисуются готовыми плитками (заливка и черная рамка).
+# Градиент тела и переход в красный после смерти разбиты на ступени,
+# поэтому разных плиток конечное число и все они берутся из кэша.
+GRADIENT_STEPS = 64
+DEATH_STEPS = 32
+
+@functools.lru_cache(maxsize=1024)
+def segment_tile(color):
+    # возвращаемую плитку нельзя изменять, она общая
+    tile = pygame.Surface((GRID_SIZE, GRID_SIZE))
+    tile.fill(color)
+    pygame.draw.rect(tile, BLACK, tile.get_rect(), 1)
+    return tile
+
+def gradient_color(color, step):
+    # цвет сегмента на ступени градиента step (0 - у головы, GRADIENT_STEPS - в конце тела)
+    gradient_factor = step / GRADIENT_STEPS * 0.7
+    r = max(0, int(color[0] * (1 - gradient_factor)))
+    g = max(0, int(color[1] * (1 - gradient_factor / 3)))
+    b = max(0, int(color[2] * (1 - gradient_factor)))
+    return (r, g, b)
+
+def death_color(color, step):
+    progress = step / DEATH_STEPS
+    return tuple(int(c * (1 - progress) + red * progress) for c, red in zip(color, RED))
+
+@functools.lru_cache(maxsize=64)
+def gradient_colors(body_color, head_color):
+    # цвета плиток по номеру: 0 - голова, 1 + ступень - тело
+    return (head_color,) + tuple(gradient_color(body_color, step) for step in range(GRADIENT_STEPS + 1))
+
+@functools.lru_cache(maxsize=64)
+def gradient_tiles(body_color, head_color):
+    return tuple(segment_tile(color) for color in gradient_colors(body_color, head_color))
+
+class ParticleSystem:
+    # Все частицы хранятся в массивах NumPy и обновляются одним проходом.
+    # Рисуются готовыми спрайтами из кэша (цвет, размер, ступень прозрачности),
+    # поэтому на кадр не создается ни одной новой поверхности.
+    ALPHA_STEPS = 16
+    sprites = {}
+
+    def __init__(self):
+        self.rng = np.random.default_rng()
+        self.clear()
+
+    def clear(self):
+        self.x = np.zeros(0)
+        self.y = np.zeros(0)
+        self.dx = np.zeros(0)
+        self.dy = np.zeros(0)
+        self.age = np.zeros(0, dtype=np.int32)
+        self.lifetime = np.zeros(0, dtype=np.int32)
+        self.size = np.zeros(0, dtype=np.int32)
+        self.color = np.zeros(0, dtype=np.int32)
+        self.palette = []
+
+    def __len__(self):
+        return len(self.x)
+
+    def emit(self, xs, ys, colors, size=5, lifetime=60):
+        # по одной частице в каждую точку (xs[i], ys[i]), цвет случайный из colors
+        count = len(xs)
         # случайное направление
-        angle = random.uniform(0, 2 * math.pi)
-        speed = random.uniform(1, 4)
-        self.dx = math.cos(angle) * speed
-        self.dy = math.sin(angle) * speed
-    
+        angle = self.rng.uniform(0, 2 * math.pi, count)
+        speed = self.rng.uniform(1, 4, count)
+        color_ids = []
+        for color in colors:
+            if color not in self.palette:
+                self.palette.append(color)
+            color_ids.append(self.palette.index(color))
+
+        self.x = np.concatenate([self.x, xs])
+        self.y = np.concatenate([self.y, ys])
+        self.dx = np.concatenate([self.dx, np.cos(angle) * speed])
+        self.dy = np.concatenate([self.dy, np.sin(angle) * speed])
+        self.age = np.concatenate([self.age, np.zeros(count, dtype=np.int32)])
+        self.lifetime = np.concatenate([self.lifetime, np.full(count, lifetime, dtype=np.int32)])
+        self.size = np.concatenate([self.size, np.full(count, size, dtype=np.int32)])
+        self.color = np.concatenate([self.color, self.rng.choice(color_ids, count)])
+
     def update(self):
         self.x += self.dx
         self.y += self.dy
         self.age += 1
-        return self.age < self.lifetime
-
-    def draw(self, surface):
-        alpha = max(0, 255 * (1 - self.age / self.lifetime))
-        s = pygame.Surface((self.size*2, self.size*2), pygame.SRCALPHA)
-        pygame.draw.circle(s, (*self.color, int(alpha)), (self.size, self.size), self.size)
-        surface.blit(s, (self.x - self.size, self.y - self.size))
-
-class Obstacle:
-    def __init__(self, position):
-        self.position = position
-        self.color = GRAY
-        self.pulse_counter = 0
+        alive = self.age < self.lifetime
+        if not alive.all():
+            for name in ("x", "y", "dx", "dy", "age", "lifetime", "size", "color"):
+                setattr(self, name, getattr(self, name)[alive])
 
-    def update(self):
-        # Медленная пульсация препятствия
-        self.pulse_counter = (self.pulse_counter + 0.05) % (2 * math.pi)
-        
-    def draw(self, surface):
-        # Пульсирующий эффект для препятствия
-        pulse = math.sin(self.pulse_counter) * 0.2 + 0.8
-        color = tuple(min(255, int(c * pulse)) for c in self.color)
-
-        rect = pygame.Rect(
-            self.position[0] * GRID_SIZE, 
-            self.position[1] * GRID_SIZE, 
-            GRID_SIZE, 
-            GRID_SIZE
+    @classmethod
+    def sprite(cls, color, size, level):
+        key = (color, size, level)
+        sprite = cls.sprites.get(key)
+        if sprite is None:
+            alpha = 255 * level // (cls.ALPHA_STEPS - 1)
+            sprite = pygame.Surface((size*2, size*2), pygame.SRCALPHA)
+            pygame.draw.circle(sprite, (*color, alpha), (size, size), size)
+            cls.sprites[key] = sprite
+        return sprite
+
+    def draw(self, surface, offset=(0, 0)):
+        if not len(self):
+            return
+        fade = np.maximum(0.0, 1 - self.age / self.lifetime)
+        levels = np.rint(fade * (self.ALPHA_STEPS - 1)).astype(np.int32).tolist()
+        left = (self.x - self.size + offset[0]).astype(np.int32).tolist()
+        top = (self.y - self.size + offset[1]).astype(np.int32).tolist()
+        sprite = self.sprite
+        palette = self.palette
+        surface.blits(
+            [(sprite(palette[c], size, level), (x, y))
+             for c, size, level, x, y in zip(self.color.tolist(), self.size.tolist(), levels, left, top)],
+            False,
         )
-        pygame.draw.rect(surface, color, rect)
-        pygame.draw.rect(surface, BLACK, rect, 1)
-
-        line_color = (40, 40, 40)
-        x, y = self.position[0] * GRID_SIZE, self.position[1] * GRID_SIZE
-        pygame.draw.line(surface, line_color, 
-                        (x + 3, y + 3), 
-                        (x + GRID_SIZE - 3, y + GRID_SIZE - 3), 2)
-        pygame.draw.line(surface, line_color, 
-                        (x + GRID_SIZE - 3, y + 3), 
-                        (x + 3, y + GRID_SIZE - 3), 2)
-
-class Snake:
-    def __init__(self):
-        self.reset()
 
-    def reset(self):
-        self.length = 3
-        self.positions = [(GRID_WIDTH // 2, GRID_HEIGHT // 2)]
-        for i in range(1, self.length):
-            self.positions.append((self.positions[0][0], self.positions[0][1] + i))
-
-        self.direction = Direction.UP
-        self.next_direction = Direction.UP
-        self.score = 0
-        self.speed = SPEED
-        self.is_alive = True
-        self.death_time = 0
-        self.particles = []
-        self.death_reason = ""
+# Пульсация препятствий разбита на ступени яркости, для каждой ступени
+# своя готовая плитка. Нечетное число, чтобы средняя яркость 0.8 была ступенью
+PULSE_STEPS = 33
 
-    def get_head_position(self):
-        return self.positions[0]
+@functools.lru_cache(maxsize=256)
+def obstacle_tile(color, level):
+    # плитка препятствия на ступени яркости level; её нельзя изменять, она общая
+    pulse = 0.6 + 0.4 * level / (PULSE_STEPS - 1)
+    tile = pygame.Surface((GRID_SIZE, GRID_SIZE))
+    rect = tile.get_rect()
+    pygame.draw.rect(tile, tuple(min(255, int(c * pulse)) for c in color), rect)
+    pygame.draw.rect(tile, BLACK, rect, 1)
 
-    def update_direction(self, direction):
-        if (direction == Direction.UP and self.direction != Direction.DOWN) or \
-           (direction == Direction.DOWN and self.direction != Direction.UP) or \
-           (direction == Direction.LEFT and self.direction != Direction.RIGHT) or \
-           (direction == Direction.RIGHT and self.direction != Direction.LEFT):
-            self.next_direction = direction
+    line_color = (40, 40, 40)
+    pygame.draw.line(tile, line_color, (3, 3), (GRID_SIZE - 3, GRID_SIZE - 3), 2)
+    pygame.draw.line(tile, line_color, (GRID_SIZE - 3, 3), (3, GRID_SIZE - 3), 2)
+    return tile
 
-    def move(self):
-        if not self.is_alive:
-            return
-        self.direction = self.next_direction
-        head_x, head_y = self.get_head_position()        
-
-        if self.direction == Direction.UP:
-            head_y -= 1
-        elif self.direction == Direction.DOWN:
-            head_y += 1
-        elif self.direction == Direction.LEFT:
-            head_x -= 1
-        elif self.direction == Direction.RIGHT:
-            head_x += 1
-
-        if game.mode == GameMode.CLASSIC:
-            head_x %= GRID_WIDTH
-            head_y %= GRID_HEIGHT
-        elif game.mode == GameMode.WALLS or game.mode == GameMode.OBSTACLES:
-            if head_x < 0 or head_x >= GRID_WIDTH or head_y < 0 or head_y >= GRID_HEIGHT:
-                self.die("Столкновение со стеной!")
-                return
+class ObstacleLayer:
+    # Все препятствия партии: одна общая фаза пульсации и отрисовка одним
+    # вызовом blits. Клетки берутся из симуляции и не меняются при отрисовке;
+    # для отбора видимых они разложены по квадратам OBSTACLE_CHUNK клеток.
+    def __init__(self, color=GRAY):
+        self.color = color
+        self.pulse_counter = 0
+        self.chunks = {}
+
+    def set(self, positions):
+        self.chunks = {}
+        for x, y in positions:
+            self.chunks.setdefault((x // OBSTACLE_CHUNK, y // OBSTACLE_CHUNK), []).append((x, y))
+
+    def update(self, dt=SPEED):
+        # Медленная пульсация препятствий: 0.05 радиана за каждые SPEED мс
+        self.pulse_counter = (self.pulse_counter + 0.05 * dt / SPEED) % (2 * math.pi)
+
+    def tile(self):
+        level = round((math.sin(self.pulse_counter) + 1) / 2 * (PULSE_STEPS - 1))
+        return obstacle_tile(self.color, level)
+
+    def visible(self, view):
+        x0, y0, x1, y1 = view
+        chunks = self.chunks
+        for cy in range(y0 // OBSTACLE_CHUNK, (y1 - 1) // OBSTACLE_CHUNK + 1):
+            for cx in range(x0 // OBSTACLE_CHUNK, (x1 - 1) // OBSTACLE_CHUNK + 1):
+                yield from chunks.get((cx, cy), ())
 
-        #Новая позиция головы
-        new_head = (head_x, head_y)
-        if new_head in self.positions:
-            self.die("Столкновение с хвостом!")
+    def draw(self, surface, offset=(0, 0), view=None):
+        # view - видимые клетки (x0, y0, x1, y1); None - все препятствия
+        if not self.chunks:
             return
+        ox, oy = offset
+        cells = self.visible(view) if view is not None else (
+            position for chunk in self.chunks.values() for position in chunk)
+        tile = self.tile()
+        surface.blits([(tile, (x * GRID_SIZE + ox, y * GRID_SIZE + oy)) for x, y in cells], False)
 
-        if game.mode == GameMode.OBSTACLES:
-            for obstacle in game.obstacles:
-                if new_head == obstacle.position:
-                    self.die("Столкновение с препятствием!")
-                    return
+# цвета змеек арены по номеру змейки
+ARENA_COLORS = (CYAN, ORANGE, PURPLE, YELLOW, BLUE, (255, 105, 180))
 
-        self.positions.insert(0, new_head)
-        
-        if len(self.positions) > self.length:
-            self.positions.pop()
-            
-    def grow(self):
-        self.length += 1
-        self.score += 10
+class ArenaLayer:
+    # Чужие змейки и еда арены (snake_arena). У змеек арены нет своих
+    # объектов отрисовки: видимые клетки берутся прямо из общей сетки, цвет -
+    # по владельцу клетки (Arena.owner), голова темнее тела. Всё уходит в
+    # один вызов blits.
+    def draw(self, surface, arena, offset=(0, 0), view=None, skip=None):
+        # skip - номер змейки, которую рисует сама игра (змейка игрока)
+        width, height = arena.width, arena.height
+        x0, y0, x1, y1 = view if view is not None else (0, 0, width, height)
+        ox, oy = offset
+        cells = np.frombuffer(arena.board.cells, dtype=np.uint8).reshape(height, width)[y0:y1, x0:x1]
+        owner = np.frombuffer(arena.owner, dtype=np.int32).reshape(height, width)[y0:y1, x0:x1]
+        blits = []
+
+        ys, xs = np.nonzero(cells == snake_core.BODY)
+        ids = owner[ys, xs]
+        if skip is not None:
+            keep = ids != skip
+            xs, ys, ids = xs[keep], ys[keep], ids[keep]
+        colors = len(ARENA_COLORS)
+        tiles = [segment_tile(ARENA_COLORS[number % colors]) for number in range(colors)]
+        blits.extend(zip([tiles[number] for number in (ids % colors).tolist()],
+                         zip(((xs + x0) * GRID_SIZE + ox).tolist(), ((ys + y0) * GRID_SIZE + oy).tolist())))
+        for player in arena.players:
+            snake = player.snake
+            if player.id == skip or not snake.is_alive:
+                continue
+            x, y = snake.positions[0]
+            if x0 <= x < x1 and y0 <= y < y1:
+                color = ARENA_COLORS[player.id % colors]
+                blits.append((segment_tile(tuple(c // 2 for c in color)),
+                              (x * GRID_SIZE + ox, y * GRID_SIZE + oy)))
+
+        # особая еда мигает, как Food.draw
+        special = YELLOW if (pygame.time.get_ticks() // 200) % 2 == 0 else PURPLE
+        ys, xs = np.nonzero(cells == snake_core.FOOD)
+        for x, y in zip((xs + x0).tolist(), (ys + y0).tolist()):
+            food = arena.food_at.get(y * width + x)
+            color = special if food is not None and food.special else RED
+            blits.append((segment_tile(color), (x * GRID_SIZE + ox, y * GRID_SIZE + oy)))
+        surface.blits(blits, False)
+
+class ChunkGrid:
+    # Значение на клетку поля квадратами BODY_CHUNK x BODY_CHUNK, квадрат
+    # заводится при первой записи в него. Змейка касается малой части
+    # большого поля, а массив на всё поле у каждой змейки (и у каждой змейки
+    # других игроков в сетевой игре) на 2000x2000 стоил бы десятки МБ.
+    # В клетках без квадрата - empty.
+    def __init__(self, dtype, empty=0):
+        self.dtype = dtype
+        self.empty = empty
+        self.chunks = {}
+
+    def get(self, x, y):
+        chunk = self.chunks.get((x // BODY_CHUNK, y // BODY_CHUNK))
+        if chunk is None:
+            return self.empty
+        return chunk[y % BODY_CHUNK, x % BODY_CHUNK]
 
-        if self.score % 50 == 0 and self.speed > MAX_SPEED:
-            self.speed -= SPEED_INCREMENT
+    def set(self, x, y, value):
+        key = (x // BODY_CHUNK, y // BODY_CHUNK)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            chunk = self.chunks[key] = np.full((BODY_CHUNK, BODY_CHUNK), self.empty, dtype=self.dtype)
+        chunk[y % BODY_CHUNK, x % BODY_CHUNK] = value
+
+    def clear(self):
+        self.chunks.clear()
+
+    def block(self, x0, y0, x1, y1):
+        # значения клеток x0 <= x < x1, y0 <= y < y1 одним массивом (высота, ширина)
+        out = np.full((y1 - y0, x1 - x0), self.empty, dtype=self.dtype)
+        chunks = self.chunks
+        for cy in range(y0 // BODY_CHUNK, (y1 - 1) // BODY_CHUNK + 1):
+            for cx in range(x0 // BODY_CHUNK, (x1 - 1) // BODY_CHUNK + 1):
+                chunk = chunks.get((cx, cy))
+                if chunk is None:
+                    continue
+                left, top = max(x0, cx * BODY_CHUNK), max(y0, cy * BODY_CHUNK)
+                right, bottom = min(x1, (cx + 1) * BODY_CHUNK), min(y1, (cy + 1) * BODY_CHUNK)
+                dx, dy = cx * BODY_CHUNK, cy * BODY_CHUNK
+                out[top - y0:bottom - y0, left - x0:right - x0] = chunk[top - dy:bottom - dy, left - dx:right - dx]
+        return out
+
+class BodyLayer:
+    # Тело змейки без хвоста, заранее нарисованное в квадраты BODY_CHUNK x
+    # BODY_CHUNK клеток. Квадраты 8-битные: в клетке лежит номер плитки, а
+    # цвета задает палитра (0 - прозрачный BACKGROUND_COLORKEY, 1 - рамка,
+    # 2 + номер - заливка плитки как в gradient_tiles). Кадр - один blit на
+    # видимый квадрат, а не на каждый сегмент; перекраска всего тела при
+    # смерти - только смена палитры. После тика в слое меняются только новая
+    # и бывшая голова, ушедшие клетки, бывший и новый хвост и сегменты на
+    # границах ступеней градиента: при сдвиге тела на ход ступень меняется
+    # только у них.
+    def __init__(self, snake):
+        self.snake = snake
+        self.chunks = {}
+        self.palette = [BACKGROUND_COLORKEY, BLACK] + list(gradient_colors(snake.body_color, snake.head_color))
+        # номер плитки в каждой клетке слоя (как в gradient_tiles), -1 - пусто
+        self.numbers = ChunkGrid(np.int16, -1)
+        # клетки тела на момент прошлой синхронизации, голова первая
+        self.cells = deque()
+        # moves змейки на момент прошлой синхронизации, None - рисовать заново
+        self.moves = None
+        self.length = 1
+
+    def invalidate(self):
+        self.moves = None
+
+    def recolor(self, colors):
+        # colors - цвета заливки плиток по номеру
+        palette = [BACKGROUND_COLORKEY, BLACK] + list(colors)
+        if palette != self.palette:
+            self.palette = palette
+            for chunk in self.chunks.values():
+                chunk.set_palette(palette)
+
+    def chunk(self, x, y):
+        key = (x // BODY_CHUNK, y // BODY_CHUNK)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            chunk = pygame.Surface((BODY_CHUNK * GRID_SIZE, BODY_CHUNK * GRID_SIZE), depth=8)
+            chunk.set_palette(self.palette)
+            chunk.fill(0)
+            chunk.set_colorkey(0)
+            self.chunks[key] = chunk
+        return chunk
+
+    def paint(self, x, y, number):
+        if self.numbers.get(x, y) != number:
+            self.numbers.set(x, y, number)
+            rect = pygame.Rect(x % BODY_CHUNK * GRID_SIZE, y % BODY_CHUNK * GRID_SIZE, GRID_SIZE, GRID_SIZE)
+            chunk = self.chunk(x, y)
+            chunk.fill(number + 2, rect)
+            pygame.draw.rect(chunk, 1, rect, 1)
+
+    def clear(self, x, y):
+        if self.numbers.get(x, y) >= 0:
+            self.numbers.set(x, y, -1)
+            self.chunk(x, y).fill(0, (x % BODY_CHUNK * GRID_SIZE, y % BODY_CHUNK * GRID_SIZE,
+                                      GRID_SIZE, GRID_SIZE))
+
+    def number(self, i, length):
+        if i == 0:
+            return 0
+        return min(GRADIENT_STEPS, (i * GRADIENT_STEPS + length // 2) // length) + 1
+
+    def boundaries(self, length):
+        # первый номер сегмента на каждой ступени градиента 1..GRADIENT_STEPS
+        return [-((length // 2 - k * length) // GRADIENT_STEPS) for k in range(1, GRADIENT_STEPS + 1)]
+
+    def repaint(self):
+        snake = self.snake
+        for chunk in self.chunks.values():
+            chunk.fill(0)
+        self.numbers.clear()
+        self.cells = deque(snake.positions)
+        self.moves = snake.moves
+        self.length = max(1, snake.length)
+        for i, (x, y) in enumerate(self.cells):
+            if i < len(self.cells) - 1:
+                self.paint(x, y, self.number(i, self.length))
+        return list(self.cells)
+
+    def sync(self):
+        # догоняет змейку; возвращает клетки, которые изменились в слое
+        snake = self.snake
+        positions = snake.positions
+        moved = snake.moves - self.moves if self.moves is not None else -1
+        if not 0 <= moved <= BODY_CATCH_UP:
+            return self.repaint()
+        length = max(1, snake.length)
+        if moved == 0 and length == self.length:
+            return []
+        changed = []
+        cells = self.cells
+        count = len(cells)
+        for i in range(min(moved, len(positions)) - 1, -1, -1):
+            cells.appendleft(positions[i])
+        while len(cells) > len(positions):
+            x, y = cells.pop()
+            self.clear(x, y)
+            changed.append((x, y))
+
+        last = len(positions) - 1
+        # новые клетки и бывшая голова, бывший хвост, если змейка выросла,
+        # и сегменты, у которых сменилась ступень градиента
+        indices = set(range(min(moved + 1, last)))
+        indices.update(range(max(0, count - 1 + moved), last))
+        for old, new in zip(self.boundaries(self.length), self.boundaries(length)):
+            old += moved
+            indices.update(range(max(0, min(old, new)), min(max(old, new), last)))
+        numbers = self.numbers
+        for i in indices:
+            x, y = positions[i]
+            number = self.number(i, length)
+            if numbers.get(x, y) != number:
+                self.paint(x, y, number)
+                changed.append((x, y))
+        if positions:
+            x, y = positions[last]
+            if numbers.get(x, y) >= 0:
+                self.clear(x, y)
+                changed.append((x, y))
+        self.moves = snake.moves
+        self.length = length
+        return changed
+
+    def draw(self, surface, offset=(0, 0), view=None):
+        # view - видимые клетки (x0, y0, x1, y1), None - всё поле
+        ox, oy = offset
+        x0, y0, x1, y1 = view if view is not None else (0, 0, self.snake.width, self.snake.height)
+        chunks = self.chunks
+        for cy in range(y0 // BODY_CHUNK, (y1 - 1) // BODY_CHUNK + 1):
+            for cx in range(x0 // BODY_CHUNK, (x1 - 1) // BODY_CHUNK + 1):
+                chunk = chunks.get((cx, cy))
+                if chunk is None:
+                    continue
+                left, top = max(x0, cx * BODY_CHUNK), max(y0, cy * BODY_CHUNK)
+                right, bottom = min(x1, (cx + 1) * BODY_CHUNK), min(y1, (cy + 1) * BODY_CHUNK)
+                area = pygame.Rect((left - cx * BODY_CHUNK) * GRID_SIZE, (top - cy * BODY_CHUNK) * GRID_SIZE,
+                                   (right - left) * GRID_SIZE, (bottom - top) * GRID_SIZE)
+                surface.blit(chunk, (left * GRID_SIZE + ox, top * GRID_SIZE + oy), area)
+
+class Snake(snake_core.Snake):
+    # Змейка для отрисовки: правила берутся из snake_core, здесь только эффекты.
+    # Чтобы рисовать только видимую часть тела, не обходя его целиком, в stamps
+    # хранится номер хода, на котором голова вошла в клетку: номер сегмента
+    # в клетке - moves - stamps.get(x, y).
+    def __init__(self, width=GRID_WIDTH, height=GRID_HEIGHT, board=None,
+                 body_color=GREEN, head_color=DARK_GREEN):
+        self.stamps = ChunkGrid(np.int32)
+        self.moves = 0
+        # свои цвета у змеек других игроков в сетевой игре
+        self.body_color = body_color
+        self.head_color = head_color
+        self.width, self.height = width, height
+        self.layer = BodyLayer(self)
+        super().__init__(width, height, board)
+
+    def reset(self):
+        super().reset()
+        self.death_time = 0
+        self.particles = ParticleSystem()
+        # видимые клетки (x0, y0, x1, y1), их задает камера; None - всё поле
+        self.view = None
+
+    def set_body(self, positions):
+        super().set_body(positions)
+        self.layer.invalidate()
+        self.moves += len(self.positions)
+        for i, (x, y) in enumerate(self.positions):
+            self.stamps.set(x, y, self.moves - i)
+
+    def push_head(self, position):
+        super().push_head(position)
+        self.moves += 1
+        x, y = position
+        self.stamps.set(x, y, self.moves)
+
+    def visible_segments(self, view=None):
+        # Клетки тела внутри view и номера их сегментов (0 - голова);
+        # стоимость зависит от размера окна, а не от длины змейки. На общем
+        # поле арены в клетках BODY есть и чужие тела: свои - те, куда голова
+        # входила за последние len(positions) ходов.
+        x0, y0, x1, y1 = view if view is not None else (0, 0, self.width, self.height)
+        cells = np.frombuffer(self.board.cells, dtype=np.uint8).reshape(self.height, self.width)
+        ys, xs = np.nonzero(cells[y0:y1, x0:x1] == snake_core.BODY)
+        indices = self.moves - self.stamps.block(x0, y0, x1, y1)[ys, xs]
+        xs += x0
+        ys += y0
+        own = indices < len(self.positions)
+        if not own.all():
+            xs, ys, indices = xs[own], ys[own], indices[own]
+        return xs, ys, indices
 
     def die(self, reason=""):
         if self.is_alive:
-            self.is_alive = False
+            super().die(reason)
             self.death_time = pygame.time.get_ticks()
-            self.death_reason = reason
-            
-            for _ in range(80):
-                hx = self.positions[0][0] * GRID_SIZE + GRID_SIZE/2
-                hy = self.positions[0][1] * GRID_SIZE + GRID_SIZE/2
-                color = random.choice([RED, YELLOW, GREEN, BLUE, PURPLE])
-                self.particles.append(Particle(hx, hy, color))
-
-            for pos in self.positions:
-                for _ in range(5):
-                    px = pos[0] * GRID_SIZE + GRID_SIZE/2
-                    py = pos[1] * GRID_SIZE + GRID_SIZE/2
-                    color = random.choice([RED, ORANGE, YELLOW])
-                    self.particles.append(Particle(px, py, color, size=3, lifetime=45))
+
+            hx = self.positions[0][0] * GRID_SIZE + GRID_SIZE/2
+            hy = self.positions[0][1] * GRID_SIZE + GRID_SIZE/2
+            self.particles.emit(np.full(80, hx), np.full(80, hy), [RED, YELLOW, GREEN, BLUE, PURPLE])
+
+            # искры только от видимой части тела, иначе длинная змейка дает миллионы частиц
+            xs, ys, _ = self.visible_segments(self.view)
+            body_x = xs * GRID_SIZE + GRID_SIZE/2
+            body_y = ys * GRID_SIZE + GRID_SIZE/2
+            self.particles.emit(np.repeat(body_x, 5), np.repeat(body_y, 5),
+                                [RED, ORANGE, YELLOW], size=3, lifetime=45)
 
     def update_particles(self):
-        self.particles = [p for p in self.particles if p.update()]
+        self.particles.update()
 
-    def draw_particles(self, surface):
-        for p in self.particles:
-            p.draw(surface)
+    def draw_particles(self, surface, offset=(0, 0)):
+        self.particles.draw(surface, offset)
 
-    def draw(self, surface):
-        self.draw_particles(surface)
-        for i, (x, y) in enumerate(self.positions):
-            if not self.is_alive:
-                progress = min(1.0, (pygame.time.get_ticks() - self.death_time) / 1000.0)
-                color_blend = (
-                    int(GREEN[0] * (1 - progress) + RED[0] * progress),
-                    int(GREEN[1] * (1 - progress) + RED[1] * progress),
-                    int(GREEN[2] * (1 - progress) + RED[2] * progress)
-                )
-                color = color_blend
-            else:
-                if i == 0:
-                    color = DARK_GREEN
-                else:
-                    color = GREEN
-                    
-                    # Градиентная окраска тела
-                    gradient_factor = (i / self.length) * 0.7
-                    r = max(0, int(GREEN[0] * (1 - gradient_factor)))
-                    g = max(0, int(GREEN[1] * (1 - gradient_factor / 3)))
-                    b = max(0, int(GREEN[2] * (1 - gradient_factor)))
-                    color = (r, g, b)
-
-            segment_rect = pygame.Rect(x * GRID_SIZE, y * GRID_SIZE, GRID_SIZE, GRID_SIZE)
-            pygame.draw.rect(surface, color, segment_rect)
-            pygame.draw.rect(surface, BLACK, segment_rect, 1)
-
-class Food:
-    def __init__(self):
-        self.position = (0, 0)
-        self.color = RED
-        self.special = False
-        self.special_timer = 0
-        self.randomize_position()
-    
-    def randomize_position(self, snake_positions=None):
-        if snake_positions is None:
-            snake_positions = []
-        
-        while True:
-            x = random.randint(0, GRID_WIDTH - 1)
-            y = random.randint(0, GRID_HEIGHT - 1)
-            if (x, y) not in snake_positions:
-                break
-        
-        self.position = (x, y)
-     
-        if random.random() < 0.15:
-            self.special = True
-            self.color = YELLOW
-            self.special_timer = pygame.time.get_ticks() + 5000  # еда исчезает через 5 секунд
+    def death_step(self):
+        # ступень перехода в красный: за секунду после смерти от 0 до DEATH_STEPS
+        return min(DEATH_STEPS, (pygame.time.get_ticks() - self.death_time) * DEATH_STEPS // 1000)
+
+    def gradient_step(self, i):
+        return min(GRADIENT_STEPS, (i * GRADIENT_STEPS + self.length // 2) // max(1, self.length))
+
+    def segment_color(self, i):
+        if not self.is_alive:
+            return death_color(self.body_color, self.death_step())
+        if i == 0:
+            return self.head_color
+        # Градиентная окраска тела
+        return gradient_color(self.body_color, self.gradient_step(i))
+
+    def segment_tiles(self, indices):
+        # плитки для сегментов с номерами indices (массив NumPy)
+        if not self.is_alive:
+            return [segment_tile(death_color(self.body_color, self.death_step()))] * len(indices)
+        tiles = gradient_tiles(self.body_color, self.head_color)
+        length = max(1, self.length)
+        numbers = np.minimum(GRADIENT_STEPS, (indices * GRADIENT_STEPS + length // 2) // length) + 1
+        numbers[indices == 0] = 0
+        return [tiles[number] for number in numbers.tolist()]
+
+    def draw(self, surface, offset=(0, 0), progress=0.0, view=None):
+        # progress - доля пути до следующего тика: голова заезжает в следующую
+        # клетку, а хвост уезжает из своей, так движение плавное между тиками.
+        # view - видимые клетки (x0, y0, x1, y1), рисуются только они.
+        # Частицы рисуются отдельно, через draw_particles
+        # Тело берется из слоя (BodyLayer), хвост и заезжающая голова
+        # рисуются поверх; погибшая краснеет вся сразу - у слоя меняется
+        # палитра. Если после смерти змейку переставили, слой её не догонял:
+        # тогда сегменты по сетке уходят в один вызов blits.
+        ox, oy = offset
+        layer = self.layer
+        if not self.is_alive and layer.moves != self.moves:
+            xs, ys, indices = self.visible_segments(view)
+            tiles = self.segment_tiles(indices)
+            surface.blits(list(zip(tiles, zip((xs * GRID_SIZE + ox).tolist(),
+                                              (ys * GRID_SIZE + oy).tolist()))), False)
+            return
+
+        if self.is_alive:
+            colors = gradient_colors(self.body_color, self.head_color)
+            shift = int(progress * GRID_SIZE)
         else:
-            self.special = False
-            self.color = RED
-            self.special_timer = 0
-    
-    def draw(self, surface):
+            colors = (death_color(self.body_color, self.death_step()),) * (GRADIENT_STEPS + 2)
+            shift = 0
+        layer.recolor(colors)
+        layer.sync()
+        layer.draw(surface, offset, view)
+        last = len(self.positions) - 1
+        blits = []
+        if last >= 0:
+            x, y = self.positions[last]
+            tile = segment_tile(colors[layer.number(last, max(1, self.length))])
+            if shift and last >= self.length - 1 and last > 0:
+                # хвост съезжает к предпоследнему сегменту, поэтому рисуется поверх него
+                dx, dy = self.step_towards((x, y), self.positions[last - 1])
+                blits.append((tile, (x * GRID_SIZE + ox + dx * shift, y * GRID_SIZE + oy + dy * shift)))
+            elif view is None or (view[0] <= x < view[2] and view[1] <= y < view[3]):
+                blits.append((tile, (x * GRID_SIZE + ox, y * GRID_SIZE + oy)))
+
+        if shift:
+            x, y = self.positions[0]
+            dx, dy = snake_core.DIRECTION_DELTAS[self.next_direction]
+            blits.append((segment_tile(self.head_color),
+                          (x * GRID_SIZE + ox + dx * shift, y * GRID_SIZE + oy + dy * shift)))
+        surface.blits(blits, False)
+
+    def step_towards(self, cell, target):
+        # единичный шаг от клетки к соседней с учетом перехода через край
+        dx, dy = target[0] - cell[0], target[1] - cell[1]
+        if abs(dx) > 1:
+            dx = -1 if dx > 0 else 1
+        if abs(dy) > 1:
+            dy = -1 if dy > 0 else 1
+        return dx, dy
+
+class Food(snake_core.Food):
+    @property
+    def color(self):
+        return YELLOW if self.special else RED
+
+    def draw(self, surface, offset=(0, 0)):
+        if self.position is None:
+            return
         food_rect = pygame.Rect(
-            self.position[0] * GRID_SIZE, 
-            self.position[1] * GRID_SIZE, 
+            self.position[0] * GRID_SIZE + offset[0], 
+            self.position[1] * GRID_SIZE + offset[1], 
             GRID_SIZE, 
             GRID_SIZE
         )
         
         if self.special:
+            # истечение спец-еды считает симуляция, здесь только мигание
             current_time = pygame.time.get_ticks()
-            if current_time > self.special_timer:
-                self.randomize_position()
-                return
-            
+
             # Мигание для специальной еды
             if (current_time // 200) % 2 == 0:
                 pygame.draw.rect(surface, self.color, food_rect)
@@ -289,6 +693,33 @@ class Food:
             pygame.draw.rect(surface, self.color, food_rect) 
         pygame.draw.rect(surface, BLACK, food_rect, 1)
 
+class Camera:
+    # Окно в мир: левый верхний угол в пикселях мира. Следует за головой и
+    # не выходит за края поля; по оси, где поле помещается на экран, стоит в 0.
+    def __init__(self, width=GRID_WIDTH, height=GRID_HEIGHT):
+        self.width = width
+        self.height = height
+        self.x = 0
+        self.y = 0
+
+    @property
+    def fixed(self):
+        # поле целиком на экране, камера никогда не двигается
+        return self.width * GRID_SIZE <= SCREEN_WIDTH and self.height * GRID_SIZE <= SCREEN_HEIGHT
+
+    def follow(self, px, py):
+        # px, py - точка мира в пикселях, которую держим в центре экрана
+        max_x = max(0, self.width * GRID_SIZE - SCREEN_WIDTH)
+        max_y = max(0, self.height * GRID_SIZE - SCREEN_HEIGHT)
+        self.x = min(max(0, int(px) - SCREEN_WIDTH // 2), max_x)
+        self.y = min(max(0, int(py) - SCREEN_HEIGHT // 2), max_y)
+
+    def view(self):
+        # видимые клетки (x0, y0, x1, y1), x1 и y1 не включаются
+        return (self.x // GRID_SIZE, self.y // GRID_SIZE,
+                min(self.width, (self.x + SCREEN_WIDTH - 1) // GRID_SIZE + 1),
+                min(self.height, (self.y + SCREEN_HEIGHT - 1) // GRID_SIZE + 1))
+
 class GameState(Enum):
     MENU = 0
     GAME = 1
@@ -297,13 +728,51 @@ class GameState(Enum):
     MODE_SELECT = 4  # новое состояние для выбора режима игры 
 
 class Game:
-    def __init__(self):
-        self.snake = Snake()
-        self.food = Food()
+    def __init__(self, dirty_rects=False, replay=None, profile_dump=None,
+                 width=GRID_WIDTH, height=GRID_HEIGHT, level=None, scores=None, autopilot=False,
+                 net=None, arena_snakes=0, offscreen=False):
+        # правила игры живут в симуляции, Game только рисует и обрабатывает ввод
+        if replay is not None:
+            width, height = replay.width, replay.height
+        board = snake_core.Board(width, height)
+        self.sim = Simulation(GameMode.CLASSIC, width, height, snake=Snake(width, height, board),
+                              food=Food(width, height, board), board=board)
+        # поле может быть намного больше экрана, рисуется только то, что видит камера
+        self.camera = Camera(width, height)
+        # уровень для режима с препятствиями (snake_levels.LevelSpec), None - обычные препятствия
+        self.level = level
+        self.snake = self.sim.snake
+        self.food = self.sim.food
         self.state = GameState.MENU
-        self.high_score = 0
+        # запись текущей партии и запись, которую сейчас показываем (если есть)
+        self.replay = None
+        self.playback = replay
+        self.playback_actions = {}
         self.mode = GameMode.CLASSIC
-        self.obstacles = []
+        # автопилот (клавиша A): выбирает направление перед каждым тиком;
+        # создается при первом включении, тогда же импортируется snake_bot
+        self.autopilot = None
+        self.autopilot_on = autopilot
+        # партии, где играл автопилот, не попадают в рекорды
+        self.autopilot_used = False
+        # Сетевая игра: net - snake_net.Connection, правила считает сервер,
+        # здесь только его состояние. remote_snakes - змейки других игроков
+        # (у каждой своя сетка для отрисовки), remote_foods - еда комнаты.
+        self.net = net
+        self.player_id = None
+        self.room_tick_ms = SPEED
+        self.remote_snakes = {}
+        self.remote_foods = []
+        self.net_board = snake_core.Board(width, height) if net is not None else None
+        # ждем от сервера новую змейку после R
+        self.respawning = False
+        # Арена (snake_arena): змейка игрока и arena_snakes ботов на общем
+        # поле. Арена создается при выборе режима и живет, пока режим тот же.
+        self.arena_snakes = arena_snakes
+        self.arena = None
+        self.arena_player = None
+        self.arena_layer = ArenaLayer()
+        self.obstacle_layer = ObstacleLayer()
 
         #эффекты переходов
         self.transition_alpha = 255
@@ -311,97 +780,144 @@ class Game:
         self.transition_surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
         self.transition_surface.fill(BLACK)
         self.game_over_time = 0
-        # загрузка или создание рекорда
-        self.load_high_score()
+        # накопленное время до следующего тика симуляции, мс
+        self.tick_accumulator = 0
+        # рекорды по режимам; запись на диск идет в фоновом потоке
+        if scores is None:
+            import snake_scores
+            scores = snake_scores.ScoreStore()
+        self.scores = scores
         self.start_time = 0
         self.shake_amount = 0
         self.shake_duration = 0
         self.flash_duration = 0
         # цвет фона
         self.background_color = BLACK
+        # заранее нарисованная шахматка с рамкой, см. get_background
+        self.background = None
+        self.background_key = None
+        # режим частичной перерисовки: display.update по изменившимся клеткам вместо flip
+        self.dirty_rects = dirty_rects
+        self.last_drawn_state = None
+        self.hud_rects = []
+        # клетки прошлого кадра, где рисовались заезжающая голова и съезжающий хвост
+        self.moving_cells = set()
+        self.obstacle_tile = None
+        # замеры фаз кадра: F3 показывает оверлей, profile_dump - файл для выгрузки при выходе
+        self.profiler = FrameProfiler()
+        self.show_profiler = False
+        self.profiler_stats = []
+        self.profiler_stats_frame = 0
+        self.profile_dump = profile_dump
+        if dirty_rects:
+            self.sim.board.dirty = []
+        if offscreen:
+            init_offscreen()
 
     def run(self):
+        init_display()
         self.start_time = pygame.time.get_ticks()
         while True:
-            self.handle_events()
-            self.update()
-            self.draw()
- 
-            if self.state == GameState.GAME:
-                clock.tick(1000 // self.snake.speed)
-            else:
-                clock.tick(60)
+            # кадры и ввод идут с частотой экрана, тики симуляции считает update
+            clock.tick(FPS)
+            with self.profiler.phase("events"):
+                self.handle_events()
+            with self.profiler.phase("update"):
+                self.update()
+            with self.profiler.phase("draw"):
+                self.draw()
+            self.profiler.end_frame()
     
-    def load_high_score(self):
-        try:
-            with open("highscore.txt", "r") as file:
-                self.high_score = int(file.read())
-        except:
-            self.high_score = 0
-    
-    def save_high_score(self):
-        with open("highscore.txt", "w") as file:
-            file.write(str(self.high_score))
-    
-    def generate_obstacles(self, count=10):
-        self.obstacles = []
-        snake_positions = self.snake.positions
-        head_x, head_y = snake_positions[0]
-        safe_zone = []
-        for x in range(head_x - 2, head_x + 3):
-            for y in range(head_y - 2, head_y + 3):
-                safe_zone.append((x, y))
-
-        #случайные препятствия
-        for _ in range(count):
-            while True:
-                x = random.randint(0, GRID_WIDTH - 1)
-                y = random.randint(0, GRID_HEIGHT - 1)
-                pos = (x, y)
-
-                # проверяем, что препятствие не на змейке, не на еде, не в безопасной зоне 
-                # и не на другом препятствии
-                if (pos not in snake_positions and 
-                    pos != self.food.position and
-                    pos not in safe_zone and
-                    not any(o.position == pos for o in self.obstacles)):
-                    self.obstacles.append(Obstacle(pos))
-                    break
+    def rgb_array(self, downsample=1, copy=False):
+        # Последний нарисованный кадр (высота, ширина, 3) в RGB. Без окна
+        # (offscreen) - вид только для чтения на pixels, следующий draw меняет
+        # его на месте; copy=True - своя копия. downsample - шаг прореживания:
+        # из каждого квадрата downsample x downsample берется центральный
+        # пиксель, это тоже вид. С окном экран блокируется видом pixels3d
+        # только на время копирования прореженных пикселей: вид, отданный
+        # наружу, держал бы блокировку, и следующая отрисовка не прошла бы.
+        start = downsample // 2
+        if pixels is None:
+            view = pygame.surfarray.pixels3d(screen)
+            try:
+                return view[start::downsample, start::downsample].swapaxes(0, 1).copy()
+            finally:
+                del view
+        frame = pixels[start::downsample, start::downsample, :3]
+        if copy:
+            return frame.copy()
+        frame.flags.writeable = False
+        return frame
+
+    @property
+    def high_score(self):
+        # рекорд текущего режима
+        return self.scores.best(self.mode)
 
+    def generate_obstacles(self, count=snake_core.OBSTACLE_COUNT):
+        self.sim.generate_obstacles(count)
+        self.set_obstacles()
+
+    def set_obstacles(self):
+        self.obstacle_layer.set(self.sim.obstacles)
 
     def handle_events(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
+                if self.profile_dump:
+                    self.profiler.dump(self.profile_dump)
+                # дописываем результаты, которые еще в очереди
+                self.scores.close()
+                if self.net is not None:
+                    self.net.close()
                 pygame.quit()
                 sys.exit()
+
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                self.show_profiler = not self.show_profiler
+                continue
             
             # обработка клавиш в зависимости от состояния игры
             if event.type == pygame.KEYDOWN:
                 if self.state == GameState.MENU:
-                    if event.key == pygame.K_SPACE:
+                    if event.key == pygame.K_SPACE and self.net is not None:
+                        # режим сетевой игры задает комната
+                        self.start_new_game()
+                    elif event.key == pygame.K_SPACE:
                         self.state = GameState.MODE_SELECT
                 elif self.state == GameState.MODE_SELECT:
                     if event.key == pygame.K_1:
                         self.mode = GameMode.CLASSIC
+                        self.playback = None
                         self.start_new_game()
                     elif event.key == pygame.K_2:
                         self.mode = GameMode.WALLS
+                        self.playback = None
                         self.start_new_game()
                     elif event.key == pygame.K_3:
+                        # препятствия генерирует сама симуляция при сбросе
                         self.mode = GameMode.OBSTACLES
+                        self.playback = None
                         self.start_new_game()
-                        self.generate_obstacles()
                     elif event.key == pygame.K_ESCAPE:
                         self.state = GameState.MENU
                 elif self.state == GameState.GAME:
-                    if event.key == pygame.K_UP:
-                        self.snake.update_direction(Direction.UP)
-                    elif event.key == pygame.K_DOWN:
-                        self.snake.update_direction(Direction.DOWN)
-                    elif event.key == pygame.K_LEFT:
-                        self.snake.update_direction(Direction.LEFT)
-                    elif event.key == pygame.K_RIGHT:
-                        self.snake.update_direction(Direction.RIGHT)
+                    if self.playback is not None and event.key != pygame.K_p:
+                        # при просмотре записи змейкой управляет запись
+                        continue
+                    if self.net is not None:
+                        # в сетевой игре повороты уходят на сервер, паузы и автопилота нет
+                        if event.key in ARROW_KEYS:
+                            self.net.send_input(ARROW_KEYS[event.key])
+                        continue
+                    if self.autopilot_on and event.key in ARROW_KEYS:
+                        continue
+                    if event.key in ARROW_KEYS:
+                        self.snake.update_direction(ARROW_KEYS[event.key])
+                    elif event.key == pygame.K_a and self.arena is None:
+                        self.autopilot_on = not self.autopilot_on
+                        # повороты, нажатые до включения, автопилоту не нужны
+                        self.snake.direction_queue.clear()
                     elif event.key == pygame.K_p:
                         self.state = GameState.PAUSE
                 elif self.state == GameState.GAME_OVER:
@@ -417,15 +933,181 @@ class Game:
                         self.state = GameState.MENU
 
 
+    def drop_own_food(self):
+        # еда симуляции не нужна, когда еду ведет сервер или арена
+        if self.food.position is not None:
+            self.sim.board.set(self.food.position, snake_core.EMPTY)
+            self.food.position = None
+
+    def join(self, welcome):
+        # вход в комнату сервера: режим и темп тиков задает комната
+        self.player_id = welcome.player
+        self.mode = welcome.mode
+        self.room_tick_ms = welcome.tick_ms
+        self.snake.speed = welcome.tick_ms
+        self.drop_own_food()
+        self.state = GameState.GAME
+        self.tick_accumulator = 0
+        self.background_color = BLACK
+
+    def poll_net(self, dt):
+        # сетевой модуль (и asyncio) грузится только для сетевой игры
+        import snake_net
+        self.tick_accumulator = min(self.tick_accumulator + dt, self.snake.speed)
+        for message in self.net.poll():
+            if isinstance(message, snake_net.Snapshot):
+                self.apply_snapshot(message)
+            elif isinstance(message, snake_net.Tick):
+                self.apply_tick(message)
+            elif isinstance(message, snake_net.Welcome):
+                self.join(message)
+
+    def net_snake(self, state):
+        # змейка на экране для состояния с сервера; None - такой еще нет
+        if state.id == self.player_id:
+            return self.snake
+        return self.remote_snakes.get(state.id)
+
+    def apply_snapshot(self, snapshot):
+        # всё состояние комнаты целиком: тела, еда, препятствия
+        seen = set()
+        for state in snapshot.snakes:
+            seen.add(state.id)
+            snake = self.net_snake(state)
+            if not state.alive:
+                self.net_death(state, snake)
+                continue
+            if snake is None:
+                snake = Snake(self.sim.width, self.sim.height, body_color=CYAN, head_color=BLUE)
+                self.remote_snakes[state.id] = snake
+            elif not snake.is_alive:
+                # новая жизнь: сброс эффектов смерти, тело ставится ниже
+                snake.reset()
+                snake.speed = self.room_tick_ms
+                self.respawning = False
+                self.game_over_time = 0
+            snake.length = state.length
+            snake.set_body(state.body)
+            snake.direction = state.direction
+            snake.score = state.score
+        for player in list(self.remote_snakes):
+            if player not in seen:
+                del self.remote_snakes[player]
+        self.apply_foods(snapshot.foods)
+        self.sim.obstacles = snapshot.obstacles
+        self.set_obstacles()
+        self.tick_accumulator = 0
+
+    def apply_tick(self, tick):
+        # по каждой змейке новая голова и длина, хвост обрезается сам
+        for state in tick.snakes:
+            snake = self.net_snake(state)
+            if snake is None:
+                continue
+            if not state.alive:
+                self.net_death(state, snake)
+                continue
+            snake.direction = state.direction
+            snake.length = state.length
+            snake.score = state.score
+            if snake.positions and snake.positions[0] != state.head:
+                snake.push_head(state.head)
+        self.apply_foods(tick.foods)
+        self.tick_accumulator = 0
+
+    def net_death(self, state, snake):
+        if snake is self.snake:
+            if snake.is_alive:
+                snake.die(state.reason)
+        elif snake is not None:
+            del self.remote_snakes[state.id]
+
+    def apply_foods(self, foods):
+        while len(self.remote_foods) < len(foods):
+            self.remote_foods.append(Food(self.sim.width, self.sim.height, self.net_board))
+        del self.remote_foods[len(foods):]
+        for food, state in zip(self.remote_foods, foods):
+            food.position = state.position
+            food.special = state.special
+
     def start_new_game(self):
+        if self.net is not None:
+            # новую змейку ставит сервер, она придет в следующем снимке
+            self.net.send_respawn()
+            self.respawning = True
+            self.game_over_time = 0
+            self.state = GameState.GAME
+            return
+        if self.arena_snakes:
+            self.start_arena()
+            return
         self.state = GameState.GAME
-        self.snake.reset()
-        self.food.randomize_position(self.snake.positions)
-        self.background_color = BLACK    
+        # симуляция сама сбрасывает змейку, еду и препятствия для режима
+        if self.playback is not None:
+            self.mode = self.playback.mode
+            self.sim.level = self.playback.level
+            self.sim.topology = self.playback.topology
+            self.sim.reset(self.mode, self.playback.seed)
+            self.playback_actions = self.playback.actions()
+        else:
+            self.sim.level = self.level
+            self.sim.reset(self.mode)
+            import snake_replay
+            self.replay = snake_replay.Replay.record(self.sim)
+        self.tick_accumulator = 0
+        self.autopilot_used = False
+        self.set_obstacles()
+        self.background_color = BLACK
+
+    def start_arena(self):
+        # змейка игрока - одна из змеек арены; после смерти она появляется
+        # снова в случайном свободном месте, боты в это время не ждут
+        import snake_arena
+        if self.arena is None or self.arena.mode != self.mode:
+            self.arena = snake_arena.Arena(self.mode, self.sim.width, self.sim.height,
+                                           snakes=self.arena_snakes)
+            self.drop_own_food()
+            self.arena_player = self.arena.add_snake(snake=self.snake)
+            self.sim.obstacles = self.arena.obstacles
+            self.set_obstacles()
+        else:
+            self.arena.revive(self.arena_player)
+        self.state = GameState.GAME
+        self.tick_accumulator = 0
+        self.game_over_time = 0
+        self.background_color = BLACK
+
+    def advance_arena(self, dt):
+        # тики арены по тому же фиксированному шагу, что в advance; арена
+        # живет и после смерти игрока
+        tick_ms = self.arena.tick_ms
+        self.tick_accumulator = min(self.tick_accumulator + dt, MAX_CATCH_UP_TICKS * tick_ms)
+        while self.tick_accumulator >= tick_ms:
+            self.tick_accumulator -= tick_ms
+            self.arena.step()
+
+    def finish_game(self):
+        self.state = GameState.GAME_OVER
+        # просмотр записи не должен менять рекорд и перезаписывать файл записи,
+        # сетевая партия и арена тоже не записываются
+        if self.playback is not None or self.net is not None or self.arena is not None:
+            return
+
+        if self.autopilot_used:
+            # запись партии сохраняем, рекорд - нет
+            if self.replay is not None:
+                self.replay.save(REPLAY_FILE)
+            return
+
+        # результат сразу попадает в таблицу рекордов, на диск - в фоне
+        self.scores.record(self.mode, self.snake.score, length=self.snake.length,
+                           ticks=self.sim.ticks,
+                           death_reason=snake_core.WIN_MESSAGE if self.sim.won else self.snake.death_reason,
+                           seed=self.sim.seed, width=self.sim.width, height=self.sim.height)
 
-        # емли режим с препятствиями, генерируем их
-        if self.mode == GameMode.OBSTACLES:
-            self.generate_obstacles()
+        # запись последней партии, чтобы её можно было воспроизвести
+        if self.replay is not None:
+            self.replay.save(REPLAY_FILE)
 
     def trigger_death_effects(self):
         # эффект тряски экрана
@@ -434,53 +1116,80 @@ class Game:
         # эффект вспышки
         self.flash_duration = 100  # миллисекунды
 
-    def update(self):
+    def advance(self, dt):
+        if self.net is not None or self.arena is not None:
+            # змейкой двигает сервер (poll_net) или арена (advance_arena)
+            return
+        # Фиксированный шаг: время кадра копится, и симуляция делает столько
+        # тиков длиной snake.speed мс, сколько в него поместилось. После долгого
+        # кадра догоняем не больше MAX_CATCH_UP_TICKS тиков, лишнее отбрасываем.
+        self.tick_accumulator = min(self.tick_accumulator + dt,
+                                    MAX_CATCH_UP_TICKS * self.snake.speed)
+        while (self.tick_accumulator >= self.snake.speed and
+               self.snake.is_alive and not self.sim.won):
+            self.tick_accumulator -= self.snake.speed
+            if self.playback is not None:
+                self.sim.step(self.playback_actions.get(self.sim.ticks + 1))
+            elif self.autopilot_on:
+                if self.autopilot is None:
+                    import snake_bot
+                    self.autopilot = snake_bot.Autopilot(self.sim)
+                self.autopilot_used = True
+                self.sim.step(self.autopilot.decide())
+            else:
+                self.sim.step()
+
+    def tick_progress(self):
+        # доля пути до следующего тика, для плавной отрисовки головы и хвоста
+        if self.state != GameState.GAME or not self.snake.is_alive or self.sim.won:
+            return 0.0
+        # на арене темп общий для всех змеек, еда его не ускоряет
+        speed = self.arena.tick_ms if self.arena is not None else self.snake.speed
+        return min(1.0, self.tick_accumulator / speed)
+
+    def update(self, dt=None):
+        # dt - длительность кадра в мс, по умолчанию из clock
+        if dt is None:
+            dt = clock.get_time()
+
         # обновление эффектов
         if self.shake_duration > 0:
-            self.shake_duration -= clock.get_time()
+            self.shake_duration -= dt
             if self.shake_duration <= 0:
                 self.shake_amount = 0
                 
         if self.flash_duration > 0:
-            self.flash_duration -= clock.get_time()
+            self.flash_duration -= dt
             if self.flash_duration <= 0:
                 self.background_color = BLACK
             
-        # обновление препятствий
-        for obstacle in self.obstacles:
-            obstacle.update()
+        # пульсация препятствий
+        self.obstacle_layer.update(dt)
+
+        # сервер шлет тики и во время экрана конца игры, читаем их всегда
+        if self.net is not None:
+            self.poll_net(dt)
+        if self.arena is not None and self.state in (GameState.GAME, GameState.GAME_OVER):
+            self.advance_arena(dt)
             
         if self.state == GameState.GAME:
-            self.snake.move()
-            
-            if not self.snake.is_alive:
+            self.advance(dt)
+
+            if not self.snake.is_alive and not self.respawning:
                 self.trigger_death_effects()
                 
                 if self.game_over_time == 0:
                     self.game_over_time = pygame.time.get_ticks() + 1500
                 
                 if pygame.time.get_ticks() >= self.game_over_time:
-                    self.state = GameState.GAME_OVER
+                    self.finish_game()
                     self.game_over_time = 0
-                    
-                    # обнова рекорда
-                    if self.snake.score > self.high_score:
-                        self.high_score = self.snake.score
-                        self.save_high_score()
                 return
-            
-            # проверка, съела ли змейка еду
-            if self.snake.get_head_position() == self.food.position:
-                # увеличиваем змейку
-                self.snake.grow()
-                
-                # если это была специальная еда, даем дополнительные очки
-                if self.food.special:
-                    self.snake.score += 15
-                
-                # новая еда
-                self.food.randomize_position(self.snake.positions + [o.position for o in self.obstacles])
-                
+
+            if self.sim.won:
+                # змейка заняла всё поле - свободных клеток для еды не осталось
+                self.finish_game()
+
             self.snake.update_particles()
         elif self.state == GameState.GAME_OVER:
             self.snake.update_particles()
@@ -488,19 +1197,19 @@ class Game:
     def draw_menu(self):
         screen.fill(BLACK)
 
-        title_text = font_large.render("ЗМЕЙКА", True, GREEN)
+        title_text = render_text(font_large, "ЗМЕЙКА", GREEN)
         screen.blit(title_text, (SCREEN_WIDTH // 2 - title_text.get_width() // 2, 150))
         
         # инструкции
-        instruction_text = font_medium.render("Нажмите ПРОБЕЛ чтобы начать", True, WHITE)
+        instruction_text = render_text(font_medium, "Нажмите ПРОБЕЛ чтобы начать", WHITE)
         screen.blit(instruction_text, (SCREEN_WIDTH // 2 - instruction_text.get_width() // 2, 300))
         
         # рекорд
-        high_score_text = font_small.render(f"Рекорд: {self.high_score}", True, YELLOW)
+        high_score_text = render_text(font_small, f"Рекорд: {self.high_score}", YELLOW)
         screen.blit(high_score_text, (SCREEN_WIDTH // 2 - high_score_text.get_width() // 2, 400))
         
         # управление
-        controls_text = font_small.render("Управление: стрелки - движение, P - пауза", True, GRAY)
+        controls_text = render_text(font_small, "Управление: стрелки - движение, P - пауза", GRAY)
         screen.blit(controls_text, (SCREEN_WIDTH // 2 - controls_text.get_width() // 2, 450))
         
         # анимация змейки на фоне
@@ -517,31 +1226,31 @@ class Game:
         screen.fill(BLACK)
         
         # заголовок
-        title_text = font_large.render("ВЫБЕРИТЕ РЕЖИМ", True, GREEN)
+        title_text = render_text(font_large, "ВЫБЕРИТЕ РЕЖИМ", GREEN)
         screen.blit(title_text, (SCREEN_WIDTH // 2 - title_text.get_width() // 2, 100))
         
         # варианты режимов
-        mode1_text = font_medium.render("1. Классический", True, WHITE)
+        mode1_text = render_text(font_medium, "1. Классический", WHITE)
         screen.blit(mode1_text, (SCREEN_WIDTH // 2 - mode1_text.get_width() // 2, 220))
         
-        mode2_text = font_medium.render("2. Стены", True, WHITE)
+        mode2_text = render_text(font_medium, "2. Стены", WHITE)
         screen.blit(mode2_text, (SCREEN_WIDTH // 2 - mode2_text.get_width() // 2, 280))
         
-        mode3_text = font_medium.render("3. Препятствия", True, WHITE)
+        mode3_text = render_text(font_medium, "3. Препятствия", WHITE)
         screen.blit(mode3_text, (SCREEN_WIDTH // 2 - mode3_text.get_width() // 2, 340))
         
         # описания режимов
-        desc1_text = font_small.render("Классический режим со свободными границами", True, GRAY)
+        desc1_text = render_text(font_small, "Классический режим со свободными границами", GRAY)
         screen.blit(desc1_text, (SCREEN_WIDTH // 2 - desc1_text.get_width() // 2, 250))
         
-        desc2_text = font_small.render("Столкновение со стеной приводит к смерти", True, GRAY)
+        desc2_text = render_text(font_small, "Столкновение со стеной приводит к смерти", GRAY)
         screen.blit(desc2_text, (SCREEN_WIDTH // 2 - desc2_text.get_width() // 2, 310))
         
-        desc3_text = font_small.render("Препятствия на игровом поле", True, GRAY)
+        desc3_text = render_text(font_small, "Препятствия на игровом поле", GRAY)
         screen.blit(desc3_text, (SCREEN_WIDTH // 2 - desc3_text.get_width() // 2, 370))
         
         # инструкция для возврата
-        back_text = font_small.render("Нажмите ESC для возврата в меню", True, GRAY)
+        back_text = render_text(font_small, "Нажмите ESC для возврата в меню", GRAY)
         screen.blit(back_text, (SCREEN_WIDTH // 2 - back_text.get_width() // 2, 450))
 
     def apply_screen_shake(self):
@@ -551,94 +1260,208 @@ class Game:
             return dx, dy
         return 0, 0
 
+    def get_background(self):
+        # Шахматка повторяется через две клетки, поэтому хватает куска размером
+        # с экран плюс две клетки: его сдвигают под камеру. Поле меньше экрана
+        # помещается в кусок целиком. Кэш сбрасывается при смене размеров поля.
+        key = (self.sim.width, self.sim.height)
+        if self.background_key != key:
+            columns = min(self.sim.width, SCREEN_WIDTH // GRID_SIZE + 2)
+            rows = min(self.sim.height, SCREEN_HEIGHT // GRID_SIZE + 2)
+            background = pygame.Surface((columns * GRID_SIZE, rows * GRID_SIZE))
+            # клетки без шахматки прозрачные, под ними виден цвет фона (и вспышка)
+            background.fill(BACKGROUND_COLORKEY)
+            background.set_colorkey(BACKGROUND_COLORKEY, pygame.RLEACCEL)
+
+            for x in range(columns):
+                for y in range(rows):
+                    if (x + y) % 2 == 0:
+                        rect = pygame.Rect(x * GRID_SIZE, y * GRID_SIZE, GRID_SIZE, GRID_SIZE)
+                        pygame.draw.rect(background, (20, 20, 20), rect)
+
+            self.background = background
+            self.background_key = key
+        return self.background
+
+    def draw_background(self, offset):
+        # offset - сдвиг мира на экране (тряска минус камера)
+        background = self.get_background()
+        period = 2 * GRID_SIZE
+        ox, oy = offset
+        # левый верхний угол куска в мире: кратен периоду шахматки и не левее поля
+        world_x = max(0, -ox // period * period)
+        world_y = max(0, -oy // period * period)
+        area = pygame.Rect(0, 0,
+                           min(background.get_width(), self.sim.width * GRID_SIZE - world_x),
+                           min(background.get_height(), self.sim.height * GRID_SIZE - world_y))
+        screen.blit(background, (world_x + ox, world_y + oy), area)
+        self.draw_border(offset)
+
+    def draw_border(self, offset):
+        if self.mode == GameMode.WALLS or self.mode == GameMode.OBSTACLES:
+            border_color = (80, 80, 80)
+            pygame.draw.rect(screen, border_color, (offset[0], offset[1], self.sim.width * GRID_SIZE,
+                                                    self.sim.height * GRID_SIZE), 3)
+
+    def update_camera(self):
+        # камера держит в центре голову, сдвинутую так же плавно, как при отрисовке;
+        # тело погибшей змейки арена убирает с поля, тогда камера стоит на месте
+        if not self.snake.positions:
+            return
+        head_x, head_y = self.snake.get_head_position()
+        dx, dy = snake_core.DIRECTION_DELTAS[self.snake.next_direction]
+        shift = self.tick_progress() * GRID_SIZE
+        self.camera.follow(head_x * GRID_SIZE + GRID_SIZE // 2 + dx * shift,
+                           head_y * GRID_SIZE + GRID_SIZE // 2 + dy * shift)
+
     def draw_game(self):
         # эффект вспышки при смерти
         if self.flash_duration > 0:
             self.background_color = RED
 
-        screen.fill(self.background_color)
-        shake_offset_x, shake_offset_y = self.apply_screen_shake()
+        profiler = self.profiler
+        with profiler.phase("background"):
+            screen.fill(self.background_color)
+            shake_offset_x, shake_offset_y = self.apply_screen_shake()
 
-        for x in range(GRID_WIDTH):
-            for y in range(GRID_HEIGHT):
-                if (x + y) % 2 == 0:
-                    rect = pygame.Rect(
-                        x * GRID_SIZE + shake_offset_x, 
-                        y * GRID_SIZE + shake_offset_y, 
-                        GRID_SIZE, 
-                        GRID_SIZE
-                    )
-                    pygame.draw.rect(screen, (20, 20, 20), rect)
+            # всё поле рисуется со сдвигом тряски и камеры, и только видимые клетки
+            self.update_camera()
+            view = self.camera.view()
+            self.snake.view = view
+            offset = (shake_offset_x - self.camera.x, shake_offset_y - self.camera.y)
+            self.draw_background(offset)
 
-        if self.mode == GameMode.WALLS or self.mode == GameMode.OBSTACLES:
-            border_color = (80, 80, 80)
-            pygame.draw.rect(
-                screen, 
-                border_color, 
-                (
-                    0 + shake_offset_x, 
-                    0 + shake_offset_y, 
-                    SCREEN_WIDTH, 
-                    SCREEN_HEIGHT
-                ), 
-                3
-            )
-            
-        # препятствия
-        for obstacle in self.obstacles:
-            original_position = obstacle.position
-            
-            # времено изменяем позицию для тряски
-            offset_position = (
-                obstacle.position[0] * GRID_SIZE + shake_offset_x,
-                obstacle.position[1] * GRID_SIZE + shake_offset_y
-            )
-            
-            # сохраняем и изменяем позицию для рисования
-            real_position = obstacle.position
-            obstacle.position = offset_position
-            obstacle.draw(screen)
-            
-            # возвращаем исходную позицию
-            obstacle.position = real_position
-        
-        # создаем временную поверхность для тряски
-        temp_surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-        
-        # рисуем змейку на временную поверхность
-        self.snake.draw(temp_surface)
-        
-        # рисуем еду на временную поверхность
-        self.food.draw(temp_surface)
-        
-        # добавляем тряску и переносим на основной экран
-        screen.blit(temp_surface, (shake_offset_x, shake_offset_y))
-        
+        with profiler.phase("obstacles"):
+            self.obstacle_layer.draw(screen, offset, view)
+
+        with profiler.phase("particles"):
+            self.snake.draw_particles(screen, offset)
+
+        with profiler.phase("snake"):
+            progress = self.tick_progress()
+            if self.arena is not None:
+                self.arena_layer.draw(screen, self.arena, offset, view, self.arena_player.id)
+            for snake in self.remote_snakes.values():
+                snake.draw(screen, offset, progress, view)
+            self.snake.draw(screen, offset, progress, view)
+            self.food.draw(screen, offset)
+            for food in self.remote_foods:
+                food.draw(screen, offset)
+
+        with profiler.phase("hud"):
+            self.hud_rects = self.draw_hud()
+
+    def draw_hud(self):
         # счет
-        score_text = font_small.render(f"Счет: {self.snake.score}", True, WHITE)
-        screen.blit(score_text, (10, 10))
+        score_text = render_text(font_small, f"Счет: {self.snake.score}", WHITE)
+        rects = [screen.blit(score_text, (10, 10))]
         
         # рекорд
-        high_score_text = font_small.render(f"Рекорд: {self.high_score}", True, YELLOW)
-        screen.blit(high_score_text, (SCREEN_WIDTH - high_score_text.get_width() - 10, 10))
+        high_score_text = render_text(font_small, f"Рекорд: {self.high_score}", YELLOW)
+        rects.append(screen.blit(high_score_text, (SCREEN_WIDTH - high_score_text.get_width() - 10, 10)))
         
         # текущий режим
-        mode_names = {
-            GameMode.CLASSIC: "Классический",
-            GameMode.WALLS: "Стены",
-            GameMode.OBSTACLES: "Препятствия"
-        }
-        mode_text = font_small.render(f"Режим: {mode_names[self.mode]}", True, CYAN)
-        screen.blit(mode_text, (SCREEN_WIDTH // 2 - mode_text.get_width() // 2, 10))
+        mode_text = render_text(font_small, f"Режим: {MODE_NAMES[self.mode]}", CYAN)
+        rects.append(screen.blit(mode_text, (SCREEN_WIDTH // 2 - mode_text.get_width() // 2, 10)))
         
         # отображаем FPS
         fps = int(clock.get_fps())
-        fps_text = font_small.render(f"FPS: {fps}", True, CYAN)
-        screen.blit(fps_text, (10, SCREEN_HEIGHT - 30))
+        fps_text = render_text(font_small, f"FPS: {fps}", CYAN)
+        rects.append(screen.blit(fps_text, (10, SCREEN_HEIGHT - 30)))
         # отображаем время игры
         elapsed = (pygame.time.get_ticks() - self.snake.death_time if not self.snake.death_time else pygame.time.get_ticks())//1000
-        time_text = font_small.render(f"Time: {elapsed}s", True, CYAN)
-        screen.blit(time_text, (100, SCREEN_HEIGHT - 30))
+        time_text = render_text(font_small, f"Time: {elapsed}s", CYAN)
+        rects.append(screen.blit(time_text, (100, SCREEN_HEIGHT - 30)))
+        if self.arena is not None:
+            alive_text = render_text(font_small, f"Змеек: {self.arena.alive()}", GREEN)
+            rects.append(screen.blit(alive_text, (SCREEN_WIDTH - alive_text.get_width() - 10,
+                                                  SCREEN_HEIGHT - 30)))
+        elif self.autopilot_on and self.playback is None:
+            autopilot_text = render_text(font_small, "Автопилот", GREEN)
+            rects.append(screen.blit(autopilot_text, (SCREEN_WIDTH - autopilot_text.get_width() - 10,
+                                                      SCREEN_HEIGHT - 30)))
+        return rects
+
+    def can_draw_dirty(self):
+        # частичная перерисовка только в спокойной игре: без тряски, вспышки и перехода,
+        # и только если поле целиком на экране - движущаяся камера меняет весь кадр
+        return (self.dirty_rects and
+                self.net is None and
+                self.arena is None and
+                self.camera.fixed and
+                self.state == GameState.GAME and
+                self.last_drawn_state == GameState.GAME and
+                self.snake.is_alive and
+                not self.show_profiler and
+                self.shake_amount == 0 and
+                self.flash_duration <= 0 and
+                self.transition_alpha == 0)
+
+    def draw_game_dirty(self):
+        # Перерисовываем только изменившиеся клетки: клетки, которые поменялись
+        # в слое тела, голову и клетку перед ней, хвост и клетку, к которой он
+        # съезжает (и те же клетки прошлого кадра), освободившиеся клетки из
+        # сетки симуляции, еду и клетки под старым HUD. Препятствия - только
+        # если сменилась ступень пульсации, иначе лишь те, что попали в эти клетки.
+        board = self.sim.board
+        width = board.width
+        snake = self.snake
+        cells = set(snake.layer.sync())
+        cells.update((index % width, index // width) for index in board.dirty)
+        # голова заезжает в клетку перед собой, хвост - в предпоследний сегмент
+        head_x, head_y = snake.get_head_position()
+        dx, dy = snake_core.DIRECTION_DELTAS[snake.next_direction]
+        moving = {(head_x, head_y), ((head_x + dx) % width, (head_y + dy) % board.height),
+                  snake.positions[-1]}
+        if len(snake.positions) > 1:
+            moving.add(snake.positions[-2])
+        cells |= moving
+        cells |= self.moving_cells
+        self.moving_cells = moving
+        if self.food.position is not None:
+            cells.add(self.food.position)
+        for rect in self.hud_rects:
+            for x in range(rect.left // GRID_SIZE, (rect.right - 1) // GRID_SIZE + 1):
+                for y in range(rect.top // GRID_SIZE, (rect.bottom - 1) // GRID_SIZE + 1):
+                    cells.add((x, y))
+        obstacle_tile = self.obstacle_layer.tile()
+        if obstacle_tile is not self.obstacle_tile:
+            self.obstacle_tile = obstacle_tile
+            cells.update(self.sim.obstacles)
+
+        profiler = self.profiler
+        with profiler.phase("background"):
+            background = self.get_background()
+            rects = []
+            edge = []
+            last_x, last_y = width - 1, board.height - 1
+            for x, y in cells:
+                rect = pygame.Rect(x * GRID_SIZE, y * GRID_SIZE, GRID_SIZE, GRID_SIZE)
+                screen.fill(self.background_color, rect)
+                screen.blit(background, rect.topleft, rect)
+                rects.append(rect)
+                if x == 0 or y == 0 or x == last_x or y == last_y:
+                    edge.append(rect)
+            # рамка не входит в кусок шахматки; она лежит только в крайних
+            # клетках и рисуется лишь внутри перерисованных, иначе закрыла бы
+            # препятствия у края, которые в этом кадре не перерисовываются
+            for rect in edge:
+                screen.set_clip(rect)
+                self.draw_border((0, 0))
+            screen.set_clip(None)
+
+        with profiler.phase("obstacles"):
+            grid = board.cells
+            screen.blits([(obstacle_tile, (x * GRID_SIZE, y * GRID_SIZE)) for x, y in cells
+                          if grid[y * width + x] == snake_core.OBSTACLE], False)
+        with profiler.phase("snake"):
+            snake.draw(screen, progress=self.tick_progress())
+            self.food.draw(screen)
+
+        with profiler.phase("hud"):
+            self.hud_rects = self.draw_hud()
+        rects.extend(self.hud_rects)
+        return rects
     
     def draw_game_over(self):
         # частицы конфетти
@@ -658,32 +1481,41 @@ class Game:
         pulse = (pygame.time.get_ticks() // 100) % 20
         pulse_scale = 1.0 + (pulse / 100.0)
         
-        game_over_text = font_large.render("ИГРА ОКОНЧЕНА", True, RED)
+        game_over_text = render_text(font_large, "ИГРА ОКОНЧЕНА", RED)
         text_width = game_over_text.get_width() * pulse_scale
         text_height = game_over_text.get_height() * pulse_scale
         scaled_game_over = pygame.transform.scale(game_over_text, (int(text_width), int(text_height)))
         
         screen.blit(scaled_game_over, (SCREEN_WIDTH // 2 - text_width // 2, 150))
 
-        if self.snake.death_reason:
-            reason_text = font_medium.render(self.snake.death_reason, True, RED) 
+        if self.sim.won:
+            reason_text = render_text(font_medium, snake_core.WIN_MESSAGE, GREEN)
+            screen.blit(reason_text, (SCREEN_WIDTH // 2 - reason_text.get_width() // 2, 240))
+        elif self.snake.death_reason:
+            reason_text = render_text(font_medium, self.snake.death_reason, RED) 
             screen.blit(reason_text, (SCREEN_WIDTH // 2 - reason_text.get_width() // 2, 240))
 
         # счет
-        score_text = font_medium.render(f"Ваш счет: {self.snake.score}", True, WHITE)
+        score_text = render_text(font_medium, f"Ваш счет: {self.snake.score}", WHITE)
         screen.blit(score_text, (SCREEN_WIDTH // 2 - score_text.get_width() // 2, 300))
         
         # инструкция для продолжения
-        restart_text = font_small.render("Нажмите R для новой игры", True, GRAY)
+        restart_text = render_text(font_small, "Нажмите R для новой игры", GRAY)
         screen.blit(restart_text, (SCREEN_WIDTH // 2 - restart_text.get_width() // 2, 380))
         
-        instruction_text = font_small.render("Нажмите ESC для возврата в меню", True, GRAY)
+        instruction_text = render_text(font_small, "Нажмите ESC для возврата в меню", GRAY)
         screen.blit(instruction_text, (SCREEN_WIDTH // 2 - instruction_text.get_width() // 2, 410))
 
+        # лучшие результаты режима
+        top = "  ".join(str(entry["score"]) for entry in self.scores.top(self.mode)[:5])
+        if top:
+            top_text = render_text(font_small, f"Лучшие ({MODE_NAMES[self.mode]}): {top}", CYAN)
+            screen.blit(top_text, (SCREEN_WIDTH // 2 - top_text.get_width() // 2, 460))
+
         if self.snake.score >= self.high_score:
             # мигающее сообщение о новом рекорде
             if (pygame.time.get_ticks() // 500) % 2 == 0:
-                record_text = font_small.render("Новый рекорд! Вы молодец!!!", True, YELLOW)
+                record_text = render_text(font_small, "Новый рекорд! Вы молодец!!!", YELLOW)
                 screen.blit(record_text, (SCREEN_WIDTH // 2 - record_text.get_width() // 2, 350))
 
     def draw_pause(self):
@@ -693,14 +1525,14 @@ class Game:
         screen.blit(overlay, (0, 0))
         
         # сообщение о паузе
-        pause_text = font_large.render("ПАУЗА", True, WHITE)
+        pause_text = render_text(font_large, "ПАУЗА", WHITE)
         screen.blit(pause_text, (SCREEN_WIDTH // 2 - pause_text.get_width() // 2, 200))
         
         # инструкции
-        resume_text = font_small.render("Нажмите 'P' чтобы продолжить", True, GRAY)
+        resume_text = render_text(font_small, "Нажмите 'P' чтобы продолжить", GRAY)
         screen.blit(resume_text, (SCREEN_WIDTH // 2 - resume_text.get_width() // 2, 300))
         
-        menu_text = font_small.render("Нажмите 'ESC' чтобы выйти в меню", True, GRAY)
+        menu_text = render_text(font_small, "Нажмите 'ESC' чтобы выйти в меню", GRAY)
         screen.blit(menu_text, (SCREEN_WIDTH // 2 - menu_text.get_width() // 2, 330))
         
     def draw_transition(self):
@@ -709,7 +1541,40 @@ class Game:
             screen.blit(self.transition_surface, (0, 0))
             self.transition_alpha = max(0, self.transition_alpha - self.transition_speed)
     
+    def draw_profiler(self):
+        # оверлей с p50/p99 по фазам кадра; статистика пересчитывается раз в полсекунды
+        if self.profiler.frames - self.profiler_stats_frame >= FPS // 2 or not self.profiler_stats:
+            self.profiler_stats = self.profiler.stats()
+            self.profiler_stats_frame = self.profiler.frames
+
+        line_height = font_small.get_linesize()
+        panel = pygame.Rect(SCREEN_WIDTH - 290, 40, 280, line_height * (len(self.profiler_stats) + 1) + 10)
+        overlay = pygame.Surface(panel.size)
+        overlay.set_alpha(190)
+        overlay.fill(BLACK)
+        screen.blit(overlay, panel.topleft)
+
+        # шрифт не моноширинный, поэтому столбцы выравниваются по своим x
+        columns = (panel.left + 8, panel.left + 140, panel.left + 210)
+        y = panel.top + 5
+        for x, title in zip(columns, ("фаза, мс", "p50", "p99")):
+            screen.blit(render_text(font_small, title, CYAN), (x, y))
+        for name, p50, p99 in self.profiler_stats:
+            y += line_height
+            screen.blit(render_text(font_small, name, WHITE), (columns[0], y))
+            screen.blit(font_small.render(f"{p50:.2f}", True, WHITE), (columns[1], y))
+            screen.blit(font_small.render(f"{p99:.2f}", True, WHITE), (columns[2], y))
+
     def draw(self):
+        init_display()
+        if self.can_draw_dirty():
+            rects = self.draw_game_dirty()
+            self.sim.board.dirty.clear()
+            with self.profiler.phase("flip"):
+                if pixels is None:
+                    pygame.display.update(rects)
+            return
+
         if self.state == GameState.MENU:
             self.draw_menu()
         elif self.state == GameState.MODE_SELECT:
@@ -723,25 +1588,96 @@ class Game:
             self.draw_game()
             self.draw_pause()
         
+        # частичную перерисовку можно начинать только поверх чистого кадра
+        self.obstacle_tile = None
+        clean = (self.transition_alpha == 0 and self.shake_amount == 0 and
+                 self.flash_duration <= 0)
+        self.last_drawn_state = self.state if clean else None
+
         #  эффект перехода
         self.draw_transition()
+
+        if self.show_profiler:
+            self.draw_profiler()
         
         # обновляем экран
-        pygame.display.flip()
+        with self.profiler.phase("flip"):
+            if pixels is None:
+                pygame.display.flip()
+        if self.dirty_rects:
+            self.sim.board.dirty.clear()
 
-def run(self):
-    self.start_time = pygame.time.get_ticks()
-    
-    while True:
-        self.handle_events()
-        self.update()
-        self.draw()
- 
-        if self.state == GameState.GAME:
-            clock.tick(1000 // self.snake.speed)
-        else:
-            clock.tick(60)            
+def board_size(text):
+    # "ШИРИНАxВЫСОТА", например 2000x2000
+    try:
+        width, height = (int(part) for part in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"нужен размер вида 200x200, а не {text!r}")
+    if width < 5 or height < 5:
+        raise argparse.ArgumentTypeError("поле должно быть не меньше 5x5")
+    return width, height
 
 if __name__ == "__main__":
-    game = Game()
-    game.run() 
+    parser = argparse.ArgumentParser(description="Змейка")
+    parser.add_argument("--dirty-rects", action="store_true",
+                        help="перерисовывать только изменившиеся части экрана")
+    parser.add_argument("--replay", help="показать сохраненную партию, например last_replay.snkr")
+    parser.add_argument("--profile-dump", help="при выходе записать замеры кадров в CSV или JSON")
+    parser.add_argument("--board", type=board_size,
+                        help="размер поля в клетках, например 2000x2000; камера следует за головой")
+    parser.add_argument("--level", choices=LEVEL_KINDS,
+                        help="уровень для режима с препятствиями: scatter - случайные клетки, maze - лабиринт")
+    parser.add_argument("--obstacles", type=int, default=snake_core.OBSTACLE_COUNT,
+                        help="сколько препятствий разбросать для --level scatter")
+    parser.add_argument("--corridor", type=int, default=2, help="ширина коридоров для --level maze")
+    parser.add_argument("--level-seed", type=int,
+                        help="seed уровня: один и тот же уровень в каждой партии")
+    parser.add_argument("--autopilot", action="store_true",
+                        help="играет автопилот (клавиша A переключает его в игре)")
+    parser.add_argument("--connect", metavar="HOST[:PORT]",
+                        help="сетевая игра: сервер snake_net.py, например localhost:5555")
+    parser.add_argument("--room", default="default", help="комната на сервере")
+    parser.add_argument("--room-mode", choices=[mode.name.lower() for mode in GameMode],
+                        help="режим комнаты, если она создается этим входом")
+    parser.add_argument("--arena", type=int, default=0, metavar="N",
+                        help="арена: змейка игрока и N ботов на общем поле")
+    args = parser.parse_args()
+
+    board = args.board
+    if board is None:
+        if args.arena:
+            import snake_arena
+            side = snake_arena.arena_size(args.arena)
+            board = (side, side)
+        else:
+            board = (GRID_WIDTH, GRID_HEIGHT)
+
+    level = None
+    if args.level:
+        level = LevelSpec(args.level, count=args.obstacles, corridor=args.corridor, seed=args.level_seed)
+
+    if args.connect:
+        import snake_net
+        host, _, port = args.connect.partition(":")
+        mode = GameMode[args.room_mode.upper()] if args.room_mode else None
+        net = snake_net.Connection(host, int(port or snake_net.PORT), args.room, mode,
+                                   board[0], board[1])
+        # размер поля и режим известны только после ответа сервера
+        try:
+            welcome = net.wait_welcome()
+        except ConnectionError as error:
+            raise SystemExit(f"snake_game: {error}")
+        game = Game(dirty_rects=args.dirty_rects, profile_dump=args.profile_dump,
+                    width=welcome.width, height=welcome.height, net=net)
+        game.join(welcome)
+    else:
+        replay = None
+        if args.replay:
+            import snake_replay
+            replay = snake_replay.Replay.load(args.replay)
+        game = Game(dirty_rects=args.dirty_rects, replay=replay, profile_dump=args.profile_dump,
+                    width=board[0], height=board[1], level=level, autopilot=args.autopilot,
+                    arena_snakes=args.arena)
+        if replay is not None:
+            game.start_new_game()
+    game.run()
@@ -0,0 +1,193 @@
+import functools
+import random
+from collections import namedtuple
+
+import snake_topology
+
+# Генератор уровней для режима с препятствиями. Уровень - маска препятствий
+# (bytes, по байту на клетку, 1 - препятствие). Все свободные клетки уровня
+# связаны с клеткой старта: закрытые карманы, куда змейка не может попасть,
+# заполняются препятствиями, поэтому еда в них не появится.
+#
+# Генерация и заливка линейны по размеру поля, готовые уровни кэшируются
+# по размеру поля, параметрам и seed.
+
+# kind   - "scatter" (случайные клетки) или "maze" (лабиринт)
+# count  - сколько препятствий разбросать для "scatter"
+# corridor - ширина коридоров лабиринта в клетках
+# loops  - сколько процентов лишних стен лабиринта убрать, чтобы были обходы
+# seed   - seed уровня; None - уровень зависит от seed партии
+LevelSpec = namedtuple("LevelSpec", "kind count corridor loops seed",
+                       defaults=("scatter", 10, 2, 20, None))
+
+LEVEL_KINDS = ("scatter", "maze")
+
+# безопасная зона вокруг старта: 5x5 клеток без препятствий
+SAFE_RADIUS = 2
+
+FREE = 0
+BLOCKED = 1
+REACHED = 2
+
+# bytes.translate: достигнутые клетки -> 0, всё остальное -> препятствие
+POCKETS = bytes([BLOCKED, BLOCKED, FREE] + [BLOCKED] * 253)
+
+def safe_zone(width, height, start, radius=SAFE_RADIUS):
+    x0, y0 = start
+    return {y * width + x
+            for y in range(max(0, y0 - radius), min(height, y0 + radius + 1))
+            for x in range(max(0, x0 - radius), min(width, x0 + radius + 1))}
+
+def reachable(grid, width, height, start, jumps=()):
+    # Заливка по строкам: за шаг красится целый отрезок свободных клеток
+    # строки (поиск границ и покраска идут в C через bytearray), поэтому
+    # число шагов зависит от числа отрезков, а не клеток.
+    # grid - FREE/BLOCKED по клеткам; возвращает копию, где достижимые - REACHED.
+    # jumps - переходы не к соседней клетке (Topology.jumps: край тора,
+    # порталы): когда заливка встала, от уже достигнутых клеток она
+    # продолжается через них.
+    seen = bytearray(grid)
+    stack = [start[1] * width + start[0]]
+    while stack or jumps:
+        if not stack:
+            stack = [target for cell, target in jumps if seen[cell] == REACHED and seen[target] == FREE]
+            if not stack:
+                break
+            continue
+        index = stack.pop()
+        if seen[index] != FREE:
+            continue
+        row = index - index % width
+        end = row + width
+        # отрезок всегда красится целиком, поэтому его границы - препятствия или края строки
+        left = seen.rfind(BLOCKED, row, index)
+        left = row if left < 0 else left + 1
+        right = seen.find(BLOCKED, index, end)
+        if right < 0:
+            right = end
+        seen[left:right] = bytes([REACHED]) * (right - left)
+
+        for shift in (-width, width):
+            if not 0 <= row + shift < width * height:
+                continue
+            pos = seen.find(FREE, left + shift, right + shift)
+            while pos >= 0:
+                stack.append(pos)
+                # остаток отрезка пропускаем, его покрасит заливка от pos
+                pos = seen.find(BLOCKED, pos, right + shift)
+                if pos < 0:
+                    break
+                pos = seen.find(FREE, pos, right + shift)
+    return seen
+
+def seal_pockets(mask, width, height, start, topology=None):
+    # маска, в которой всё недостижимое от start тоже стало препятствием;
+    # topology - snake_topology.Topology, если из клеток можно уйти не только
+    # к соседям (тор, порталы)
+    jumps = topology.jumps() if topology is not None else ()
+    return bytes(reachable(mask, width, height, start, jumps).translate(POCKETS))
+
+def scatter(width, height, rng, count, reserved):
+    mask = bytearray(width * height)
+    count = min(count, len(mask) - len(reserved))
+    # выборка без повторов за O(count); клетки из reserved пропускаем
+    placed = 0
+    for index in rng.sample(range(len(mask)), min(len(mask), count + len(reserved))):
+        if placed == count:
+            break
+        if index not in reserved:
+            mask[index] = BLOCKED
+            placed += 1
+    return mask
+
+def maze(width, height, rng, corridor, loops):
+    # Комнаты corridor x corridor через стену в одну клетку. Обход в глубину
+    # по комнатам пробивает проходы, потом часть оставшихся стен убирается,
+    # чтобы в лабиринте были кольца и змейка не запирала себя в тупике.
+    stride = corridor + 1
+    columns = (width + stride - 1) // stride
+    rows = (height + stride - 1) // stride
+    mask = bytearray(width * height)
+    for y in range(height):
+        if y % stride == corridor:
+            mask[y * width:(y + 1) * width] = bytes([BLOCKED]) * width
+        else:
+            for x in range(corridor, width, stride):
+                mask[y * width + x] = BLOCKED
+
+    def carve(room, other):
+        # убирает стену между соседними комнатами room и other
+        cx, cy = divmod(room, rows)
+        ox, oy = divmod(other, rows)
+        if cx != ox:
+            x = max(cx, ox) * stride - 1
+            for y in range(cy * stride, min(height, cy * stride + corridor)):
+                mask[y * width + x] = FREE
+        else:
+            y = max(cy, oy) * stride - 1
+            length = min(corridor, width - cx * stride)
+            start = y * width + cx * stride
+            mask[start:start + length] = bytes(length)
+
+    def neighbors(room):
+        x, y = divmod(room, rows)
+        if x > 0:
+            yield room - rows
+        if x < columns - 1:
+            yield room + rows
+        if y > 0:
+            yield room - 1
+        if y < rows - 1:
+            yield room + 1
+
+    visited = bytearray(columns * rows)
+    stack = [rng.randrange(columns * rows)]
+    visited[stack[0]] = 1
+    while stack:
+        room = stack[-1]
+        options = [other for other in neighbors(room) if not visited[other]]
+        if not options:
+            stack.pop()
+            continue
+        other = rng.choice(options)
+        carve(room, other)
+        visited[other] = 1
+        stack.append(other)
+
+    # проходы к соседям справа и снизу; уже открытые не меняются
+    for room in range(columns * rows):
+        x, y = divmod(room, rows)
+        if x < columns - 1 and rng.randrange(100) < loops:
+            carve(room, room + rows)
+        if y < rows - 1 and rng.randrange(100) < loops:
+            carve(room, room + 1)
+    return mask
+
+def level_mask(width, height, spec, seed, start, topology=None):
+    # маска препятствий уровня; spec.seed, если задан, важнее seed партии.
+    # topology - своя топология поля: её переходы учитываются при заливке,
+    # а клетки вне поля считаются препятствиями. Кэшируются только уровни
+    # на обычных топологиях: свою connect, remove и one_way меняют на месте,
+    # а кэш узнает топологию по объекту и отдал бы старую маску
+    if topology is not None and topology is not snake_topology.standard(width, height, topology.wrap):
+        return make_level_mask(width, height, spec, seed, start, topology)
+    return cached_level_mask(width, height, spec, seed, start, topology)
+
+def make_level_mask(width, height, spec, seed, start, topology=None):
+    rng = random.Random(spec.seed if spec.seed is not None else seed)
+    reserved = safe_zone(width, height, start)
+    if spec.kind == "scatter":
+        mask = scatter(width, height, rng, spec.count, reserved)
+    elif spec.kind == "maze":
+        mask = maze(width, height, rng, spec.corridor, spec.loops)
+        for index in reserved:
+            mask[index] = FREE
+    else:
+        raise ValueError(f"неизвестный тип уровня: {spec.kind}")
+    if topology is not None and topology.void is not None:
+        # побайтовое ИЛИ двух масок 0/1 через большие числа, в C
+        size = len(mask)
+        mask = (int.from_bytes(mask, "big") | int.from_bytes(topology.void, "big")).to_bytes(size, "big")
+    return seal_pockets(mask, width, height, start, topology)
+
+cached_level_mask = functools.lru_cache(maxsize=8)(make_level_mask)
@@ -0,0 +1,662 @@
+import argparse
+import asyncio
+import random
+import select
+import socket
+import struct
+import sys
+import time
+from array import array
+from collections import namedtuple
+
+import snake_levels
+from snake_arena import move_heads, place_snake, remove_body
+from snake_core import (
+    GRID_WIDTH, GRID_HEIGHT, SPEED, OBSTACLE_COUNT, SPECIAL_FOOD_BONUS, OBSTACLE,
+    FOOD, Board, Direction, Food, GameMode, Snake, mode_topology,
+)
+from snake_replay import REASONS
+
+# Сетевая игра: сервер на asyncio ведет комнаты, в каждой несколько змеек на
+# общем поле и свой темп тиков. Правила считает только сервер (классы
+# snake_core, ходы - как на арене snake_arena: все змейки одновременно, исход
+# не зависит от порядка входа), клиенты присылают повороты и получают состояние.
+#
+# Комната - одна задача asyncio, потоков нет: сотни комнат живут в одном
+# процессе. Повороты, пришедшие между тиками, копятся и применяются пачкой в
+# начале тика. Сообщение о тике кодируется один раз и одними и теми же
+# байтами уходит всем игрокам комнаты; клиент, который не успевает читать,
+# отключается, а не тормозит комнату.
+#
+# Протокол - кадры FRAME (длина, тип) и struct-поля, порядок байт little-endian.
+# Клиент -> сервер: JOIN, INPUT, RESPAWN. Сервер -> клиент: WELCOME, SNAPSHOT
+# (всё состояние: тела целиком, еда, препятствия) и TICK (по змейке голова,
+# длина, счет - тело клиент достраивает сам). SNAPSHOT уходит при входе
+# игрока и когда в комнате появилась новая змейка, остальное время - TICK.
+# На JOIN с недопустимыми параметрами сервер отвечает ERROR (текст причины)
+# и закрывает соединение.
+#
+#     python snake_net.py serve --port 5555
+#     python snake_net.py load --rooms 200 --clients 4 --seconds 10
+#     python snake_game.py --connect localhost:5555 --room друзья
+
+PORT = 5555
+FRAME = struct.Struct("<IB")
+# режим + 1 (0 - по умолчанию сервера), ширина, высота, мс на тик (0 - по умолчанию), дальше имя комнаты
+JOIN_FIELDS = struct.Struct("<BHHH")
+# номер игрока, режим, ширина, высота, мс на тик
+WELCOME_FIELDS = struct.Struct("<IBHHH")
+# номер тика, число змеек
+TICK_HEADER = struct.Struct("<IH")
+# номер, флаги (FLAG_*), x, y головы, длина, счет
+SNAKE_FIELDS = struct.Struct("<IBHHII")
+# x, y, особая ли
+FOOD_FIELDS = struct.Struct("<HHB")
+COUNT = struct.Struct("<I")
+CELL = struct.Struct("<HH")
+
+JOIN, INPUT, RESPAWN, WELCOME, SNAPSHOT, TICK, ERROR = range(1, 8)
+
+# флаги змейки: жива, направление (2 бита), причина смерти (номер в REASONS)
+FLAG_ALIVE = 1
+DIRECTION_SHIFT = 1
+REASON_SHIFT = 3
+
+# еда в комнате: на каждого игрока, но не меньше одной
+FOOD_PER_PLAYER = 1
+# отставание комнаты от расписания, после которого пропущенные тики не догоняются
+MAX_LAG_TICKS = 5
+# клиент, у которого в буфере отправки больше этого, отключается
+MAX_CLIENT_BUFFER = 1 << 20
+# поворотов от игрока за один тик, лишние отбрасываются
+MAX_INPUTS_PER_TICK = 4
+# гистограмма запаздывания тиков: корзины по 0.25 мс до 250 мс, последняя - всё дальше
+LAG_BUCKET_MS = 0.25
+LAG_BUCKETS = 1000
+# пределы комнаты, которую может заказать клиент: меньше 5x5 змейке негде
+# появиться, больше MAX_AREA - сервер выделил бы гигабайты по одному JOIN
+MIN_SIDE = 5
+MAX_AREA = 512 * 512
+MIN_TICK_MS = 10
+MAX_TICK_MS = 5000
+
+class ProtocolError(ValueError):
+    pass
+
+class JoinError(ProtocolError):
+    # отказ во входе в комнату: клиенту уходит ERROR с причиной
+    pass
+
+Welcome = namedtuple("Welcome", "player mode width height tick_ms")
+# одна змейка; body - всё тело (голова первая) есть только в SNAPSHOT, в TICK там None
+SnakeState = namedtuple("SnakeState", "id alive direction reason head length score body")
+FoodState = namedtuple("FoodState", "position special")
+Tick = namedtuple("Tick", "tick snakes foods")
+Snapshot = namedtuple("Snapshot", "tick snakes foods obstacles")
+Refused = namedtuple("Refused", "reason")
+
+def frame(kind, payload=b""):
+    return FRAME.pack(len(payload), kind) + payload
+
+def encode_join(room, mode=None, width=0, height=0, tick_ms=0):
+    fields = JOIN_FIELDS.pack(0 if mode is None else mode.value + 1, width, height, tick_ms)
+    return frame(JOIN, fields + room.encode())
+
+def encode_input(direction):
+    return frame(INPUT, bytes([direction.value]))
+
+def snake_flags(snake):
+    reason = REASONS.index(snake.death_reason) if snake.death_reason in REASONS else 0
+    return (snake.is_alive * FLAG_ALIVE | snake.direction.value << DIRECTION_SHIFT
+            | reason << REASON_SHIFT)
+
+def decode_flags(flags):
+    return (bool(flags & FLAG_ALIVE), Direction(flags >> DIRECTION_SHIFT & 3),
+            REASONS[flags >> REASON_SHIFT])
+
+def encode_foods(out, foods):
+    out += COUNT.pack(len(foods))
+    for food in foods:
+        if food.position is not None:
+            out += FOOD_FIELDS.pack(food.position[0], food.position[1], food.special)
+        else:
+            out += FOOD_FIELDS.pack(0xFFFF, 0xFFFF, 0)
+
+def decode_foods(data, pos):
+    (count,) = COUNT.unpack_from(data, pos)
+    pos += COUNT.size
+    foods = []
+    for x, y, special in FOOD_FIELDS.iter_unpack(data[pos:pos + count * FOOD_FIELDS.size]):
+        foods.append(FoodState(None if x == 0xFFFF else (x, y), bool(special)))
+    return foods, pos + count * FOOD_FIELDS.size
+
+def decode_message(kind, data):
+    try:
+        if kind == WELCOME:
+            player, mode, width, height, tick_ms = WELCOME_FIELDS.unpack(data)
+            return Welcome(player, GameMode(mode), width, height, tick_ms)
+        if kind == ERROR:
+            return Refused(data.decode(errors="replace"))
+        if kind == TICK:
+            tick, count = TICK_HEADER.unpack_from(data)
+            pos = TICK_HEADER.size
+            snakes = []
+            for _ in range(count):
+                player, flags, x, y, length, score = SNAKE_FIELDS.unpack_from(data, pos)
+                pos += SNAKE_FIELDS.size
+                alive, direction, reason = decode_flags(flags)
+                snakes.append(SnakeState(player, alive, direction, reason, (x, y), length, score, None))
+            foods, pos = decode_foods(data, pos)
+            return Tick(tick, snakes, foods)
+        if kind == SNAPSHOT:
+            tick, count = TICK_HEADER.unpack_from(data)
+            pos = TICK_HEADER.size
+            snakes = []
+            for _ in range(count):
+                player, flags, x, y, length, score = SNAKE_FIELDS.unpack_from(data, pos)
+                pos += SNAKE_FIELDS.size
+                (cells,) = COUNT.unpack_from(data, pos)
+                pos += COUNT.size
+                body = list(CELL.iter_unpack(data[pos:pos + cells * CELL.size]))
+                pos += cells * CELL.size
+                alive, direction, reason = decode_flags(flags)
+                snakes.append(SnakeState(player, alive, direction, reason, (x, y), length, score, body))
+            foods, pos = decode_foods(data, pos)
+            (count,) = COUNT.unpack_from(data, pos)
+            pos += COUNT.size
+            obstacles = list(CELL.iter_unpack(data[pos:pos + count * CELL.size]))
+            return Snapshot(tick, snakes, foods, obstacles)
+    except (struct.error, ValueError, IndexError) as error:
+        raise ProtocolError(f"битое сообщение {kind}: {error}") from None
+    raise ProtocolError(f"неизвестный тип сообщения: {kind}")
+
+class FrameReader:
+    # собирает кадры из кусков потока; feed возвращает готовые (тип, данные)
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        self.buffer += data
+        frames = []
+        pos = 0
+        while len(self.buffer) - pos >= FRAME.size:
+            length, kind = FRAME.unpack_from(self.buffer, pos)
+            end = pos + FRAME.size + length
+            if end > len(self.buffer):
+                break
+            frames.append((kind, bytes(self.buffer[pos + FRAME.size:end])))
+            pos = end
+        del self.buffer[:pos]
+        return frames
+
+class LagHistogram:
+    # запаздывания тиков корзинами по LAG_BUCKET_MS: память не растет с
+    # числом тиков, процентили - с точностью до корзины
+    def __init__(self):
+        self.buckets = array("I", bytes(4 * LAG_BUCKETS))
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, lag_ms):
+        self.buckets[min(int(lag_ms / LAG_BUCKET_MS), LAG_BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += lag_ms
+        self.max = max(self.max, lag_ms)
+
+    def merge(self, other):
+        for i, count in enumerate(other.buckets):
+            self.buckets[i] += count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, share):
+        # верхняя граница корзины, в которую попал процентиль
+        rank = int(self.count * share)
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if seen > rank:
+                return min((i + 1) * LAG_BUCKET_MS, self.max)
+        return self.max
+
+class Player:
+    def __init__(self, player_id, writer, snake):
+        self.id = player_id
+        self.writer = writer
+        self.snake = snake
+        # повороты, пришедшие после прошлого тика
+        self.inputs = []
+        self.respawn = False
+
+class Room:
+    # Комната: общее поле, змейки игроков и еда. step - один тик правил,
+    # run - цикл тиков по расписанию, пока в комнате есть игроки.
+    def __init__(self, name, mode=GameMode.CLASSIC, width=GRID_WIDTH, height=GRID_HEIGHT,
+                 tick_ms=SPEED, seed=None):
+        self.name = name
+        self.mode = mode
+        self.width = width
+        self.height = height
+        self.tick_ms = tick_ms
+        self.rng = random.Random(seed)
+        self.topology = mode_topology(mode, width, height)
+        self.board = Board(width, height)
+        # Snake при создании ставит тело в центр поля; чтобы не задеть чужие
+        # змейки, новые создаются на этом поле и потом переезжают на общее
+        self.scratch = Board(width, height)
+        # метки ходов и владельцы тел для snake_arena.move_heads
+        area = width * height
+        self.claims = array("i", [0]) * area
+        self.claimer = array("i", [0]) * area
+        self.owner = array("i", [0]) * area
+        self.players = {}
+        self.foods = []
+        self.obstacles = []
+        self.ticks = 0
+        self.time = 0
+        # кому-то нужно всё состояние: вошел игрок или появилась змейка
+        self.needs_snapshot = True
+        self.task = None
+        # запаздывание тиков против расписания, мс - для нагрузочных прогонов
+        self.lags = LagHistogram()
+        self.bytes_sent = 0
+        if mode == GameMode.OBSTACLES:
+            self.place_obstacles()
+
+    def place_obstacles(self):
+        # россыпь из snake_levels: все свободные клетки связаны, карманов нет
+        spec = snake_levels.LevelSpec("scatter", count=OBSTACLE_COUNT)
+        mask = snake_levels.level_mask(self.width, self.height, spec, self.rng.getrandbits(63),
+                                       (self.width // 2, self.height // 2))
+        width = self.width
+        self.obstacles = [(index % width, index // width)
+                          for index in self.board.fill_mask(mask, OBSTACLE)]
+
+    def add_player(self, player_id, writer):
+        snake = Snake(self.width, self.height, self.scratch)
+        remove_body(snake)
+        snake.board = self.board
+        player = Player(player_id, writer, snake)
+        self.players[player_id] = player
+        self.spawn(player)
+        while len(self.foods) < max(1, len(self.players) * FOOD_PER_PLAYER):
+            self.foods.append(Food(self.width, self.height, self.board, self.rng))
+        self.needs_snapshot = True
+        return player
+
+    def remove_player(self, player_id):
+        player = self.players.pop(player_id, None)
+        if player is not None:
+            remove_body(player.snake)
+            self.needs_snapshot = True
+
+    def spawn(self, player):
+        # новая змейка (snake_arena.place_snake); если места нет, остается
+        # мертвой и пробует снова на следующем тике
+        player.snake.is_alive = False
+        if not place_snake(self.board, player.snake, self.rng):
+            return False
+        for x, y in player.snake.positions:
+            self.owner[y * self.width + x] = player.id
+        player.respawn = False
+        self.needs_snapshot = True
+        return True
+
+    def on_input(self, player_id, direction):
+        player = self.players.get(player_id)
+        if player is not None and len(player.inputs) < MAX_INPUTS_PER_TICK:
+            player.inputs.append(direction)
+
+    def step(self):
+        # один тик: пачка поворотов, ходы всех змеек сразу (snake_arena.move_heads),
+        # еда, тела погибших; новые змейки появляются после ходов
+        self.ticks += 1
+        self.time += self.tick_ms
+        movers = []
+        for player in self.players.values():
+            snake = player.snake
+            if snake.is_alive:
+                for direction in player.inputs:
+                    snake.update_direction(direction)
+                movers.append((player.id, snake))
+            player.inputs.clear()
+
+        food_at = {food.position: food for food in self.foods if food.position is not None}
+        width = self.width
+        for snake, target in move_heads(movers, self.board, self.topology.next, self.ticks,
+                                        self.claims, self.claimer, self.owner):
+            food = food_at[(target % width, target // width)]
+            snake.grow()
+            if food.special:
+                snake.score += SPECIAL_FOOD_BONUS
+        for player in self.players.values():
+            snake = player.snake
+            if snake.is_alive:
+                continue
+            if snake.positions:
+                # тело погибшей змейки освобождает поле для остальных
+                remove_body(snake)
+            elif player.respawn:
+                self.spawn(player)
+
+        # съеденная (в её клетке теперь голова) и просроченная особая еда переезжает
+        cells = self.board.cells
+        for food in self.foods:
+            position = food.position
+            if (position is None or cells[position[1] * width + position[0]] != FOOD
+                    or food.is_expired(self.time)):
+                food.randomize_position(self.time)
+
+    def encode_tick(self):
+        out = bytearray(TICK_HEADER.pack(self.ticks, len(self.players)))
+        for player in self.players.values():
+            snake = player.snake
+            head = snake.positions[0] if snake.positions else (0, 0)
+            out += SNAKE_FIELDS.pack(player.id, snake_flags(snake), head[0], head[1],
+                                     snake.length, snake.score)
+        encode_foods(out, self.foods)
+        return frame(TICK, bytes(out))
+
+    def encode_snapshot(self):
+        out = bytearray(TICK_HEADER.pack(self.ticks, len(self.players)))
+        for player in self.players.values():
+            snake = player.snake
+            head = snake.positions[0] if snake.positions else (0, 0)
+            out += SNAKE_FIELDS.pack(player.id, snake_flags(snake), head[0], head[1],
+                                     snake.length, snake.score)
+            out += COUNT.pack(len(snake.positions))
+            for x, y in snake.positions:
+                out += CELL.pack(x, y)
+        encode_foods(out, self.foods)
+        out += COUNT.pack(len(self.obstacles))
+        for x, y in self.obstacles:
+            out += CELL.pack(x, y)
+        return frame(SNAPSHOT, bytes(out))
+
+    def broadcast(self, message):
+        # одни и те же байты всем; запись не ждет клиента
+        for player in list(self.players.values()):
+            writer = player.writer
+            if writer.is_closing():
+                continue
+            if writer.transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+                # клиент не читает - отключаем, комната не должна его ждать
+                writer.close()
+                continue
+            writer.write(message)
+            self.bytes_sent += len(message)
+
+    async def run(self, on_empty=None):
+        loop = asyncio.get_running_loop()
+        period = self.tick_ms / 1000
+        scheduled = loop.time()
+        while self.players:
+            scheduled += period
+            delay = scheduled - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            elif -delay > period * MAX_LAG_TICKS:
+                # сильно отстали (процесс был занят) - не догоняем пропущенное
+                scheduled = loop.time()
+            self.lags.add(max(0.0, loop.time() - scheduled) * 1000)
+            self.step()
+            if self.needs_snapshot:
+                self.needs_snapshot = False
+                self.broadcast(self.encode_snapshot())
+            else:
+                self.broadcast(self.encode_tick())
+        if on_empty is not None:
+            on_empty(self)
+
+class Server:
+    # комнаты по имени; комната создается первым вошедшим и закрывается,
+    # когда из неё ушел последний игрок
+    def __init__(self, mode=GameMode.CLASSIC, width=GRID_WIDTH, height=GRID_HEIGHT, tick_ms=SPEED):
+        self.mode = mode
+        self.width = width
+        self.height = height
+        self.tick_ms = tick_ms
+        self.rooms = {}
+        self.next_player = 1
+        self.server = None
+        # статистика закрытых комнат, чтобы нагрузочный прогон видел все тики
+        self.closed_lags = LagHistogram()
+        self.closed_bytes = 0
+
+    async def start(self, host="localhost", port=PORT):
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        for room in list(self.rooms.values()):
+            if room.task is not None:
+                room.task.cancel()
+
+    def room(self, name, mode, width, height, tick_ms):
+        # существующая комната или новая; новую регистрирует join, когда в
+        # неё вошел первый игрок
+        room = self.rooms.get(name)
+        if room is None:
+            width, height, tick_ms = width or self.width, height or self.height, tick_ms or self.tick_ms
+            if width < MIN_SIDE or height < MIN_SIDE or width * height > MAX_AREA:
+                raise JoinError(f"поле {width}x{height}: нужно не меньше {MIN_SIDE}x{MIN_SIDE} "
+                                f"и не больше {MAX_AREA} клеток")
+            if not MIN_TICK_MS <= tick_ms <= MAX_TICK_MS:
+                raise JoinError(f"тик {tick_ms} мс: нужно от {MIN_TICK_MS} до {MAX_TICK_MS}")
+            room = Room(name, mode if mode is not None else self.mode, width, height, tick_ms)
+        return room
+
+    def join(self, payload, writer):
+        # разбор JOIN и вход в комнату; возвращает (комната, игрок)
+        if len(payload) < JOIN_FIELDS.size:
+            raise ProtocolError("короткий JOIN")
+        mode, width, height, tick_ms = JOIN_FIELDS.unpack_from(payload)
+        name = payload[JOIN_FIELDS.size:].decode(errors="replace")
+        if mode > len(GameMode):
+            raise JoinError(f"неизвестный режим {mode - 1}")
+        room = self.room(name, GameMode(mode - 1) if mode else None, width, height, tick_ms)
+        player = room.add_player(self.next_player, writer)
+        self.next_player += 1
+        self.rooms.setdefault(name, room)
+        return room, player
+
+    def close_room(self, room):
+        if self.rooms.get(room.name) is room:
+            del self.rooms[room.name]
+        self.closed_lags.merge(room.lags)
+        self.closed_bytes += room.bytes_sent
+
+    async def handle(self, reader, writer):
+        writer.transport.set_write_buffer_limits(high=MAX_CLIENT_BUFFER)
+        frames = FrameReader()
+        room = player = None
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                for kind, payload in frames.feed(data):
+                    if kind == JOIN and room is None:
+                        room, player = self.join(payload, writer)
+                        writer.write(frame(WELCOME, WELCOME_FIELDS.pack(
+                            player.id, room.mode.value, room.width, room.height, room.tick_ms)))
+                        if room.task is None:
+                            room.task = asyncio.create_task(room.run(self.close_room))
+                    elif kind == INPUT and room is not None and payload:
+                        room.on_input(player.id, Direction(payload[0] & 3))
+                    elif kind == RESPAWN and room is not None:
+                        player.respawn = True
+        except ConnectionError:
+            # клиент ушел, не попрощавшись - обычное дело
+            pass
+        except JoinError as error:
+            # close ниже сначала допишет ERROR в сокет
+            writer.write(frame(ERROR, str(error).encode()))
+            print(f"snake_net: вход отклонен: {error}", file=sys.stderr)
+        except ValueError as error:
+            # в том числе ProtocolError
+            print(f"snake_net: клиент отключен: {error}", file=sys.stderr)
+        finally:
+            if player is not None:
+                room.remove_player(player.id)
+            writer.close()
+
+class Connection:
+    # Клиент для окна игры: неблокирующий сокет, который опрашивается
+    # каждый кадр (poll), без asyncio и потоков.
+    def __init__(self, host, port, room, mode=None, width=0, height=0, tick_ms=0):
+        self.sock = socket.create_connection((host, port))
+        self.sock.setblocking(False)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.frames = FrameReader()
+        self.outgoing = bytearray(encode_join(room, mode, width, height, tick_ms))
+        self.closed = False
+        # сообщения, прочитанные вместе с WELCOME, отдаст следующий poll
+        self.pending = []
+
+    def wait_welcome(self, timeout=5.0):
+        # ждет ответа на JOIN; остальные сообщения откладывает для poll
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and not self.closed:
+            # poll заодно отправляет сам JOIN
+            messages = self.poll()
+            for i, message in enumerate(messages):
+                if isinstance(message, Welcome):
+                    self.pending = messages[i + 1:]
+                    return message
+                if isinstance(message, Refused):
+                    raise ConnectionError(f"сервер не пустил в комнату: {message.reason}")
+            select.select([self.sock], [], [], max(0.0, deadline - time.monotonic()))
+        raise ConnectionError("сервер не ответил на вход в комнату")
+
+    def send_input(self, direction):
+        self.outgoing += encode_input(direction)
+
+    def send_respawn(self):
+        self.outgoing += frame(RESPAWN)
+
+    def poll(self):
+        # отправляет накопленное и возвращает пришедшие сообщения
+        messages, self.pending = self.pending, []
+        if self.closed:
+            return messages
+        try:
+            if self.outgoing:
+                sent = self.sock.send(self.outgoing)
+                del self.outgoing[:sent]
+            while True:
+                data = self.sock.recv(65536)
+                if not data:
+                    self.closed = True
+                    break
+                for kind, payload in self.frames.feed(data):
+                    messages.append(decode_message(kind, payload))
+        except BlockingIOError:
+            pass
+        except OSError:
+            self.closed = True
+        return messages
+
+    def close(self):
+        self.closed = True
+        self.sock.close()
+
+async def simulated_client(host, port, room, seconds, rng, stats):
+    # нагрузочный клиент: входит в комнату, поворачивает случайно, после
+    # смерти просит новую змейку; считает полученные тики
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(encode_join(room))
+    frames = FrameReader()
+    deadline = asyncio.get_running_loop().time() + seconds
+    player = None
+    ticks = 0
+    try:
+        while asyncio.get_running_loop().time() < deadline:
+            try:
+                data = await asyncio.wait_for(reader.read(65536), deadline - asyncio.get_running_loop().time())
+            except asyncio.TimeoutError:
+                break
+            if not data:
+                break
+            for kind, payload in frames.feed(data):
+                message = decode_message(kind, payload)
+                if isinstance(message, Welcome):
+                    player = message.player
+                    continue
+                if isinstance(message, Refused):
+                    return
+                ticks += 1
+                me = next((snake for snake in message.snakes if snake.id == player), None)
+                if me is not None and not me.alive:
+                    writer.write(frame(RESPAWN))
+                elif rng.random() < 0.2:
+                    writer.write(encode_input(Direction(rng.randrange(4))))
+    finally:
+        writer.close()
+        stats["ticks"] += ticks
+        stats["clients"] += 1
+
+async def load_test(rooms, clients, seconds, mode=GameMode.CLASSIC, width=GRID_WIDTH, height=GRID_HEIGHT,
+                    tick_ms=SPEED, seed=0):
+    # сервер и rooms * clients клиентов в одном процессе через localhost
+    server = Server(mode, width, height, tick_ms)
+    port = await server.start("localhost", 0)
+    rng = random.Random(seed)
+    stats = {"ticks": 0, "clients": 0}
+    started = time.perf_counter()
+    await asyncio.gather(*(simulated_client("localhost", port, f"room-{room}", seconds,
+                                            random.Random(rng.getrandbits(63)), stats)
+                           for room in range(rooms) for _ in range(clients)))
+    # комнаты закрываются, когда уходит последний клиент
+    while server.rooms:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    await server.stop()
+    return server, stats, elapsed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сервер сетевой змейки и нагрузочный прогон")
+    parser.add_argument("command", choices=("serve", "load"))
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--mode", choices=[mode.name.lower() for mode in GameMode], default="classic",
+                        help="режим новых комнат, если клиент его не задал")
+    parser.add_argument("--width", type=int, default=GRID_WIDTH)
+    parser.add_argument("--height", type=int, default=GRID_HEIGHT)
+    parser.add_argument("--tick-ms", type=int, default=SPEED, help="мс на тик в новых комнатах")
+    parser.add_argument("--rooms", type=int, default=100, help="load: число комнат")
+    parser.add_argument("--clients", type=int, default=4, help="load: игроков в комнате")
+    parser.add_argument("--seconds", type=float, default=10, help="load: длительность")
+    args = parser.parse_args()
+    mode = GameMode[args.mode.upper()]
+
+    if args.command == "serve":
+        async def serve():
+            server = Server(mode, args.width, args.height, args.tick_ms)
+            port = await server.start(args.host, args.port)
+            print(f"сервер слушает {args.host}:{port}")
+            await server.server.serve_forever()
+        try:
+            asyncio.run(serve())
+        except KeyboardInterrupt:
+            pass
+    else:
+        server, stats, elapsed = asyncio.run(load_test(args.rooms, args.clients, args.seconds, mode,
+                                                       args.width, args.height, args.tick_ms))
+        lags = server.closed_lags
+        expected = args.rooms * args.seconds * 1000 / args.tick_ms
+        print(f"комнат {args.rooms}, клиентов {stats['clients']}, {elapsed:.1f} с")
+        print(f"тиков комнат {lags.count} (по расписанию {expected:.0f}), "
+              f"получено клиентами {stats['ticks']}")
+        if lags.count:
+            print(f"запаздывание тика: среднее {lags.mean():.2f} мс, "
+                  f"p99 {lags.percentile(0.99):.2f} мс, максимум {lags.max:.2f} мс")
+        print(f"отправлено {server.closed_bytes / 1024:.0f} КБ")
@@ -0,0 +1,167 @@
+import argparse
+import time
+
+import numpy as np
+
+from snake_core import GRID_WIDTH, GRID_HEIGHT, BODY, FOOD, OBSTACLE, VOID, GameMode, Simulation
+
+# Наблюдения для ботов и обучаемых агентов без пересборки поля на каждом шаге.
+#
+# GridObserver держит тензор каналов (CHANNELS, height, width) из uint8 всю
+# партию. После тика правятся только клетки, которые тик мог изменить:
+# старая и новая голова, ушедший хвост, старая и новая клетка еды. Полная
+# сборка из сетки snake_core - только при новой партии или если тики
+# пропущены. Наружу отдается вид на тот же массив только для чтения: он
+# меняется сам, копировать его на каждом шаге не нужно.
+#
+# Сетка кодов клеток (EMPTY, BODY, OBSTACLE, FOOD, VOID из snake_core)
+# доступна совсем без работы: cells - вид на Board.cells.
+#
+# Кадры с пикселями - snake_game.Game.rgb_array.
+#
+#     python snake_observe.py --width 200 --height 200 --ticks 2000
+
+BODY_CHANNEL = 0
+HEAD_CHANNEL = 1
+FOOD_CHANNEL = 2
+SPECIAL_CHANNEL = 3
+OBSTACLE_CHANNEL = 4
+CHANNELS = 5
+
+def read_only(array):
+    view = array.view()
+    view.flags.writeable = False
+    return view
+
+class GridObserver:
+    def __init__(self, sim):
+        self.sim = sim
+        height, width = sim.height, sim.width
+        self.area = width * height
+        self.tensor = np.zeros((CHANNELS, height, width), dtype=np.uint8)
+        # те же байты для правки по одной клетке: канал * area + клетка;
+        # запись в memoryview в разы дешевле, чем в массив NumPy по индексу
+        self.raw = memoryview(self.tensor.reshape(-1))
+        self.grid = read_only(self.tensor)
+        self.cells = read_only(np.frombuffer(sim.board.cells, dtype=np.uint8).reshape(height, width))
+        self.rebuild()
+
+    def remember(self):
+        # что нужно знать о прошлом тике, чтобы найти изменившиеся клетки
+        sim = self.sim
+        positions = sim.snake.positions
+        self.seed = sim.seed
+        self.ticks = sim.ticks
+        self.head = self.index(positions[0]) if positions else None
+        self.tail = self.index(positions[-1]) if positions else None
+        self.food = self.index(sim.food.position) if sim.food.position is not None else None
+
+    def index(self, position):
+        return position[1] * self.sim.width + position[0]
+
+    def rebuild(self):
+        # всё поле заново, векторно по сетке
+        sim = self.sim
+        cells = self.cells
+        tensor = self.tensor
+        np.equal(cells, BODY, out=tensor[BODY_CHANNEL], casting="unsafe")
+        np.equal(cells, OBSTACLE, out=tensor[OBSTACLE_CHANNEL], casting="unsafe")
+        tensor[OBSTACLE_CHANNEL] |= cells == VOID
+        tensor[HEAD_CHANNEL] = 0
+        tensor[FOOD_CHANNEL] = 0
+        tensor[SPECIAL_CHANNEL] = 0
+        if sim.snake.positions:
+            x, y = sim.snake.positions[0]
+            tensor[HEAD_CHANNEL, y, x] = 1
+        if sim.food.position is not None:
+            x, y = sim.food.position
+            if cells[y, x] == FOOD:
+                tensor[SPECIAL_CHANNEL if sim.food.special else FOOD_CHANNEL, y, x] = 1
+        self.remember()
+
+    def update(self):
+        # вызывать после каждого sim.step; возвращает grid
+        sim = self.sim
+        ticks = sim.ticks
+        if sim.seed != self.seed or not self.ticks <= ticks <= self.ticks + 1:
+            self.rebuild()
+            return self.grid
+        width = sim.width
+        food = sim.food
+        food_index = None
+        if food.position is not None:
+            food_index = food.position[1] * width + food.position[0]
+        if ticks == self.ticks and food_index == self.food:
+            return self.grid
+
+        positions = sim.snake.positions
+        x, y = positions[0]
+        head = y * width + x
+        x, y = positions[-1]
+        tail = y * width + x
+        special = food.special
+        cells, raw, area = sim.board.cells, self.raw, self.area
+        # каналы каждой затронутой клетки по её коду в сетке; байты канала c
+        # начинаются с c * area
+        for index in {head, self.head, self.tail, self.food, food_index}:
+            if index is None:
+                continue
+            code = cells[index]
+            is_food = code == FOOD and index == food_index
+            raw[index] = code == BODY
+            raw[area + index] = index == head
+            raw[2 * area + index] = is_food and not special
+            raw[3 * area + index] = is_food and special
+            raw[4 * area + index] = code == OBSTACLE or code == VOID
+        self.ticks = ticks
+        self.head, self.tail, self.food = head, tail, food_index
+        return self.grid
+
+def python_grid(sim):
+    # так наблюдение собиралось раньше: обход тела, еды и препятствий в Python на каждом шаге
+    grid = np.zeros((CHANNELS, sim.height, sim.width), dtype=np.uint8)
+    for x, y in sim.snake.positions:
+        grid[BODY_CHANNEL, y, x] = 1
+    x, y = sim.snake.positions[0]
+    grid[HEAD_CHANNEL, y, x] = 1
+    if sim.food.position is not None:
+        x, y = sim.food.position
+        grid[SPECIAL_CHANNEL if sim.food.special else FOOD_CHANNEL, y, x] = 1
+    for x, y in sim.obstacles:
+        grid[OBSTACLE_CHANNEL, y, x] = 1
+    return grid
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Наблюдения для агентов: замер и проверка тензора поля")
+    parser.add_argument("--width", type=int, default=GRID_WIDTH)
+    parser.add_argument("--height", type=int, default=GRID_HEIGHT)
+    parser.add_argument("--ticks", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from snake_bot import Autopilot
+    sim = Simulation(GameMode.OBSTACLES, args.width, args.height, seed=args.seed)
+    bot = Autopilot(sim)
+    observer = GridObserver(sim)
+    timings = {"update": 0.0, "rebuild": 0.0, "python": 0.0}
+    steps = 0
+    for _ in range(args.ticks):
+        sim.step(bot.decide())
+        start = time.perf_counter()
+        grid = observer.update()
+        middle = time.perf_counter()
+        reference = python_grid(sim)
+        end = time.perf_counter()
+        timings["update"] += middle - start
+        timings["python"] += end - middle
+        if not np.array_equal(grid, reference):
+            raise SystemExit(f"тик {sim.ticks}: тензор расходится со сборкой в Python")
+        start = time.perf_counter()
+        observer.rebuild()
+        timings["rebuild"] += time.perf_counter() - start
+        steps += 1
+        if not sim.snake.is_alive:
+            sim.reset()
+    print(f"поле {args.width}x{args.height}, шагов {steps}, тензор совпадает со сборкой в Python")
+    for name, seconds in timings.items():
+        print(f"  {name:<8} {seconds / steps * 1e6:.1f} мкс на шаг")
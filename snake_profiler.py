@@ -0,0 +1,82 @@
+import csv
+import json
+import time
+
+import numpy as np
+
+# Замер времени по фазам кадра. Каждый кадр - строка в кольцевом буфере
+# фиксированного размера (столбец на фазу, время в мс), старые кадры
+# перезаписываются. По буферу считаются p50/p99 для оверлея, его же можно
+# выгрузить в CSV или JSON.
+
+PHASES = ("events", "update", "draw", "background", "obstacles", "snake", "particles", "hud", "flip")
+
+class Phase:
+    # переиспользуемый контекстный менеджер, чтобы не создавать объект на каждый замер
+    def __init__(self, profiler, column):
+        self.profiler = profiler
+        self.column = column
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.current[self.column] += (time.perf_counter() - self.start) * 1000.0
+        return False
+
+class FrameProfiler:
+    def __init__(self, capacity=600, phases=PHASES):
+        self.phases = phases
+        self.columns = {name: i for i, name in enumerate(phases)}
+        self.samples = np.zeros((capacity, len(phases)))
+        self.current = np.zeros(len(phases))
+        self.index = 0
+        self.count = 0
+        self.frame_ids = np.zeros(capacity, dtype=np.int64)
+        self.frames = 0
+        self.contexts = {name: Phase(self, i) for i, name in enumerate(phases)}
+
+    def phase(self, name):
+        return self.contexts[name]
+
+    def end_frame(self):
+        # фиксирует текущий кадр в буфере и начинает следующий
+        self.samples[self.index] = self.current
+        self.frame_ids[self.index] = self.frames
+        self.current[:] = 0.0
+        self.frames += 1
+        self.index = (self.index + 1) % len(self.samples)
+        self.count = min(self.count + 1, len(self.samples))
+
+    def ordered(self):
+        # кадры из буфера от старых к новым
+        if self.count < len(self.samples):
+            return self.frame_ids[:self.count], self.samples[:self.count]
+        order = np.r_[self.index:len(self.samples), 0:self.index]
+        return self.frame_ids[order], self.samples[order]
+
+    def stats(self):
+        # [(фаза, p50, p99)] по кадрам в буфере, мс
+        if not self.count:
+            return [(name, 0.0, 0.0) for name in self.phases]
+        p50, p99 = np.percentile(self.samples[:self.count], [50, 99], axis=0)
+        return list(zip(self.phases, p50.tolist(), p99.tolist()))
+
+    def dump(self, path):
+        # формат выбирается по расширению: .json, иначе CSV
+        frame_ids, samples = self.ordered()
+        if path.endswith(".json"):
+            with open(path, "w") as file:
+                json.dump({
+                    "phases": list(self.phases),
+                    "unit": "ms",
+                    "frames": [[int(frame)] + row for frame, row in zip(frame_ids, samples.tolist())],
+                }, file)
+        else:
+            with open(path, "w", newline="") as file:
+                writer = csv.writer(file)
+                writer.writerow(("frame",) + tuple(self.phases))
+                for frame, row in zip(frame_ids.tolist(), samples.tolist()):
+                    writer.writerow([frame] + [f"{value:.4f}" for value in row])
@@ -0,0 +1,242 @@
+import struct
+import sys
+
+from snake_core import (
+    GRID_WIDTH, GRID_HEIGHT, DEATH_WALL, DEATH_TAIL, DEATH_OBSTACLE, WIN_MESSAGE,
+    Direction, GameMode, Simulation,
+)
+from snake_levels import LEVEL_KINDS, LevelSpec
+from snake_topology import Topology
+
+# Записи партий. Партия полностью определяется seed, режимом, размером поля
+# и поворотами по тикам, поэтому в файл пишутся только они плюс итог партии
+# для проверки. Повороты кодируются varint-ами: (разница тиков << 2) | направление.
+# С версии 2 после заголовка пишутся параметры уровня (LEVEL), с версии 3 -
+# своя топология поля (TOPOLOGY); старые версии читаются как партии без
+# уровня и с обычной топологией.
+#
+# Проверить записи без окна: python snake_replay.py файл1 файл2 ...
+
+MAGIC = b"SNKR"
+VERSION = 3
+HEADER = struct.Struct("<4sBBHHQIIBI")
+# тип уровня (0 - без уровня, дальше номер в LEVEL_KINDS + 1), count, corridor, loops, seed + 1 (0 - нет)
+LEVEL = struct.Struct("<BIBBQ")
+# флаги (TOPOLOGY_CUSTOM, TOPOLOGY_WRAP), клеток вне поля, правок таблицы;
+# дальше varint-ы: клетки вне поля разницами номеров, правки - разница
+# номера в next и куда + 1 (0 - стена). См. Topology.changes
+TOPOLOGY = struct.Struct("<BII")
+TOPOLOGY_CUSTOM = 1
+TOPOLOGY_WRAP = 2
+
+# коды причин окончания партии в файле
+REASONS = ["", DEATH_WALL, DEATH_TAIL, DEATH_OBSTACLE, WIN_MESSAGE]
+
+class ReplayError(ValueError):
+    pass
+
+def write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def read_varint(data, pos):
+    value = 0
+    shift = 0
+    while True:
+        if pos >= len(data):
+            raise ReplayError("запись обрезана")
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+def pack_level(level):
+    if level is None:
+        return LEVEL.pack(0, 0, 0, 0, 0)
+    return LEVEL.pack(LEVEL_KINDS.index(level.kind) + 1, level.count, level.corridor,
+                      level.loops, 0 if level.seed is None else level.seed + 1)
+
+def unpack_level(data, pos):
+    # (LevelSpec или None, позиция после блока)
+    if len(data) < pos + LEVEL.size:
+        raise ReplayError("запись обрезана")
+    kind, count, corridor, loops, seed = LEVEL.unpack_from(data, pos)
+    if kind > len(LEVEL_KINDS):
+        raise ReplayError(f"неизвестный тип уровня: {kind}")
+    level = None
+    if kind:
+        level = LevelSpec(LEVEL_KINDS[kind - 1], count, corridor, loops, seed - 1 if seed else None)
+    return level, pos + LEVEL.size
+
+def pack_topology(topology):
+    # topology - своя топология партии (Simulation.topology) или None
+    if topology is None:
+        return TOPOLOGY.pack(0, 0, 0)
+    void, edits = topology.changes()
+    out = bytearray(TOPOLOGY.pack(TOPOLOGY_CUSTOM | (TOPOLOGY_WRAP if topology.wrap else 0),
+                                  len(void), len(edits)))
+    previous = 0
+    for index in void:
+        write_varint(out, index - previous)
+        previous = index
+    previous = 0
+    for slot, value in edits:
+        write_varint(out, slot - previous)
+        write_varint(out, value + 1)
+        previous = slot
+    return bytes(out)
+
+def unpack_topology(data, pos, width, height):
+    # (Topology или None, позиция после блока)
+    if len(data) < pos + TOPOLOGY.size:
+        raise ReplayError("запись обрезана")
+    flags, void_count, edit_count = TOPOLOGY.unpack_from(data, pos)
+    pos += TOPOLOGY.size
+    if not flags & TOPOLOGY_CUSTOM:
+        return None, pos
+    area = width * height
+    void = []
+    index = 0
+    for _ in range(void_count):
+        step, pos = read_varint(data, pos)
+        index += step
+        if index >= area:
+            raise ReplayError("топология: клетка за краем поля")
+        void.append(index)
+    edits = []
+    slot = 0
+    for _ in range(edit_count):
+        step, pos = read_varint(data, pos)
+        value, pos = read_varint(data, pos)
+        slot += step
+        if slot >= area * 4 or value > area:
+            raise ReplayError("топология: правка за краем поля")
+        edits.append((slot, value - 1))
+    return Topology.from_changes(width, height, bool(flags & TOPOLOGY_WRAP), void, edits), pos
+
+class Replay:
+    def __init__(self, mode=GameMode.CLASSIC, seed=0, width=GRID_WIDTH, height=GRID_HEIGHT,
+                 events=None, ticks=0, score=0, death_reason="", level=None, topology=None):
+        self.mode = mode
+        self.seed = seed
+        self.width = width
+        self.height = height
+        # список (тик, Direction): поворот, примененный на этом тике
+        self.events = events if events is not None else []
+        # итог партии: сколько тиков прошло, счет и причина окончания
+        self.ticks = ticks
+        self.score = score
+        self.death_reason = death_reason
+        # параметры уровня (snake_levels.LevelSpec) или None
+        self.level = level
+        # своя топология поля (snake_topology.Topology) или None
+        self.topology = topology
+        self.last_direction = None
+
+    @classmethod
+    def record(cls, sim):
+        # начинает запись партии; вызывать сразу после sim.reset()
+        replay = cls(sim.mode, sim.seed, sim.width, sim.height, level=sim.level, topology=sim.topology)
+        replay.last_direction = sim.snake.direction
+        sim.recorder = replay
+        return replay
+
+    def on_tick(self, sim):
+        snake = sim.snake
+        if snake.direction != self.last_direction:
+            self.events.append((sim.ticks, snake.direction))
+            self.last_direction = snake.direction
+        self.ticks = sim.ticks
+        self.score = snake.score
+        self.death_reason = WIN_MESSAGE if sim.won else snake.death_reason
+
+    def actions(self):
+        # тик -> направление, удобно для проигрывания
+        return dict(self.events)
+
+    def to_bytes(self):
+        out = bytearray(HEADER.pack(
+            MAGIC, VERSION, self.mode.value, self.width, self.height, self.seed,
+            self.ticks, self.score, REASONS.index(self.death_reason), len(self.events),
+        ))
+        out += pack_level(self.level)
+        out += pack_topology(self.topology)
+        previous = 0
+        for tick, direction in self.events:
+            write_varint(out, ((tick - previous) << 2) | direction.value)
+            previous = tick
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data):
+        data = memoryview(data)
+        if len(data) < HEADER.size:
+            raise ReplayError("запись обрезана")
+        (magic, version, mode, width, height, seed,
+         ticks, score, reason, count) = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ReplayError("это не запись партии")
+        if not 1 <= version <= VERSION:
+            raise ReplayError(f"неизвестная версия записи: {version}")
+
+        level = topology = None
+        pos = HEADER.size
+        if version >= 2:
+            level, pos = unpack_level(data, pos)
+        if version >= 3:
+            topology, pos = unpack_topology(data, pos, width, height)
+
+        events = []
+        tick = 0
+        for _ in range(count):
+            value, pos = read_varint(data, pos)
+            tick += value >> 2
+            events.append((tick, Direction(value & 3)))
+        return cls(GameMode(mode), seed, width, height, events, ticks, score, REASONS[reason], level, topology)
+
+    def save(self, path):
+        with open(path, "wb") as file:
+            file.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as file:
+            return cls.from_bytes(file.read())
+
+    def play(self, sim=None):
+        # проигрывает партию без окна с максимальной скоростью
+        if sim is None:
+            sim = Simulation(self.mode, self.width, self.height, seed=self.seed, level=self.level,
+                             topology=self.topology)
+        else:
+            sim.level = self.level
+            sim.topology = self.topology
+            sim.reset(self.mode, self.seed)
+        actions = self.actions()
+        step = sim.step
+        while sim.ticks < self.ticks and sim.snake.is_alive and not sim.won:
+            step(actions.get(sim.ticks + 1))
+        return sim
+
+    def verify(self, sim=None):
+        # True, если проигрывание дает тот же итог, что был записан;
+        # sim - уже проигранная партия, иначе проигрывается заново
+        if sim is None:
+            sim = self.play()
+        reason = WIN_MESSAGE if sim.won else sim.snake.death_reason
+        return (sim.ticks, sim.snake.score, reason) == (self.ticks, self.score, self.death_reason)
+
+if __name__ == "__main__":
+    failed = 0
+    for path in sys.argv[1:]:
+        replay = Replay.load(path)
+        sim = replay.play()
+        ok = replay.verify(sim)
+        failed += not ok
+        print(f"{path}: тиков {sim.ticks}, счет {sim.snake.score}, "
+              f"{sim.snake.death_reason or '-'} {'OK' if ok else 'РАСХОЖДЕНИЕ'}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,220 @@
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+
+from snake_core import GameMode
+
+# Таблицы рекордов по режимам и история партий в SQLite (режим WAL).
+# Игра не ждет диска: результат сразу попадает в таблицу лучших в памяти,
+# а запись в файл идет фоновым потоком пачками, по транзакции на пачку.
+#
+# Посмотреть рекорды и последние партии: python snake_scores.py [файл]
+
+SCORES_FILE = "scores.db"
+# старый файл с одним общим рекордом, переносится в базу при первом запуске
+LEGACY_FILE = "highscore.txt"
+TOP_SIZE = 10
+# сколько результатов писать одной транзакцией
+BATCH_SIZE = 64
+# повторы записи, если база занята другим процессом
+WRITE_RETRIES = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    mode INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    ticks INTEGER NOT NULL,
+    death_reason TEXT NOT NULL,
+    seed INTEGER,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    finished_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS games_by_score ON games (mode, score DESC);
+"""
+
+INSERT = ("INSERT INTO games (mode, score, length, ticks, death_reason, seed, width, height, finished_at) "
+          "VALUES (:mode, :score, :length, :ticks, :death_reason, :seed, :width, :height, :finished_at)")
+
+def warn(message):
+    print(f"snake_scores: {message}", file=sys.stderr)
+
+# файлы журнала WAL рядом с базой: без своей базы они бессмысленны, а к
+# новой базе с тем же именем SQLite попытается их применить
+SIDECARS = ("-wal", "-shm")
+
+def connect(path):
+    connection = sqlite3.connect(path, timeout=5)
+    try:
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        # с FULL закоммиченная партия переживает и отключение питания; fsync
+        # идет в фоновом потоке, поэтому кадры от этого не тормозят
+        connection.execute("PRAGMA synchronous=FULL")
+        connection.executescript(SCHEMA)
+    except sqlite3.Error:
+        # файл базы не должен оставаться открытым: его будут откладывать
+        connection.close()
+        raise
+    return connection
+
+class ScoreStore:
+    def __init__(self, path=SCORES_FILE, top_size=TOP_SIZE, legacy_path=LEGACY_FILE):
+        self.path = path
+        self.top_size = top_size
+        # лучшие результаты по режимам, по убыванию счета
+        self.tops = {mode: [] for mode in GameMode}
+        self.queue = queue.Queue()
+        self.open(legacy_path)
+        self.writer = threading.Thread(target=self.write_loop, name="score-writer", daemon=True)
+        self.writer.start()
+
+    def open(self, legacy_path):
+        try:
+            self.load(legacy_path)
+        except sqlite3.OperationalError as error:
+            # база занята или недоступна: играем с пустыми таблицами,
+            # фоновый поток попробует записать результаты позже
+            warn(f"не удалось открыть {self.path}: {error}")
+        except sqlite3.DatabaseError as error:
+            # поврежденную базу не затираем: откладываем рядом и начинаем новую
+            broken = f"{self.path}.broken-{int(time.time())}"
+            warn(f"база {self.path} повреждена ({error}), сохранена как {broken}")
+            os.replace(self.path, broken)
+            for suffix in SIDECARS:
+                if os.path.exists(self.path + suffix):
+                    os.replace(self.path + suffix, broken + suffix)
+            self.load(legacy_path)
+
+    def load(self, legacy_path):
+        # читается один раз при запуске, дальше таблицы живут в памяти
+        connection = connect(self.path)
+        try:
+            if legacy_path and connection.execute("SELECT COUNT(*) FROM games").fetchone()[0] == 0:
+                self.import_legacy(connection, legacy_path)
+            for mode in GameMode:
+                rows = connection.execute(
+                    "SELECT * FROM games WHERE mode = ? ORDER BY score DESC, id LIMIT ?",
+                    (mode.value, self.top_size)).fetchall()
+                self.tops[mode] = [dict(row) for row in rows]
+        finally:
+            connection.close()
+
+    def import_legacy(self, connection, legacy_path):
+        # старый рекорд был общим для всех режимов, переносим его в классический
+        try:
+            with open(legacy_path) as file:
+                score = int(file.read().strip())
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as error:
+            warn(f"не удалось прочитать {legacy_path}: {error}")
+            return
+        with connection:
+            connection.execute(INSERT, self.entry(GameMode.CLASSIC, score))
+
+    def entry(self, mode, score, length=0, ticks=0, death_reason="", seed=None, width=0, height=0):
+        return {"mode": mode.value, "score": score, "length": length, "ticks": ticks,
+                "death_reason": death_reason, "seed": seed, "width": width, "height": height,
+                "finished_at": time.time()}
+
+    def record(self, mode, score, **details):
+        # результат сразу виден в top/best, на диск он попадет из фонового потока
+        entry = self.entry(mode, score, **details)
+        top = self.tops[mode]
+        # при равном счете выше стоит более ранний результат
+        position = len(top)
+        while position and top[position - 1]["score"] < score:
+            position -= 1
+        if position < self.top_size:
+            top.insert(position, entry)
+            del top[self.top_size:]
+        self.queue.put(entry)
+        return entry
+
+    def best(self, mode):
+        top = self.tops[mode]
+        return top[0]["score"] if top else 0
+
+    def top(self, mode):
+        return list(self.tops[mode])
+
+    def write_loop(self):
+        # None в очереди - сигнал остановиться после записи того, что уже пришло
+        connection = None
+        stop = False
+        while not stop:
+            batch = []
+            entry = self.queue.get()
+            # все, что накопилось к этому моменту, пишется одной транзакцией
+            while True:
+                if entry is None:
+                    stop = True
+                else:
+                    batch.append(entry)
+                if stop or len(batch) >= BATCH_SIZE:
+                    break
+                try:
+                    entry = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                connection = self.write_batch(connection, batch)
+            for _ in range(len(batch) + stop):
+                self.queue.task_done()
+        if connection is not None:
+            connection.close()
+
+    def write_batch(self, connection, batch):
+        for attempt in range(WRITE_RETRIES):
+            try:
+                if connection is None:
+                    connection = connect(self.path)
+                with connection:
+                    connection.executemany(INSERT, batch)
+                return connection
+            except sqlite3.OperationalError as error:
+                # например, база заблокирована; пробуем снова с новым соединением
+                warn(f"запись не удалась ({error}), попытка {attempt + 1} из {WRITE_RETRIES}")
+                if connection is not None:
+                    connection.close()
+                    connection = None
+                time.sleep(0.1 * (attempt + 1))
+        warn(f"потеряно результатов: {len(batch)}")
+        return connection
+
+    def flush(self):
+        # ждет, пока все поставленные результаты будут записаны
+        self.queue.join()
+
+    def close(self):
+        if self.writer.is_alive():
+            self.queue.put(None)
+            self.writer.join()
+
+def history(path=SCORES_FILE, limit=20):
+    # последние партии, новые первыми
+    connection = connect(path)
+    try:
+        rows = connection.execute("SELECT * FROM games ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [dict(row) for row in rows]
+    finally:
+        connection.close()
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else SCORES_FILE
+    store = ScoreStore(path, legacy_path=None)
+    store.close()
+    for mode in GameMode:
+        print(f"{mode.name}:")
+        for place, entry in enumerate(store.top(mode), 1):
+            print(f"  {place:>2}. {entry['score']:>6}  длина {entry['length']}, тиков {entry['ticks']}, "
+                  f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(entry['finished_at']))}")
+    print("последние партии:")
+    for entry in history(path):
+        print(f"  {GameMode(entry['mode']).name:<10} {entry['score']:>6}  {entry['death_reason'] or '-'}")
@@ -0,0 +1,461 @@
+import struct
+import sys
+from array import array
+from collections import deque
+
+from snake_core import EMPTY, BODY, FOOD, WIN_MESSAGE, Direction, GameMode, Simulation
+from snake_replay import (
+    REASONS, pack_level, unpack_level, pack_topology, unpack_topology, write_varint, read_varint, ReplayError,
+)
+
+# Снимки состояния партии в двоичном виде: сохранить и продолжить партию,
+# контрольные точки долгих прогонов бота, поток для зрителей.
+#
+# Снимок - заголовок struct, уровень и своя топология поля (блоки из
+# snake_replay; в версии 1 топологии нет), сетка Board.cells и массивы номеров клеток
+# (y * width + x): тело от головы к хвосту, препятствия, список свободных
+# клеток Board.free в его текущем порядке, на больших полях еще Board.slot,
+# и состояние генератора случайных чисел. С порядком free и генератором
+# продолженная партия совпадает с исходной тик в тик. Сетка и массивы поля
+# пишутся через memoryview прямо из памяти и так же целиком читаются обратно,
+# без промежуточных копий и без прохода по клеткам в Python: для поля
+# 2000x2000 это десятки мегабайт.
+#
+# Поток для зрителей - ключевой кадр (полный снимок) и дальше по записи
+# на тик: новая голова, сколько клеток ушло с хвоста, новая еда, счет.
+# Сетка, препятствия и генератор в записи тика не попадают.
+#
+# Посмотреть снимки: python snake_snapshot.py файл1 файл2 ...
+
+MAGIC = b"SNKS"
+VERSION = 2
+# magic, версия, режим, ширина, высота, seed, тики, время, победа
+HEADER = struct.Struct("<4sBBHHQIQB")
+# направление, length, счет, скорость, жива, причина (номер в REASONS), поворотов в очереди
+SNAKE = struct.Struct("<BIIIBBB")
+# клетка еды + 1 (0 - еды нет), особая, special_timer
+FOOD_FIELDS = struct.Struct("<IBQ")
+# клеток тела, препятствий, свободных; версия генератора, слов в его состоянии, есть ли gauss
+COUNTS = struct.Struct("<IIIBHBd")
+
+# записи потока
+KEYFRAME = 0
+DELTA = 1
+# операции в записи тика
+OP_HEAD = 0       # новая голова: клетка
+OP_TAIL = 1       # с хвоста ушло клеток: число
+OP_FOOD = 2       # еда: клетка + 1, особая, special_timer
+OP_STATUS = 3     # счет, length, скорость
+OP_DIRECTION = 4  # направление
+OP_END = 5        # конец партии: причина (номер в REASONS)
+# ключевой кадр не реже, чем раз в столько тиков, чтобы зритель мог подключиться на ходу
+KEYFRAME_EVERY = 600
+
+LITTLE_ENDIAN = sys.byteorder == "little"
+# На полях до 65536 клеток номера клеток пишутся по 2 байта, а Board.slot
+# не пишется - восстановить его по free дешевле. На больших полях номера
+# по 4 байта, как в самих массивах, и slot пишется как есть.
+SMALL_AREA = 1 << 16
+
+class SnapshotError(ValueError):
+    pass
+
+def cell_typecode(area):
+    return "H" if area <= SMALL_AREA else "i"
+
+def as_little(values, typecode):
+    # массив в порядке байтов файла; если тип совпадает и порядок байтов
+    # little-endian, это сам массив, без копии
+    if values.typecode != typecode:
+        values = array(typecode, values)
+    if not LITTLE_ENDIAN:
+        values = array(values.typecode, values)
+        values.byteswap()
+    return memoryview(values)
+
+def read_array(view, pos, typecode, count):
+    values = array(typecode)
+    end = pos + count * values.itemsize
+    if end > len(view):
+        raise SnapshotError("снимок обрезан")
+    values.frombytes(view[pos:end])
+    if not LITTLE_ENDIAN:
+        values.byteswap()
+    return values, end
+
+def in_range(values, area):
+    return not values or (min(values) >= 0 and max(values) < area)
+
+def check_free(grid, free, slot, area):
+    # free - ровно пустые клетки сетки без повторов, slot - их места в free
+    # и -1 у остальных клеток: иначе Board выдаст занятую клетку или упадет.
+    # Возвращает slot; на малых полях его в снимке нет, он собирается по free.
+    if slot is None:
+        if not in_range(free, area):
+            raise SnapshotError("снимок поврежден: свободные клетки")
+        slot = array("i", [-1]) * area
+        for place, index in enumerate(free):
+            if grid[index] != EMPTY or slot[index] != -1:
+                raise SnapshotError("снимок поврежден: свободные клетки")
+            slot[index] = place
+        return slot
+    # на больших полях это миллионы клеток: проверка векторная, NumPy
+    # импортируется только здесь
+    import numpy as np
+    places = np.frombuffer(free, dtype=np.int32)
+    slots = np.frombuffer(slot, dtype=np.int32)
+    if len(places) and (places.min() < 0 or places.max() >= area):
+        raise SnapshotError("снимок поврежден: свободные клетки")
+    if (np.frombuffer(grid, dtype=np.uint8)[places] != EMPTY).any():
+        raise SnapshotError("снимок поврежден: свободные клетки")
+    if (not np.array_equal(slots[places], np.arange(len(places)))
+            or np.count_nonzero(slots == -1) != area - len(places)):
+        raise SnapshotError("снимок поврежден: Board.slot")
+    return slot
+
+def cell_index(sim, position):
+    return 0 if position is None else position[1] * sim.width + position[0] + 1
+
+def reason_code(snake, won):
+    reason = WIN_MESSAGE if won else snake.death_reason
+    return REASONS.index(reason) if reason in REASONS else 0
+
+def write(sim, write_chunk):
+    # Пишет снимок кусками через write_chunk (file.write, bytearray.extend,
+    # socket.sendall). Сетка и массивы поля отдаются как memoryview: пока
+    # вид жив, массив нельзя менять, поэтому виды освобождаются сразу после
+    # записи, а сама запись должна идти до следующего тика.
+    snake, food, board = sim.snake, sim.food, sim.board
+    width = sim.width
+    area = width * sim.height
+    cells = cell_typecode(area)
+    body = array(cells, [y * width + x for x, y in snake.positions])
+    obstacles = array(cells, [y * width + x for x, y in sim.obstacles])
+    rng_version, words, gauss = sim.rng.getstate()
+    words = array("I", words)
+    queue = bytes(direction.value for direction in snake.direction_queue)
+
+    out = bytearray(HEADER.pack(MAGIC, VERSION, sim.mode.value, sim.width, sim.height, sim.seed,
+                                sim.ticks, sim.time, sim.won))
+    out += pack_level(sim.level)
+    out += pack_topology(sim.topology)
+    out += SNAKE.pack(snake.direction.value, snake.length, snake.score, snake.speed,
+                      snake.is_alive, reason_code(snake, False), len(queue))
+    out += queue
+    out += FOOD_FIELDS.pack(cell_index(sim, food.position), food.special, food.special_timer)
+    out += COUNTS.pack(len(body), len(obstacles), len(sim.board.free), rng_version, len(words),
+                       gauss is not None, 0.0 if gauss is None else gauss)
+    write_chunk(out)
+    arrays = [(body, cells), (obstacles, cells), (board.free, cells), (words, "I")]
+    if area > SMALL_AREA:
+        arrays.append((board.slot, "i"))
+    view = memoryview(board.cells)
+    try:
+        write_chunk(view)
+    finally:
+        view.release()
+    for values, typecode in arrays:
+        view = as_little(values, typecode)
+        try:
+            write_chunk(view)
+        finally:
+            view.release()
+
+def to_bytes(sim):
+    out = bytearray()
+    write(sim, out.extend)
+    return bytes(out)
+
+def save(sim, path):
+    with open(path, "wb") as file:
+        write(sim, file.write)
+
+def restore(data, sim=None):
+    # Восстанавливает партию из снимка в sim (если размер поля совпадает)
+    # или в новую Simulation. Возвращает симуляцию.
+    view = memoryview(data)
+    if len(view) < HEADER.size:
+        raise SnapshotError("снимок обрезан")
+    magic, version, mode, width, height, seed, ticks, now, won = HEADER.unpack_from(view, 0)
+    if magic != MAGIC:
+        raise SnapshotError("это не снимок змейки")
+    if version > VERSION:
+        raise SnapshotError(f"неизвестная версия снимка: {version}")
+    if mode not in [m.value for m in GameMode]:
+        raise SnapshotError(f"неизвестный режим: {mode}")
+    try:
+        level, pos = unpack_level(view, HEADER.size)
+        topology = None
+        if version >= 2:
+            topology, pos = unpack_topology(view, pos, width, height)
+    except ReplayError as error:
+        raise SnapshotError(str(error)) from None
+    if len(view) < pos + SNAKE.size:
+        raise SnapshotError("снимок обрезан")
+    direction, length, score, speed, alive, reason, queued = SNAKE.unpack_from(view, pos)
+    pos += SNAKE.size
+    queue = bytes(view[pos:pos + queued])
+    pos += queued
+    if len(view) < pos + FOOD_FIELDS.size + COUNTS.size:
+        raise SnapshotError("снимок обрезан")
+    food_cell, special, special_timer = FOOD_FIELDS.unpack_from(view, pos)
+    pos += FOOD_FIELDS.size
+    body_count, obstacle_count, free_count, rng_version, word_count, has_gauss, gauss = \
+        COUNTS.unpack_from(view, pos)
+    pos += COUNTS.size
+    area = width * height
+    cells = cell_typecode(area)
+    grid = view[pos:pos + area]
+    pos += area
+    body, pos = read_array(view, pos, cells, body_count)
+    obstacles, pos = read_array(view, pos, cells, obstacle_count)
+    free, pos = read_array(view, pos, cells, free_count)
+    words, pos = read_array(view, pos, "I", word_count)
+    slot = None
+    if area > SMALL_AREA:
+        slot, pos = read_array(view, pos, "i", area)
+    if cells != "i":
+        free = array("i", free)
+    if (not body or reason >= len(REASONS) or max(queue, default=0) > 3 or direction > 3
+            or food_cell > area or not in_range(body, area) or not in_range(obstacles, area)
+            or len(grid) < area or grid.tobytes().count(EMPTY) != len(free)):
+        raise SnapshotError("снимок поврежден")
+    slot = check_free(grid, free, slot, area)
+
+    if sim is None or (sim.width, sim.height) != (width, height):
+        sim = Simulation(GameMode(mode), width, height, seed=seed, level=level)
+    board, snake, food = sim.board, sim.snake, sim.food
+    sim.mode = GameMode(mode)
+    sim.level = level
+    sim.topology = topology
+    sim.seed = seed
+    sim.rng.setstate((rng_version, tuple(words), gauss if has_gauss else None))
+    sim.recorder = None
+    sim.ticks = ticks
+    sim.time = now
+    sim.won = bool(won)
+
+    # сетка и свободные клетки - целиком из снимка; от порядка free зависит,
+    # куда встанет еда
+    board.cells[:] = grid
+    board.free = free
+    board.slot = slot
+    # клетки тела в сетке уже заняты, поэтому set_body не трогает free,
+    # но подклассы змейки (отрисовка) обновляют свои данные
+    snake.positions = deque()
+    snake.length = 0
+    snake.set_body([(index % width, index // width) for index in body])
+    snake.length = length
+    snake.direction = Direction(direction)
+    snake.direction_queue = deque(Direction(value) for value in queue)
+    snake.score = score
+    snake.speed = speed
+    snake.is_alive = bool(alive)
+    snake.death_reason = "" if won else REASONS[reason]
+    sim.obstacles = [(index % width, index // width) for index in obstacles]
+    food.position = None if not food_cell else ((food_cell - 1) % width, (food_cell - 1) // width)
+    food.special = bool(special)
+    food.special_timer = special_timer
+    return sim
+
+def load(path, sim=None):
+    with open(path, "rb") as file:
+        return restore(file.read(), sim)
+
+def frame(kind, payload):
+    out = bytearray([kind])
+    write_varint(out, len(payload))
+    out += payload
+    return out
+
+class DeltaEncoder:
+    # Поток партии для зрителей: encode(sim) после каждого тика. Первая
+    # запись и записи после сброса партии или пропуска тиков - ключевые
+    # кадры, остальные - только изменения за тик, обычно 6-10 байт.
+    def __init__(self, keyframe_every=KEYFRAME_EVERY):
+        self.keyframe_every = keyframe_every
+        self.seed = None
+        self.ticks = None
+        self.keyframe_ticks = 0
+
+    def remember(self, sim):
+        snake, food = sim.snake, sim.food
+        self.seed = sim.seed
+        self.ticks = sim.ticks
+        self.time = sim.time
+        self.head = snake.positions[0]
+        self.body = len(snake.positions)
+        self.direction = snake.direction
+        self.food = (food.position, food.special, food.special_timer)
+        self.status = (snake.score, snake.length, snake.speed)
+        self.over = not snake.is_alive or sim.won
+
+    def encode(self, sim):
+        # запись для sim или b"", если с прошлого вызова ничего не изменилось
+        if (self.ticks is None or sim.seed != self.seed or sim.ticks - self.ticks not in (0, 1)
+                or sim.ticks - self.keyframe_ticks >= self.keyframe_every):
+            self.remember(sim)
+            self.keyframe_ticks = sim.ticks
+            return frame(KEYFRAME, to_bytes(sim))
+
+        snake, food = sim.snake, sim.food
+        ops = bytearray()
+        if snake.direction != self.direction:
+            ops.append(OP_DIRECTION)
+            ops.append(snake.direction.value)
+        head = snake.positions[0]
+        added = head != self.head
+        if added:
+            ops.append(OP_HEAD)
+            write_varint(ops, head[1] * sim.width + head[0])
+        removed = self.body + added - len(snake.positions)
+        if removed:
+            ops.append(OP_TAIL)
+            write_varint(ops, removed)
+        state = (food.position, food.special, food.special_timer)
+        if state != self.food:
+            ops.append(OP_FOOD)
+            write_varint(ops, cell_index(sim, food.position))
+            ops.append(food.special)
+            write_varint(ops, food.special_timer)
+        status = (snake.score, snake.length, snake.speed)
+        if status != self.status:
+            ops.append(OP_STATUS)
+            for value in status:
+                write_varint(ops, value)
+        over = not snake.is_alive or sim.won
+        if over and not self.over:
+            ops.append(OP_END)
+            ops.append(reason_code(snake, sim.won))
+        if not ops and sim.ticks == self.ticks:
+            return b""
+
+        payload = bytearray()
+        write_varint(payload, sim.ticks - self.ticks)
+        write_varint(payload, sim.time - self.time)
+        payload += ops
+        self.remember(sim)
+        return frame(DELTA, payload)
+
+class DeltaDecoder:
+    # Принимает поток DeltaEncoder кусками любого размера и ведет по нему
+    # свою копию партии в self.sim (появляется с первым ключевым кадром).
+    # Изменения сетки идут в том же порядке, что и в исходной партии, поэтому
+    # совпадает даже порядок свободных клеток; не ведутся только генератор
+    # и очередь поворотов - их приносит следующий ключевой кадр.
+    def __init__(self, sim=None):
+        self.sim = sim
+        self.pending = bytearray()
+        self.keyframe = False
+
+    def feed(self, data):
+        # возвращает число примененных записей
+        self.pending += data
+        view = memoryview(self.pending)
+        pos = 0
+        applied = 0
+        try:
+            while pos < len(view):
+                kind = view[pos]
+                try:
+                    size, start = read_varint(view, pos + 1)
+                except ReplayError:
+                    break
+                if start + size > len(view):
+                    break
+                try:
+                    self.apply(kind, view[start:start + size])
+                except ReplayError as error:
+                    raise SnapshotError(f"запись потока повреждена: {error}") from None
+                pos = start + size
+                applied += 1
+        finally:
+            view.release()
+        del self.pending[:pos]
+        return applied
+
+    def apply(self, kind, payload):
+        if kind == KEYFRAME:
+            self.sim = restore(payload, self.sim)
+            self.keyframe = True
+            return
+        if kind != DELTA:
+            raise SnapshotError(f"неизвестная запись потока: {kind}")
+        if not self.keyframe:
+            # подключились посреди потока: ждем ключевой кадр
+            return
+        sim = self.sim
+        snake, food, board = sim.snake, sim.food, sim.board
+        width = sim.width
+        ticks, pos = read_varint(payload, 0)
+        elapsed, pos = read_varint(payload, pos)
+        sim.ticks += ticks
+        sim.time += elapsed
+        while pos < len(payload):
+            op = payload[pos]
+            pos += 1
+            if op == OP_HEAD:
+                index, pos = read_varint(payload, pos)
+                snake.positions.appendleft((index % width, index // width))
+                board.set_index(index, BODY)
+            elif op == OP_TAIL:
+                count, pos = read_varint(payload, pos)
+                for _ in range(count):
+                    board.set(snake.positions.pop(), EMPTY)
+            elif op == OP_FOOD:
+                cell, pos = read_varint(payload, pos)
+                special = payload[pos]
+                timer, pos = read_varint(payload, pos + 1)
+                # как Food.randomize_position: старая клетка освобождается, если там еще еда
+                if food.position is not None and board.get(food.position) == FOOD:
+                    board.set(food.position, EMPTY)
+                food.position = None if not cell else ((cell - 1) % width, (cell - 1) // width)
+                if food.position is not None:
+                    board.set_index(cell - 1, FOOD)
+                food.special = bool(special)
+                food.special_timer = timer
+            elif op == OP_STATUS:
+                snake.score, pos = read_varint(payload, pos)
+                snake.length, pos = read_varint(payload, pos)
+                snake.speed, pos = read_varint(payload, pos)
+            elif op == OP_DIRECTION:
+                snake.direction = Direction(payload[pos])
+                snake.direction_queue.clear()
+                pos += 1
+            elif op == OP_END:
+                reason = REASONS[payload[pos]]
+                pos += 1
+                if reason == WIN_MESSAGE:
+                    sim.won = True
+                else:
+                    snake.die(reason)
+            else:
+                raise SnapshotError(f"неизвестная операция в записи тика: {op}")
+
+if __name__ == "__main__":
+    paths = sys.argv[1:]
+    if not paths:
+        print("использование: python snake_snapshot.py файл1 файл2 ...")
+        sys.exit(2)
+    failed = False
+    for path in paths:
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+            sim = restore(data)
+        except (OSError, SnapshotError) as error:
+            print(f"{path}: {error}")
+            failed = True
+            continue
+        # снимок восстановленной партии должен совпасть с файлом байт в байт;
+        # снимок старой версии пишется уже в новой, его проверяет только чтение
+        version = HEADER.unpack_from(data)[1]
+        if version < VERSION:
+            status = f"OK (версия {version})"
+        else:
+            status = "OK" if to_bytes(sim) == data else "НЕ СОВПАДАЕТ"
+        state = "победа" if sim.won else sim.snake.death_reason or "идет"
+        print(f"{path}: {sim.mode.name} {sim.width}x{sim.height}, тик {sim.ticks}, счет {sim.snake.score}, "
+              f"длина {sim.snake.length}, {state}, {len(data)} байт, {status}")
+        failed = failed or not status.startswith("OK")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,161 @@
+import functools
+from array import array
+
+# Топология поля: куда ведет ход из каждой клетки в каждом направлении.
+# Правила перехода (тор в CLASSIC, стены в WALLS и OBSTACLES, порталы,
+# клетки с односторонним входом, поле неправильной формы) собираются один
+# раз в плоскую таблицу next: next[клетка * 4 + направление] - клетка, куда
+# попадет голова, или WALL, если ход смертелен. Ход змейки - один поиск в
+# таблице, сколько бы правил ни было. Таблицу используют snake_core,
+# snake_bot и snake_batch.
+#
+# Клетки - номера y * width + x, направления - Direction.value
+# (0 вверх, 1 вправо, 2 вниз, 3 влево).
+
+WALL = -1
+# (dx, dy) по номеру направления, как DIRECTION_DELTAS в snake_core
+DELTAS = ((0, -1), (1, 0), (0, 1), (-1, 0))
+
+def opposite(direction):
+    return (direction + 2) % 4
+
+class Topology:
+    def __init__(self, width, height, wrap=False):
+        self.width = width
+        self.height = height
+        # переход через край; нужен боту для оценки расстояния
+        self.wrap = wrap
+        # клетки вне поля (1 - клетки нет) или None, если поле прямоугольное
+        self.void = None
+        # порталы: (клетка, направление, куда)
+        self.portals = []
+        area = width * height
+        self.next = array("i", [WALL]) * (area * 4)
+
+        # Таблица строится срезами массивов, без цикла по клеткам: номера
+        # соседей - сдвинутые срезы одного ряда чисел, края правятся срезами
+        # с шагом width.
+        ids = array("i", range(-width, area + width))
+        up = ids[0:area]
+        right = ids[width + 1:width + 1 + area]
+        down = ids[2 * width:2 * width + area]
+        left = ids[width - 1:width - 1 + area]
+        last_row = (height - 1) * width
+        if wrap:
+            up[0:width] = ids[width + last_row:2 * width + last_row]
+            down[last_row:area] = ids[width:2 * width]
+            right[width - 1::width] = ids[width:width + area:width]
+            left[0::width] = ids[2 * width - 1:2 * width - 1 + area:width]
+        else:
+            up[0:width] = array("i", [WALL]) * width
+            down[last_row:area] = array("i", [WALL]) * width
+            right[width - 1::width] = array("i", [WALL]) * height
+            left[0::width] = array("i", [WALL]) * height
+        for direction, targets in enumerate((up, right, down, left)):
+            self.next[direction::4] = targets
+
+    def index(self, position):
+        return position[1] * self.width + position[0]
+
+    def neighbors(self, index):
+        # клетки по направлениям 0..3, WALL - хода нет
+        return self.next[index * 4:index * 4 + 4]
+
+    def sources(self, index):
+        # откуда можно попасть в клетку: (клетка, направление); кроме обычных
+        # соседей проверяются порталы
+        found = []
+        for direction in range(4):
+            nearby = self.next[index * 4 + opposite(direction)]
+            if nearby != WALL and self.next[nearby * 4 + direction] == index:
+                found.append((nearby, direction))
+        for cell, direction, target in self.portals:
+            if target == index and (cell, direction) not in found:
+                found.append((cell, direction))
+        return found
+
+    def remove(self, positions):
+        # клетки positions убираются с поля: ход в них - смерть о стену
+        if self.void is None:
+            self.void = bytearray(self.width * self.height)
+        for position in positions:
+            index = self.index(position)
+            if self.void[index]:
+                continue
+            for cell, direction in self.sources(index):
+                self.next[cell * 4 + direction] = WALL
+            self.void[index] = 1
+            self.next[index * 4:index * 4 + 4] = array("i", [WALL]) * 4
+        return self
+
+    def shape(self, mask):
+        # оставляет только клетки, где mask != 0 (байт на клетку)
+        return self.remove([(index % self.width, index // self.width)
+                            for index, value in enumerate(mask) if not value])
+
+    def connect(self, position, direction, target, both_ways=True):
+        # Портал: ход из position в направлении direction приводит в target.
+        # both_ways - и обратно: ход из target в противоположную сторону
+        # приводит в position.
+        cell, to = self.index(position), self.index(target)
+        self.next[cell * 4 + direction] = to
+        self.portals.append((cell, direction, to))
+        if both_ways:
+            self.next[to * 4 + opposite(direction)] = cell
+            self.portals.append((to, opposite(direction), cell))
+        return self
+
+    def one_way(self, position, direction):
+        # в клетку можно войти только ходом в направлении direction
+        index = self.index(position)
+        for cell, entered in self.sources(index):
+            if entered != direction:
+                self.next[cell * 4 + entered] = WALL
+        return self
+
+    def jumps(self):
+        # переходы не к соседней клетке, которые есть в таблице: через край
+        # тора и порталы; (клетка, куда)
+        width, area = self.width, self.width * self.height
+        candidates = [(cell, direction) for cell, direction, target in self.portals]
+        if self.wrap:
+            last_row = area - width
+            for row in range(0, area, width):
+                candidates += [(row, 3), (row + width - 1, 1)]
+            for x in range(width):
+                candidates += [(x, 0), (last_row + x, 2)]
+        moves = self.next
+        return [(cell, moves[cell * 4 + direction]) for cell, direction in candidates
+                if moves[cell * 4 + direction] != WALL]
+
+    def changes(self):
+        # Чем топология отличается от обычной того же размера и wrap:
+        # (клетки вне поля, [(номер в next, куда)]). По ним from_changes
+        # собирает такую же таблицу - так топология попадает в записи и снимки.
+        base = standard(self.width, self.height, self.wrap).next
+        void = [] if self.void is None else [index for index, value in enumerate(self.void) if value]
+        edits = [(slot, value) for slot, (value, old) in enumerate(zip(self.next, base)) if value != old]
+        return void, edits
+
+    @classmethod
+    def from_changes(cls, width, height, wrap, void, edits):
+        topology = cls(width, height, wrap)
+        if void:
+            topology.void = bytearray(width * height)
+            for index in void:
+                topology.void[index] = 1
+        for slot, value in edits:
+            topology.next[slot] = value
+            # ход не в стену, которого нет в обычной таблице, - портал
+            if value != WALL:
+                topology.portals.append((slot // 4, slot % 4, value))
+        return topology
+
+    def is_open(self, position):
+        return self.void is None or not self.void[self.index(position)]
+
+@functools.lru_cache(maxsize=8)
+def standard(width, height, wrap):
+    # общие таблицы обычных режимов: тор (CLASSIC) и коробка (WALLS, OBSTACLES).
+    # Их нельзя менять - для своих правил создается новая Topology
+    return Topology(width, height, wrap)
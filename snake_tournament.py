@@ -0,0 +1,252 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+from collections import Counter
+
+import snake_core
+from snake_bot import BUDGET_US, Autopilot
+from snake_core import GRID_WIDTH, GRID_HEIGHT, WIN_MESSAGE, GameMode, Simulation
+from snake_replay import Replay
+
+# Массовый прогон партий без окна на всех ядрах: для проверки баланса
+# (SPEED_INCREMENT, шанс особой еды, число препятствий) на сотнях тысяч партий.
+#
+# Партия задается контроллером, режимом и seed. Контроллеры:
+#   bot    - автопилот snake_bot, по партии на каждый seed и режим;
+#   replay - повороты из записей snake_replay (режим и seed берутся из записи).
+# Задания нарезаются пачками по chunk партий; пачки раздаются пулу процессов,
+# итоги возвращаются по мере готовности и сразу складываются в статистику.
+# Процесс держит одну симуляцию и один автопилот на все свои партии.
+#
+#     python snake_tournament.py --games 10000 --modes classic walls --special-chance 0.3
+#     python snake_tournament.py --controllers replay --replays *.snkr --json итоги.json
+
+CONTROLLERS = ("bot", "replay")
+CHUNK_SIZE = 16
+# процентили для распределений счета и длины партии
+PERCENTILES = (50, 90, 99)
+# причина для партий, которые уперлись в лимит тиков или в конец записи
+NO_RESULT = "лимит тиков"
+
+# константы snake_core, которые можно поменять для прогона: имя опции -> имя константы
+BALANCE = {
+    "speed_increment": "SPEED_INCREMENT",
+    "special_chance": "SPECIAL_FOOD_CHANCE",
+    "obstacles": "OBSTACLE_COUNT",
+}
+
+# состояние процесса пула, заполняется в init_worker
+worker = {}
+
+def init_worker(balance, width, height, budget_us, max_ticks):
+    # константы меняются в каждом процессе пула, родитель их не трогает
+    for name, value in balance.items():
+        setattr(snake_core, name, value)
+    sim = Simulation(GameMode.CLASSIC, width, height, seed=0)
+    worker.update(sim=sim, bot=Autopilot(sim, budget_us), max_ticks=max_ticks)
+
+def play_bot(mode, seed):
+    sim, bot = worker["sim"], worker["bot"]
+    # проигранная в этом процессе запись могла оставить свой уровень и топологию
+    sim.level = sim.topology = None
+    sim.reset(mode, seed)
+    bot.reset_stats()
+    max_ticks = worker["max_ticks"]
+    while sim.snake.is_alive and not sim.won and sim.ticks < max_ticks:
+        sim.step(bot.decide())
+    return sim
+
+def play_replay(path):
+    replay = Replay.load(path)
+    sim = worker["sim"]
+    if (sim.width, sim.height) != (replay.width, replay.height):
+        sim = None
+    return replay.mode, replay.seed, replay.play(sim)
+
+def run_chunk(tasks):
+    # задания - (контроллер, режим, seed) или ("replay", путь, None);
+    # итог - (pid, секунды, тики, [(контроллер, режим, seed, счет, длина, тики, причина)])
+    started = time.perf_counter()
+    results = []
+    ticks = 0
+    for controller, target, seed in tasks:
+        if controller == "bot":
+            mode = target
+            sim = play_bot(mode, seed)
+        else:
+            mode, seed, sim = play_replay(target)
+        if sim.won:
+            reason = WIN_MESSAGE
+        else:
+            reason = sim.snake.death_reason or NO_RESULT
+        ticks += sim.ticks
+        results.append((controller, mode.value, seed, sim.snake.score, sim.snake.length, sim.ticks, reason))
+    return os.getpid(), time.perf_counter() - started, ticks, results
+
+def make_tasks(controllers, modes, games, first_seed, replays):
+    tasks = []
+    if "bot" in controllers:
+        for mode in modes:
+            tasks.extend(("bot", mode, first_seed + game) for game in range(games))
+    if "replay" in controllers:
+        tasks.extend(("replay", path, None) for path in replays)
+    return tasks
+
+def chunks(tasks, size):
+    for start in range(0, len(tasks), size):
+        yield tasks[start:start + size]
+
+def percentile(counter, q):
+    # процентиль по гистограмме значение -> число партий
+    total = sum(counter.values())
+    rank = max(1, -(-total * q // 100))
+    seen = 0
+    for value in sorted(counter):
+        seen += counter[value]
+        if seen >= rank:
+            return value
+    return 0
+
+def summary(counter):
+    total = sum(counter.values())
+    if not total:
+        return {}
+    result = {"mean": sum(value * count for value, count in counter.items()) / total,
+              "min": min(counter), "max": max(counter)}
+    for q in PERCENTILES:
+        result[f"p{q}"] = percentile(counter, q)
+    return result
+
+class Tournament:
+    # складывает итоги пачек: распределения по (контроллер, режим) и скорость процессов
+    def __init__(self):
+        self.groups = {}
+        self.workers = {}
+        self.games = 0
+
+    def group(self, controller, mode):
+        key = (controller, mode)
+        if key not in self.groups:
+            self.groups[key] = {"games": 0, "scores": Counter(), "lengths": Counter(),
+                                "ticks": Counter(), "reasons": Counter()}
+        return self.groups[key]
+
+    def add(self, pid, seconds, ticks, results):
+        stats = self.workers.setdefault(pid, {"games": 0, "ticks": 0, "seconds": 0.0})
+        stats["games"] += len(results)
+        stats["ticks"] += ticks
+        stats["seconds"] += seconds
+        for controller, mode, seed, score, length, game_ticks, reason in results:
+            group = self.group(controller, GameMode(mode))
+            group["games"] += 1
+            group["scores"][score] += 1
+            group["lengths"][length] += 1
+            group["ticks"][game_ticks] += 1
+            group["reasons"][reason] += 1
+        self.games += len(results)
+
+    def to_json(self):
+        groups = []
+        for (controller, mode), group in self.groups.items():
+            groups.append({
+                "controller": controller,
+                "mode": mode.name.lower(),
+                "games": group["games"],
+                "score": summary(group["scores"]),
+                "length": summary(group["lengths"]),
+                "ticks": summary(group["ticks"]),
+                "death_reasons": dict(group["reasons"].most_common()),
+                # полная гистограмма счета: счет -> число партий
+                "score_histogram": {str(score): count for score, count in sorted(group["scores"].items())},
+            })
+        workers = [{"pid": pid, "games": stats["games"], "ticks": stats["ticks"],
+                    "ticks_per_sec": stats["ticks"] / stats["seconds"] if stats["seconds"] else 0.0}
+                   for pid, stats in sorted(self.workers.items())]
+        return {"games": self.games, "groups": groups, "workers": workers}
+
+    def report(self):
+        for (controller, mode), group in sorted(self.groups.items(), key=lambda item: (item[0][0], item[0][1].value)):
+            score, length, ticks = summary(group["scores"]), summary(group["lengths"]), summary(group["ticks"])
+            print(f"{controller} {mode.name}: партий {group['games']}")
+            print(f"  счет:  средний {score['mean']:.0f}, p50 {score['p50']}, p90 {score['p90']}, "
+                  f"p99 {score['p99']}, максимум {score['max']}")
+            print(f"  длина: средняя {length['mean']:.0f}, p99 {length['p99']}, максимум {length['max']}")
+            print(f"  тиков: в среднем {ticks['mean']:.0f}, p99 {ticks['p99']}")
+            for reason, count in group["reasons"].most_common():
+                print(f"    {reason}: {count} ({count / group['games'] * 100:.1f}%)")
+        print("процессы:")
+        for pid, stats in sorted(self.workers.items()):
+            rate = stats["ticks"] / stats["seconds"] if stats["seconds"] else 0.0
+            print(f"  {pid}: партий {stats['games']}, тиков {stats['ticks']}, {rate:.0f} тиков/с")
+
+def run(tasks, workers=None, chunk=CHUNK_SIZE, balance=None, width=GRID_WIDTH, height=GRID_HEIGHT,
+        budget_us=BUDGET_US, max_ticks=None, progress=None):
+    # прогоняет задания в пуле процессов; progress(tournament) вызывается после каждой пачки
+    if max_ticks is None:
+        max_ticks = width * height * 50
+    tournament = Tournament()
+    initargs = (balance or {}, width, height, budget_us, max_ticks)
+    with multiprocessing.Pool(workers, initializer=init_worker, initargs=initargs) as pool:
+        # пачки приходят в порядке готовности, а не в порядке заданий
+        for pid, seconds, ticks, results in pool.imap_unordered(run_chunk, chunks(tasks, chunk)):
+            tournament.add(pid, seconds, ticks, results)
+            if progress is not None:
+                progress(tournament)
+    return tournament
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Массовый прогон партий без окна на всех ядрах")
+    parser.add_argument("--games", type=int, default=1000, help="партий на режим для бота")
+    parser.add_argument("--modes", nargs="+", choices=[mode.name.lower() for mode in GameMode],
+                        default=[mode.name.lower() for mode in GameMode])
+    parser.add_argument("--controllers", nargs="+", choices=CONTROLLERS, default=["bot"])
+    parser.add_argument("--replays", nargs="*", default=[], help="записи для контроллера replay")
+    parser.add_argument("--seed", type=int, default=0, help="seed первой партии, дальше по порядку")
+    parser.add_argument("--width", type=int, default=GRID_WIDTH)
+    parser.add_argument("--height", type=int, default=GRID_HEIGHT)
+    parser.add_argument("--workers", type=int, help="число процессов, по умолчанию по числу ядер")
+    parser.add_argument("--chunk", type=int, default=CHUNK_SIZE, help="партий в одной пачке")
+    parser.add_argument("--budget", type=int, default=BUDGET_US,
+                        help="бюджет автопилота на тик, мкс; 0 - без ограничения, партии повторяются по seed")
+    parser.add_argument("--max-ticks", type=int, help="лимит тиков на партию")
+    parser.add_argument("--speed-increment", type=int, help="вместо SPEED_INCREMENT")
+    parser.add_argument("--special-chance", type=float, help="вместо SPECIAL_FOOD_CHANCE")
+    parser.add_argument("--obstacles", type=int, help="вместо OBSTACLE_COUNT")
+    parser.add_argument("--json", help="куда записать итоги в JSON")
+    args = parser.parse_args()
+
+    balance = {BALANCE[option]: getattr(args, option) for option in BALANCE
+               if getattr(args, option) is not None}
+    modes = [GameMode[name.upper()] for name in args.modes]
+    tasks = make_tasks(args.controllers, modes, args.games, args.seed, args.replays)
+    if not tasks:
+        parser.error("нет партий: для контроллера replay нужны файлы в --replays")
+
+    started = time.perf_counter()
+
+    def progress(tournament):
+        print(f"\rпартий {tournament.games} из {len(tasks)}", end="", file=sys.stderr, flush=True)
+
+    tournament = run(tasks, args.workers, args.chunk, balance, args.width, args.height,
+                     args.budget, args.max_ticks, progress)
+    elapsed = time.perf_counter() - started
+    print(file=sys.stderr)
+    print(f"партий {tournament.games} за {elapsed:.1f} с, процессов {len(tournament.workers)}, "
+          f"баланс: {balance or 'без изменений'}")
+    tournament.report()
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "seconds": elapsed,
+                "balance": balance,
+                "width": args.width,
+                "height": args.height,
+                **tournament.to_json(),
+            }, file, indent=2, ensure_ascii=False)
@@ -0,0 +1,92 @@
+import pytest
+
+from snake_arena import DEATH_HEAD, DEATH_SNAKE, Arena
+from snake_core import BODY, DEATH_TAIL, EMPTY, FOOD, FOOD_SCORE, Direction, GameMode
+
+# Правила столкновений арены: все змейки ходят одновременно, клетки
+# проверяются по полю до ходов, поэтому порядок змеек в списке не важен.
+
+def make_arena(*snakes, food=None):
+    # snakes - (тело, направление); тела ставятся вручную вместо случайных
+    arena = Arena(GameMode.WALLS, 20, 20, seed=1, respawn=False)
+    players = [arena.add_snake() for _ in snakes]
+    # еда уходит в верхний ряд, первая - в клетку food
+    for food_item in arena.foods:
+        arena.board.set(food_item.position, EMPTY)
+        food_item.position = None
+    arena.food_at.clear()
+    for player, (body, direction) in zip(players, snakes):
+        player.snake.set_body(body)
+        player.snake.length = len(body)
+        player.snake.direction = direction
+        for x, y in body:
+            arena.owner[y * arena.width + x] = player.id
+    for i, food_item in enumerate(arena.foods):
+        position = food if i == 0 and food is not None else (i, 0)
+        food_item.position = position
+        arena.board.set(position, FOOD)
+        arena.food_at[arena.index(position)] = food_item
+    return arena, [player.snake for player in players]
+
+def food_cells(arena):
+    return sum(cell == FOOD for cell in arena.board.cells)
+
+@pytest.mark.parametrize("reverse", [False, True])
+def test_head_to_head_same_cell_kills_both(reverse):
+    arena, (first, second) = make_arena(([(5, 5), (4, 5), (3, 5)], Direction.RIGHT),
+                                        ([(7, 5), (8, 5), (9, 5)], Direction.LEFT))
+    if reverse:
+        arena.players.reverse()
+    arena.resolve()
+    assert first.death_reason == second.death_reason == DEATH_HEAD
+    assert not first.is_alive and not second.is_alive
+    # тела убраны с поля
+    assert arena.board.cells.count(BODY) == 0
+
+def test_head_swap_kills_both():
+    arena, (first, second) = make_arena(([(5, 5), (4, 5), (3, 5)], Direction.RIGHT),
+                                        ([(6, 5), (7, 5), (8, 5)], Direction.LEFT))
+    arena.resolve()
+    assert first.death_reason == second.death_reason == DEATH_SNAKE
+
+@pytest.mark.parametrize("growing", [False, True])
+def test_tail_is_in_place_during_the_tick(growing):
+    # хвост второй змейки уходит (или остается, если она растет), но первая
+    # погибает в обоих случаях: как в Snake.move, хвост проверяется до ходов
+    arena, (first, second) = make_arena(([(5, 5), (4, 5), (3, 5)], Direction.RIGHT),
+                                        ([(6, 3), (6, 4), (6, 5)], Direction.UP))
+    if growing:
+        second.length += 1
+    arena.resolve()
+    assert not first.is_alive and first.death_reason == DEATH_SNAKE
+    assert second.is_alive
+    expected = [(6, 2), (6, 3), (6, 4), (6, 5)] if growing else [(6, 2), (6, 3), (6, 4)]
+    assert list(second.positions) == expected
+
+def test_own_leaving_tail_kills():
+    arena, (snake,) = make_arena(([(5, 5), (5, 6), (6, 6), (6, 5)], Direction.RIGHT))
+    arena.resolve()
+    assert not snake.is_alive and snake.death_reason == DEATH_TAIL
+
+def test_food_goes_to_single_claimant():
+    arena, (first, second) = make_arena(([(5, 5), (4, 5), (3, 5)], Direction.RIGHT),
+                                        ([(10, 10), (10, 11), (10, 12)], Direction.UP), food=(6, 5))
+    food = arena.food_at[arena.index((6, 5))]
+    arena.resolve()
+    assert first.is_alive and second.is_alive
+    assert (first.score, first.length) == (FOOD_SCORE, 4)
+    assert (second.score, second.length) == (0, 3)
+    # съеденная еда переехала в свободную клетку, учет еды не разошелся
+    assert food.position not in (None, (6, 5))
+    assert arena.food_at[arena.index(food.position)] is food
+    assert food_cells(arena) == len(arena.food_at) == len(arena.foods)
+
+def test_contested_food_is_not_eaten():
+    arena, (first, second) = make_arena(([(6, 5), (5, 5), (4, 5)], Direction.DOWN),
+                                        ([(6, 7), (6, 8), (6, 9)], Direction.UP), food=(6, 6))
+    arena.resolve()
+    # обе головы пришли в клетку еды - обе погибли, еда никому
+    assert first.death_reason == second.death_reason == DEATH_HEAD
+    assert first.score == second.score == 0
+    assert arena.food_at[arena.index((6, 6))].position == (6, 6)
+    assert food_cells(arena) == len(arena.foods)
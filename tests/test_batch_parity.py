@@ -0,0 +1,70 @@
+import random
+
+import numpy as np
+import pytest
+
+import snake_levels
+from snake_batch import NO_ACTION, BatchSimulation
+from snake_bot import Autopilot
+from snake_core import BODY, WIN_MESSAGE, Direction, GameMode, Simulation
+
+# BatchSimulation и Simulation на одних и тех же ходах и еде должны играть одну
+# и ту же партию. Еда в них случайна по-разному, поэтому после каждого тика еда
+# из Simulation переносится в пакет; препятствия - один раз после сброса.
+
+def copy_level(batch, sim):
+    batch.obstacles[0] = False
+    for x, y in sim.obstacles:
+        batch.obstacles[0, y, x] = True
+
+def copy_food(batch, sim):
+    food = sim.food
+    if food.position is None:
+        return
+    batch.food_x[0], batch.food_y[0] = food.position
+    batch.food_special[0] = food.special
+    batch.food_timer[0] = food.special_timer
+
+def sim_reason(sim):
+    if sim.won:
+        return WIN_MESSAGE
+    return sim.snake.death_reason or ""
+
+@pytest.mark.parametrize("mode", list(GameMode))
+@pytest.mark.parametrize("seed", range(5))
+def test_batch_matches_simulation(mode, seed):
+    width, height = 12, 10
+    sim = Simulation(mode, width, height, seed=seed)
+    batch = BatchSimulation(1, mode, width, height, seed=seed)
+    copy_level(batch, sim)
+    copy_food(batch, sim)
+    bot = Autopilot(sim, None)
+    rng = random.Random(seed)
+    for _ in range(2000):
+        if not sim.snake.is_alive or sim.won:
+            break
+        # ходы автопилота, чтобы партия шла долго, и изредка случайный
+        # поворот, в том числе разворот назад и прямо в стену
+        action = rng.choice(list(Direction)) if rng.random() < 0.02 else bot.decide()
+        sim.step(action)
+        batch.step(np.array([NO_ACTION if action is None else action.value]))
+        copy_food(batch, sim)
+
+        assert (int(batch.head_x[0]), int(batch.head_y[0])) == sim.snake.get_head_position()
+        assert batch.length[0] == sim.snake.length
+        assert batch.score[0] == sim.snake.score
+        assert batch.alive[0] == (sim.snake.is_alive and not sim.won)
+        assert batch.death_reasons()[0] == sim_reason(sim)
+        if sim.snake.is_alive:
+            cells = np.frombuffer(sim.board.cells, dtype=np.uint8).reshape(height, width)
+            assert np.array_equal(batch.occupancy()[0], cells == BODY)
+
+def test_batch_obstacles_leave_no_pockets():
+    # как в Simulation: все свободные клетки достижимы от головы
+    width, height = 12, 10
+    batch = BatchSimulation(200, GameMode.OBSTACLES, width, height, seed=3)
+    for board in range(batch.count):
+        walls = (batch.obstacles[board] | batch.void).astype(np.uint8).tobytes()
+        start = (int(batch.head_x[board]), int(batch.head_y[board]))
+        assert snake_levels.seal_pockets(walls, width, height, start) == walls
+        assert not batch.obstacles[board, batch.food_y[board], batch.food_x[board]]
@@ -0,0 +1,81 @@
+import random
+
+import pytest
+
+from snake_core import (
+    BODY, EMPTY, FOOD, OBSTACLE,
+    Board, Direction, Food, GameMode, Simulation,
+)
+
+# Индекс свободных клеток Board (free и обратная карта slot) после любых
+# записей совпадает с сеткой; на заполненном поле еде некуда встать, и
+# партия, заполнившая поле, заканчивается победой.
+
+def check_index(board):
+    empty = [index for index, cell in enumerate(board.cells) if cell == EMPTY]
+    assert sorted(board.free) == empty
+    assert board.free_count() == len(empty)
+    for place, index in enumerate(board.free):
+        assert board.slot[index] == place
+    for index, cell in enumerate(board.cells):
+        if cell != EMPTY:
+            assert board.slot[index] == -1
+
+def test_free_index_follows_set_and_clear():
+    board = Board(7, 5)
+    rng = random.Random(2)
+    check_index(board)
+    for _ in range(500):
+        pos = (rng.randrange(7), rng.randrange(5))
+        board.set(pos, rng.choice([EMPTY, EMPTY, BODY, FOOD, OBSTACLE]))
+        check_index(board)
+    mask = bytes(rng.random() < 0.3 for _ in range(35))
+    changed = board.fill_mask(mask, OBSTACLE)
+    assert all(mask[index] for index in changed)
+    check_index(board)
+    board.clear()
+    assert board.free_count() == 35
+    check_index(board)
+
+def test_random_free_picks_only_free_cells():
+    board = Board(4, 4)
+    for index in range(15):
+        board.set_index(index, BODY)
+    rng = random.Random(0)
+    assert {board.random_free(rng) for _ in range(20)} == {(3, 3)}
+    board.set_index(15, OBSTACLE)
+    assert board.random_free(rng) is None
+
+def test_food_on_full_board():
+    board = Board(3, 3)
+    food = Food(3, 3, board, random.Random(1))
+    for index in range(9):
+        if board.cells[index] == EMPTY:
+            board.set_index(index, BODY)
+    # еда стоит на своей клетке, свободных больше нет
+    assert board.free_count() == 0
+    board.set(food.position, BODY)
+    assert food.randomize_position() is False
+    assert food.position is None and not food.special
+    board.set((1, 1), EMPTY)
+    assert food.randomize_position() is True
+    assert food.position == (1, 1) and board.get((1, 1)) == FOOD
+
+# обход поля 2x5 по кругу: вверх по правому столбцу, вниз по левому
+CYCLE = [(1, y) for y in range(4, -1, -1)] + [(0, y) for y in range(5)]
+
+@pytest.mark.parametrize("seed", range(5))
+def test_filling_the_board_wins(seed):
+    sim = Simulation(GameMode.WALLS, 2, 5, seed=seed)
+    following = {cell: CYCLE[(i + 1) % len(CYCLE)] for i, cell in enumerate(CYCLE)}
+    for _ in range(1000):
+        if not sim.snake.is_alive or sim.won:
+            break
+        (x, y), (nx, ny) = sim.snake.get_head_position(), following[sim.snake.get_head_position()]
+        sim.step(Direction.UP if ny < y else Direction.DOWN if ny > y else
+                 Direction.LEFT if nx < x else Direction.RIGHT)
+    assert sim.won and sim.snake.is_alive
+    assert sim.board.free_count() == 0 and sim.food.position is None
+    assert len(sim.snake.positions) == 10
+    assert sim.step().won
+    check_index(sim.board)
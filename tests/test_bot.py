@@ -0,0 +1,79 @@
+import pytest
+
+import snake_bot
+from snake_bot import Autopilot
+from snake_core import EMPTY, FOOD, Direction, GameMode, Simulation
+
+# Автопилот: не идет к еде, после которой хвост недостижим; бюджет 0 - то
+# же, что без бюджета; когда время вышло, ход выбирается проверкой на один
+# ход вперед и всё равно не ведет в тело.
+
+# Поле 8x6 со стенами. Еда в тупике (0, 0)..(0, 3) шириной в клетку: справа
+# от него шея змейки, которая освободится позже, чем голова дойдет до еды.
+# Кратчайший путь - вверх, а после еды голове некуда идти.
+TRAP_BODY = [(0, 4), (1, 4), (1, 3), (1, 2), (1, 1), (1, 0),
+             (2, 0), (2, 1), (2, 2), (2, 3), (2, 4), (2, 5)]
+
+def trap_game():
+    sim = Simulation(GameMode.WALLS, 8, 6, seed=1)
+    sim.board.set(sim.food.position, EMPTY)
+    sim.snake.set_body(TRAP_BODY)
+    sim.snake.length = len(TRAP_BODY)
+    sim.snake.direction = Direction.LEFT
+    sim.food.position = (0, 0)
+    sim.board.set((0, 0), FOOD)
+    return sim
+
+def test_food_in_dead_end_is_not_taken():
+    sim = trap_game()
+    bot = Autopilot(sim, None)
+    assert bot.decide() == Direction.DOWN
+    # путь к еде найден, но проверка хвоста его отвергла
+    path = bot.path(3 * sim.width)
+    assert path is not None and path[-1] == 0
+    assert bot.tail_wait(path, snake_bot.UNKNOWN) > 0
+    for _ in range(300):
+        sim.step(bot.decide())
+        assert sim.snake.is_alive
+    # еду из тупика змейка забрала позже, когда шея ушла
+    assert sim.snake.score > 0
+
+def play(budget_us, ticks=400):
+    sim = Simulation(GameMode.WALLS, 20, 15, seed=4)
+    bot = Autopilot(sim, budget_us)
+    for _ in range(ticks):
+        if not sim.snake.is_alive or sim.won:
+            break
+        sim.step(bot.decide())
+    return sim, bot
+
+def test_zero_budget_means_unlimited():
+    assert Autopilot(Simulation(GameMode.WALLS, 20, 15, seed=4), 0).budget_us is None
+    limited, zero_bot = play(0)
+    unlimited, _ = play(None)
+    assert list(limited.snake.positions) == list(unlimited.snake.positions)
+    assert limited.snake.score == unlimited.snake.score > 0
+    assert zero_bot.overruns == 0
+
+@pytest.fixture
+def slow_clock(monkeypatch):
+    # каждый взгляд на часы - плюс 1 мс: любой бюджет кончается сразу
+    now = [0]
+    def perf_counter_ns():
+        now[0] += 1000000
+        return now[0]
+    monkeypatch.setattr(snake_bot.time, "perf_counter_ns", perf_counter_ns)
+
+def test_timed_out_decisions_stay_legal(slow_clock):
+    sim = Simulation(GameMode.WALLS, 20, 15, seed=4)
+    bot = Autopilot(sim, 1)
+    width = sim.width
+    for _ in range(200):
+        if not sim.snake.is_alive:
+            break
+        direction = bot.decide()
+        x, y = sim.snake.get_head_position()
+        cell = bot.neighbors(y * width + x)[direction.value]
+        assert cell != snake_bot.NO_CELL and not bot.blocked(cell)
+        sim.step(direction)
+    assert bot.overruns == bot.decisions > 0
@@ -0,0 +1,53 @@
+import os
+import random
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+import pytest
+
+import snake_bot
+import snake_game
+from snake_core import GameMode
+from snake_levels import LevelSpec
+from snake_scores import ScoreStore
+
+# Кадр частичной перерисовки должен совпадать с полной отрисовкой того же
+# состояния пиксель в пиксель. Время заморожено, после сравнения на экран
+# возвращается кадр частичной перерисовки, чтобы ошибки копились, как в игре.
+
+@pytest.fixture
+def frozen_time(monkeypatch):
+    now = [0]
+    monkeypatch.setattr(pygame.time, "get_ticks", lambda: now[0])
+    return now
+
+@pytest.mark.parametrize("mode", list(GameMode))
+def test_dirty_frames_match_full_redraw(mode, frozen_time):
+    random.seed(3)
+    # много препятствий, чтобы часть попала в крайние клетки под рамку
+    level = LevelSpec("scatter", count=150, seed=1)
+    game = snake_game.Game(dirty_rects=True, level=level, scores=ScoreStore(":memory:", legacy_path=None))
+    game.mode = mode
+    game.start_new_game()
+    game.transition_alpha = 0
+    game.autopilot = snake_bot.Autopilot(game.sim, None)
+    game.autopilot_on = True
+    dirty_frames = 0
+    for _ in range(300):
+        frozen_time[0] += 16
+        game.update(16)
+        dirty = game.can_draw_dirty()
+        game.draw()
+        if not game.snake.is_alive:
+            break
+        if not dirty:
+            continue
+        dirty_frames += 1
+        frame = snake_game.screen.copy()
+        game.draw_game()
+        assert pygame.image.tobytes(frame, "RGB") == pygame.image.tobytes(snake_game.screen, "RGB"), \
+            f"тик {game.sim.ticks}: частичная перерисовка расходится с полной"
+        snake_game.screen.blit(frame, (0, 0))
+    assert dirty_frames > 100
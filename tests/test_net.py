@@ -0,0 +1,89 @@
+import asyncio
+import random
+
+import pytest
+
+import snake_net
+from snake_arena import DEATH_HEAD, DEATH_SNAKE
+from snake_core import Direction, GameMode
+
+# Сервер на свободном порту localhost: отказ во входе, тики клиентам и
+# закрытие без висящих задач. Ходы комнаты не зависят от порядка входа.
+
+def place(room, player, body, direction):
+    snake = player.snake
+    snake.set_body(body)
+    snake.length = len(body)
+    snake.direction = direction
+    for x, y in body:
+        room.owner[y * room.width + x] = player.id
+
+def two_snakes(first_body, first_direction, second_body, second_direction, reverse):
+    room = snake_net.Room("r", GameMode.WALLS, 20, 20, seed=1)
+    first = room.add_player(1, None)
+    second = room.add_player(2, None)
+    place(room, first, first_body, first_direction)
+    place(room, second, second_body, second_direction)
+    if reverse:
+        room.players = dict(reversed(list(room.players.items())))
+    room.step()
+    return first.snake, second.snake
+
+@pytest.mark.parametrize("reverse", [False, True])
+def test_room_head_to_head_kills_both(reverse):
+    first, second = two_snakes([(5, 5), (4, 5), (3, 5)], Direction.RIGHT,
+                               [(7, 5), (8, 5), (9, 5)], Direction.LEFT, reverse)
+    assert (first.is_alive, second.is_alive) == (False, False)
+    assert first.death_reason == second.death_reason == DEATH_HEAD
+    assert not first.positions and not second.positions
+
+@pytest.mark.parametrize("reverse", [False, True])
+def test_room_tail_checked_before_moves(reverse):
+    # хвост второй змейки уходит в этот же тик, но проверка идет по полю до ходов
+    first, second = two_snakes([(5, 5), (4, 5), (3, 5)], Direction.RIGHT,
+                               [(6, 3), (6, 4), (6, 5)], Direction.UP, reverse)
+    assert not first.is_alive and first.death_reason == DEATH_SNAKE
+    assert second.is_alive and second.positions[0] == (6, 2)
+
+async def join_reply(port, message):
+    reader, writer = await asyncio.open_connection("localhost", port)
+    writer.write(message)
+    data = await asyncio.wait_for(reader.read(), 5)
+    writer.close()
+    return [snake_net.decode_message(kind, payload) for kind, payload in snake_net.FrameReader().feed(data)]
+
+async def serve_clients(clients, seconds):
+    server = snake_net.Server(GameMode.CLASSIC, 20, 20, tick_ms=20)
+    port = await server.start("localhost", 0)
+    refused = []
+    for message in (snake_net.encode_join("мала", width=4, height=4),
+                    snake_net.encode_join("быстра", tick_ms=1),
+                    snake_net.frame(snake_net.JOIN, snake_net.JOIN_FIELDS.pack(9, 0, 0, 0) + b"x")):
+        refused.append(await join_reply(port, message))
+    stats = {"ticks": 0, "clients": 0}
+    await asyncio.gather(*(snake_net.simulated_client("localhost", port, "r", seconds, random.Random(i), stats)
+                           for i in range(clients)))
+    for _ in range(200):
+        if not server.rooms:
+            break
+        await asyncio.sleep(0.01)
+    rooms = dict(server.rooms)
+    await server.stop()
+    with pytest.raises(OSError):
+        await asyncio.open_connection("localhost", port)
+    pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    return server, refused, stats, rooms, pending
+
+def test_server_join_errors_ticks_and_shutdown():
+    server, refused, stats, rooms, pending = asyncio.run(serve_clients(3, 0.5))
+    # на каждый плохой JOIN - один ERROR с причиной, потом соединение закрыто
+    for messages in refused:
+        assert len(messages) == 1 and isinstance(messages[0], snake_net.Refused)
+        assert messages[0].reason
+    assert "4x4" in refused[0][0].reason and "1 мс" in refused[1][0].reason
+    assert "неизвестный режим" in refused[2][0].reason
+    # отклоненные комнаты не создаются, ушедшие клиенты закрывают свою
+    assert rooms == {} and pending == []
+    assert stats["clients"] == 3
+    assert server.closed_lags.count >= 10
+    assert stats["ticks"] >= 3 * 10
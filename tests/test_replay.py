@@ -0,0 +1,66 @@
+import random
+
+import pytest
+
+from snake_bot import Autopilot
+from snake_core import Direction, GameMode, Simulation
+from snake_levels import LevelSpec
+from snake_replay import HEADER, MAGIC, REASONS, Replay, pack_level, write_varint
+
+# Записи партий: партия с seed и уровнем после to_bytes/from_bytes
+# проигрывается в тот же итог, старые версии файла (без уровня, без
+# топологии) по-прежнему читаются.
+
+LEVELS = [None, LevelSpec("scatter", count=40, seed=3), LevelSpec("maze", corridor=3, loops=5)]
+
+def record_game(mode, level, seed=7, ticks=1500):
+    sim = Simulation(mode, 40, 30, seed=seed, level=level)
+    replay = Replay.record(sim)
+    bot = Autopilot(sim, None)
+    rng = random.Random(seed)
+    while sim.snake.is_alive and not sim.won and sim.ticks < ticks:
+        sim.step(bot.decide() if rng.random() > 0.03 else rng.choice(list(Direction)))
+    return sim, replay
+
+@pytest.mark.parametrize("level", LEVELS, ids=["none", "scatter", "maze"])
+@pytest.mark.parametrize("mode", list(GameMode))
+def test_replay_round_trip_verifies(mode, level):
+    sim, replay = record_game(mode, level)
+    assert sim.ticks > 20
+    loaded = Replay.from_bytes(replay.to_bytes())
+    assert (loaded.mode, loaded.seed, loaded.level) == (mode, 7, level)
+    assert loaded.events == replay.events
+    assert loaded.to_bytes() == replay.to_bytes()
+    assert loaded.verify()
+    played = loaded.play()
+    assert list(played.snake.positions) == list(sim.snake.positions)
+    assert played.food.position == sim.food.position
+
+def test_changed_turn_fails_verify():
+    _, replay = record_game(GameMode.WALLS, LEVELS[1])
+    tick, direction = replay.events[len(replay.events) // 2]
+    replay.events[len(replay.events) // 2] = (tick, Direction((direction.value + 1) % 4))
+    assert not Replay.from_bytes(replay.to_bytes()).verify()
+
+def old_bytes(replay, version):
+    # запись в формате версии 1 (только заголовок) или 2 (и уровень)
+    out = bytearray(HEADER.pack(MAGIC, version, replay.mode.value, replay.width, replay.height,
+                                replay.seed, replay.ticks, replay.score,
+                                REASONS.index(replay.death_reason), len(replay.events)))
+    if version >= 2:
+        out += pack_level(replay.level)
+    previous = 0
+    for tick, direction in replay.events:
+        write_varint(out, ((tick - previous) << 2) | direction.value)
+        previous = tick
+    return bytes(out)
+
+@pytest.mark.parametrize("version, level", [(1, None), (2, None), (2, LEVELS[2])])
+def test_old_versions_load(version, level):
+    _, replay = record_game(GameMode.OBSTACLES, level)
+    loaded = Replay.from_bytes(old_bytes(replay, version))
+    assert loaded.level == level and loaded.topology is None
+    assert loaded.events == replay.events
+    assert loaded.verify()
+    # пересохраняется уже в текущей версии
+    assert Replay.from_bytes(loaded.to_bytes()).verify()
@@ -0,0 +1,66 @@
+import sqlite3
+
+from snake_core import GameMode
+from snake_scores import ScoreStore
+
+# Рекорды: порядок при равном счете, перенос старого highscore.txt и
+# откладывание поврежденной базы вместе с файлами журнала.
+
+def open_store(path, **options):
+    options.setdefault("legacy_path", None)
+    return ScoreStore(str(path), **options)
+
+def test_record_flush_reload_keeps_order(tmp_path):
+    path = tmp_path / "scores.db"
+    store = open_store(path, top_size=3)
+    for score, seed in [(10, 1), (30, 2), (10, 3), (20, 4), (5, 5)]:
+        store.record(GameMode.WALLS, score, seed=seed)
+    store.flush()
+    store.close()
+    expected = [(30, 2), (20, 4), (10, 1)]
+    assert [(entry["score"], entry["seed"]) for entry in store.top(GameMode.WALLS)] == expected
+
+    reloaded = open_store(path, top_size=3)
+    reloaded.close()
+    # при равном счете выше остается более ранний результат
+    assert [(entry["score"], entry["seed"]) for entry in reloaded.top(GameMode.WALLS)] == expected
+    assert reloaded.best(GameMode.WALLS) == 30
+    assert reloaded.top(GameMode.CLASSIC) == []
+
+def test_legacy_highscore_imported_once(tmp_path):
+    legacy = tmp_path / "highscore.txt"
+    legacy.write_text("42\n")
+    path = tmp_path / "scores.db"
+    store = open_store(path, legacy_path=str(legacy))
+    store.close()
+    assert store.best(GameMode.CLASSIC) == 42
+
+    again = open_store(path, legacy_path=str(legacy))
+    again.close()
+    assert [entry["score"] for entry in again.top(GameMode.CLASSIC)] == [42]
+
+def test_corrupt_database_moved_with_wal_files(tmp_path):
+    path = tmp_path / "scores.db"
+    store = open_store(path)
+    store.record(GameMode.CLASSIC, 7)
+    store.flush()
+    store.close()
+    # открытое соединение держит файлы журнала -wal и -shm
+    holder = sqlite3.connect(str(path))
+    holder.execute("PRAGMA journal_mode=WAL")
+    holder.execute("INSERT INTO games (mode, score, length, ticks, death_reason, width, height, finished_at) "
+                   "VALUES (0, 9, 0, 0, '', 0, 0, 0)")
+    holder.commit()
+    try:
+        assert (tmp_path / "scores.db-wal").exists()
+        path.write_bytes(b"not a database" * 100)
+
+        fresh = open_store(path)
+        fresh.close()
+    finally:
+        holder.close()
+    assert fresh.top(GameMode.CLASSIC) == []
+    broken = sorted(item.name for item in tmp_path.iterdir() if ".broken-" in item.name)
+    assert len(broken) == 3
+    base = broken[0]
+    assert broken == [base, base + "-shm", base + "-wal"]
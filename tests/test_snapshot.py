@@ -0,0 +1,79 @@
+import random
+
+import pytest
+
+import snake_snapshot
+from snake_bot import Autopilot
+from snake_core import Direction, GameMode, Simulation
+from snake_levels import LevelSpec
+from snake_topology import Topology
+
+# Снимок восстанавливается байт в байт, а восстановленная партия идет дальше
+# тик в тик как исходная; поток DeltaEncoder ведет копию партии у зрителя.
+
+def portal_topology():
+    return Topology(40, 30).connect((0, 5), 3, (39, 20)).remove([(x, 3) for x in range(30, 38)])
+
+def make_sim(mode, seed=11):
+    if mode == GameMode.OBSTACLES:
+        return Simulation(mode, 40, 30, seed=seed, level=LevelSpec("maze", corridor=3, seed=2),
+                          topology=portal_topology())
+    return Simulation(mode, 40, 30, seed=seed)
+
+def actions(sim, rng, bot):
+    return bot.decide() if rng.random() > 0.02 else rng.choice(list(Direction))
+
+def advance(sim, ticks, seed=1):
+    bot = Autopilot(sim, None)
+    rng = random.Random(seed)
+    for _ in range(ticks):
+        if not sim.snake.is_alive or sim.won:
+            break
+        sim.step(actions(sim, rng, bot))
+
+@pytest.mark.parametrize("mode", list(GameMode))
+def test_snapshot_round_trip(mode):
+    sim = make_sim(mode)
+    advance(sim, 150)
+    data = snake_snapshot.to_bytes(sim)
+    assert snake_snapshot.to_bytes(snake_snapshot.restore(data)) == data
+    # и в уже существующую симуляцию того же размера
+    assert snake_snapshot.to_bytes(snake_snapshot.restore(data, make_sim(mode, seed=99))) == data
+
+@pytest.mark.parametrize("mode", list(GameMode))
+def test_restored_game_continues_identically(mode):
+    sim = make_sim(mode)
+    advance(sim, 60)
+    restored = snake_snapshot.restore(snake_snapshot.to_bytes(sim))
+    # одни и те же ходы: бот каждой партии смотрит только на свою
+    for game in (sim, restored):
+        advance(game, 400, seed=5)
+    assert snake_snapshot.to_bytes(restored) == snake_snapshot.to_bytes(sim)
+    assert restored.ticks == sim.ticks and restored.snake.score == sim.snake.score
+
+@pytest.mark.parametrize("mode", list(GameMode))
+def test_delta_decoder_follows_source(mode):
+    sim = make_sim(mode)
+    encoder = snake_snapshot.DeltaEncoder(keyframe_every=100)
+    decoder = snake_snapshot.DeltaDecoder()
+    bot = Autopilot(sim, None)
+    rng = random.Random(3)
+    stream = bytearray()
+    for _ in range(300):
+        if not sim.snake.is_alive or sim.won:
+            break
+        sim.step(actions(sim, rng, bot))
+        stream += encoder.encode(sim)
+        # куски потока приходят не по границам записей
+        cut = len(stream) // 2
+        decoder.feed(bytes(stream[:cut]))
+        decoder.feed(bytes(stream[cut:]))
+        stream.clear()
+        copy = decoder.sim
+        assert copy.ticks == sim.ticks and copy.time == sim.time
+        assert list(copy.snake.positions) == list(sim.snake.positions)
+        assert copy.food.position == sim.food.position and copy.food.special == sim.food.special
+        assert (copy.snake.score, copy.snake.length) == (sim.snake.score, sim.snake.length)
+        assert copy.board.cells == sim.board.cells
+        assert copy.board.free == sim.board.free
+    assert decoder.sim.snake.is_alive == sim.snake.is_alive
@@ -0,0 +1,67 @@
+import random
+
+import pytest
+
+import snake_levels
+import snake_snapshot
+from snake_bot import Autopilot
+from snake_core import Direction, GameMode, Simulation
+from snake_replay import Replay
+from snake_topology import Topology
+
+# Своя топология поля должна попадать в записи и снимки: без неё партия
+# проигрывается по обычной таблице ходов и расходится с исходной.
+
+def custom_topology():
+    topology = Topology(40, 30, wrap=True).connect((0, 5), 3, (39, 20))
+    topology.connect((5, 5), 0, (30, 25), both_ways=False)
+    return topology.remove([(x, 10) for x in range(10, 30)]).one_way((20, 20), 1)
+
+def play(sim, ticks):
+    bot = Autopilot(sim, None)
+    rng = random.Random(1)
+    while sim.snake.is_alive and sim.ticks < ticks:
+        sim.step(bot.decide() if rng.random() > 0.05 else rng.choice(list(Direction)))
+
+@pytest.mark.parametrize("mode", [GameMode.CLASSIC, GameMode.WALLS])
+def test_replay_keeps_topology(mode):
+    sim = Simulation(mode, 40, 30, seed=5, topology=custom_topology())
+    replay = Replay.record(sim)
+    play(sim, 2000)
+    loaded = Replay.from_bytes(replay.to_bytes())
+    assert loaded.topology.next == sim.topology.next
+    assert loaded.topology.void == sim.topology.void
+    assert loaded.verify()
+
+def test_snapshot_keeps_topology():
+    sim = Simulation(GameMode.WALLS, 40, 30, seed=5, topology=custom_topology())
+    play(sim, 100)
+    data = snake_snapshot.to_bytes(sim)
+    restored = snake_snapshot.restore(data)
+    assert restored.topology.next == sim.topology.next
+    assert snake_snapshot.to_bytes(restored) == data
+
+def test_seal_pockets_follows_wrap_and_portals():
+    width, height = 40, 30
+    wall = bytearray(width * height)
+    for y in range(height):
+        wall[y * width + 20] = snake_levels.BLOCKED
+    wall = bytes(wall)
+    # без перехода через край правая половина - карман
+    assert sum(snake_levels.seal_pockets(wall, width, height, (5, 5))) == width * height // 2
+    assert snake_levels.seal_pockets(wall, width, height, (5, 5), Topology(width, height, wrap=True)) == wall
+    portal = Topology(width, height).connect((0, 5), 3, (39, 20))
+    assert snake_levels.seal_pockets(wall, width, height, (5, 5), portal) == wall
+
+def test_level_mask_follows_topology_changes():
+    width, height = 40, 30
+    spec = snake_levels.LevelSpec("scatter", count=20, seed=4)
+    topology = Topology(width, height)
+    before = snake_levels.level_mask(width, height, spec, 0, (20, 15), topology)
+    # топология меняется на месте: маска должна считаться заново, а не браться из кэша
+    topology.remove([(x, 2) for x in range(width)])
+    after = snake_levels.level_mask(width, height, spec, 0, (20, 15), topology)
+    assert after != before
+    assert all(after[2 * width + x] == snake_levels.BLOCKED for x in range(width))
+    # ряды выше убранного стали карманом
+    assert all(after[x] == snake_levels.BLOCKED for x in range(2 * width))